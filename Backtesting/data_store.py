@@ -0,0 +1,237 @@
+'''
+Binary cache of the OHLCV csv, partitioned by symbol and year.
+
+The first load of a csv converts it once into one .npy file per (symbol, year)
+under <csv dir>/.cache/<csv name>/. The manifest.json next to the partitions
+records the csv's size and modification time, and the cache is rebuilt whenever
+those change. Later loads never parse the csv: they memory-map only the
+partitions of the requested symbols and years and pivot them into a MarketData.
+
+Every build goes into its own version directory named after the csv's
+fingerprint, and manifest.json (replaced atomically) points at the current one,
+so readers never see a half-written or half-deleted cache and processes
+rebuilding at once (e.g. sweep workers) don't get in each other's way. Older
+versions are removed after the swap; a reader still holding an old manifest
+reloads it when its partitions are gone.
+'''
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Dict, Iterable, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+FORMAT_VERSION = 2
+STALE_BUILD_SECONDS = 3600  # unfinished builds older than this are removed
+
+PRICE_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+
+class MarketData(NamedTuple):
+    '''
+    Price data pivoted into date x symbol arrays
+
+    dates:   sorted datetime64[D] array
+    symbols: sorted array of symbol names
+    prices:  dict of field -> float array of shape (dates, symbols),
+             NaN where a symbol has no row for a date
+    '''
+    dates: np.ndarray
+    symbols: np.ndarray
+    prices: Dict[str, np.ndarray]
+
+
+PARTITION_DTYPE = np.dtype([('date', 'datetime64[D]')] + [(field, np.float64) for field in PRICE_FIELDS])
+
+
+def _year(date) -> int:
+    return int(np.datetime64(date, 'Y').astype(int)) + 1970
+
+
+def pivot(dates, symbol_idx, n_symbols, fields):
+    '''
+    Pivots long rows into dense date x symbol arrays
+
+    dates:      datetime64[D] per row
+    symbol_idx: column of each row's symbol
+    n_symbols:  number of columns
+    fields:     dict of field -> values per row
+
+    returns (sorted unique dates, dict of field -> array of shape (dates, n_symbols))
+    '''
+    unique_dates, date_idx = np.unique(dates, return_inverse=True)
+    prices = {}
+    for field, values in fields.items():
+        dense = np.full((len(unique_dates), n_symbols), np.nan)
+        dense[date_idx, symbol_idx] = values
+        prices[field] = dense
+    return unique_dates, prices
+
+
+class PriceStore:
+    def __init__(self, csv_path, cache_dir=None):
+        '''
+        csv_path:  csv with the columns date; open; high; low; close; volume; Name
+        cache_dir: where the partitions go, defaults to <csv dir>/.cache/<csv name>
+        '''
+        self.csv_path = csv_path
+        if cache_dir is None:
+            directory, name = os.path.split(os.path.abspath(csv_path))
+            cache_dir = os.path.join(directory, '.cache', os.path.splitext(name)[0])
+        self.cache_dir = cache_dir
+        self._manifest = None
+
+    def _source_stamp(self):
+        stat = os.stat(self.csv_path)
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'version': FORMAT_VERSION}
+
+    @staticmethod
+    def _version_name(stamp):
+        return f'v{stamp["version"]}-{stamp["size"]}-{stamp["mtime_ns"]}'
+
+    def _partition_path(self, symbol, year, root=None):
+        root = root or os.path.join(self.cache_dir, self.manifest['directory'])
+        return os.path.join(root, symbol.replace(os.sep, '_'), f'{year}.npy')
+
+    @property
+    def manifest(self):
+        '''
+        The cache manifest ({'source': csv stamp, 'directory': version directory,
+        'symbols': {symbol: [years]}}), rebuilding the cache first if it is
+        missing or stale
+        '''
+        if self._manifest is None:
+            stamp = self._source_stamp()
+            try:
+                with open(os.path.join(self.cache_dir, 'manifest.json')) as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                manifest = None
+            if manifest is None or manifest['source'] != stamp or \
+                    not os.path.isdir(os.path.join(self.cache_dir, manifest['directory'])):
+                manifest = self.build()
+            self._manifest = manifest
+        return self._manifest
+
+    def build(self):
+        '''
+        (Re)converts the csv into a new version directory, points the manifest
+        at it and removes the older versions, returns the new manifest
+        '''
+        stamp = self._source_stamp()
+        data = pd.read_csv(self.csv_path)
+        rows = np.empty(len(data), dtype=PARTITION_DTYPE)
+        rows['date'] = pd.to_datetime(data['date']).values.astype('datetime64[D]')
+        for field in PRICE_FIELDS:
+            rows[field] = data[field].values
+        names = data['Name'].astype(str).values
+        years = rows['date'].astype('datetime64[Y]').astype(int) + 1970
+
+        # write into a private staging directory, then rename it into place
+        version = self._version_name(stamp)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=f'{version}.tmp-', dir=self.cache_dir)
+        order = np.lexsort((rows['date'], years, names))
+        rows, names, years = rows[order], names[order], years[order]
+        bounds = np.flatnonzero((names[1:] != names[:-1]) | (years[1:] != years[:-1])) + 1
+        symbols = {}
+        for start, end in zip(np.r_[0, bounds], np.r_[bounds, len(rows)]):
+            if start == end:
+                continue
+            symbol, year = str(names[start]), int(years[start])
+            path = self._partition_path(symbol, year, staging)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            np.save(path, rows[start:end])
+            symbols.setdefault(symbol, []).append(year)
+
+        manifest = {'source': stamp, 'directory': version, 'symbols': symbols}
+        try:
+            os.rename(staging, os.path.join(self.cache_dir, version))
+        except OSError:
+            # another process built the same version first, its copy is identical
+            shutil.rmtree(staging, ignore_errors=True)
+            if not os.path.isdir(os.path.join(self.cache_dir, version)):
+                raise
+        fd, tmp = tempfile.mkstemp(prefix='manifest.json.tmp-', dir=self.cache_dir)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp, os.path.join(self.cache_dir, 'manifest.json'))
+        self._remove_old_versions(version)
+        return manifest
+
+    def _remove_old_versions(self, current):
+        '''
+        Deletes every version but the current one, and builds abandoned for
+        STALE_BUILD_SECONDS (other processes' builds in progress are kept)
+        '''
+        now = time.time()
+        for entry in os.scandir(self.cache_dir):
+            if entry.name in (current, 'manifest.json'):
+                continue
+            try:
+                if '.tmp-' in entry.name and now - entry.stat().st_mtime < STALE_BUILD_SECONDS:
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                else:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass  # removed by another process
+
+    def symbols(self):
+        '''
+        Every symbol in the store, sorted
+        '''
+        return sorted(self.manifest['symbols'])
+
+    def load(self, symbols: Optional[Iterable[str]] = None, start=None, end=None) -> MarketData:
+        '''
+        Loads the given symbols between start and end (inclusive) as a MarketData,
+        memory-mapping only the partitions that cover them
+
+        symbols: names to load, defaults to every symbol
+        start, end: anything np.datetime64 accepts, default to no bound
+        '''
+        try:
+            return self._load(symbols, start, end)
+        except FileNotFoundError:
+            # another process replaced the cache since the manifest was read
+            self._manifest = None
+            return self._load(symbols, start, end)
+
+    def _load(self, symbols, start, end) -> MarketData:
+        available = self.manifest['symbols']
+        symbols = np.array(sorted(available if symbols is None else set(symbols)))
+        missing = [symbol for symbol in symbols if symbol not in available]
+        if missing:
+            raise KeyError(f'symbols not in {self.csv_path}: {missing}')
+        start = np.datetime64(start, 'D') if start is not None else None
+        end = np.datetime64(end, 'D') if end is not None else None
+        first_year = _year(start) if start is not None else None
+        last_year = _year(end) if end is not None else None
+
+        chunks, columns = [], []
+        for column, symbol in enumerate(symbols):
+            for year in available[symbol]:
+                if (first_year is not None and year < first_year) or \
+                        (last_year is not None and year > last_year):
+                    continue
+                part = np.load(self._partition_path(symbol, year), mmap_mode='r')
+                lo = np.searchsorted(part['date'], start) if start is not None else 0
+                hi = np.searchsorted(part['date'], end, side='right') if end is not None else len(part)
+                if hi > lo:
+                    chunks.append(part[lo:hi])
+                    columns.append(np.full(hi - lo, column))
+
+        if chunks:
+            rows = np.concatenate(chunks)
+            symbol_idx = np.concatenate(columns)
+        else:
+            rows = np.empty(0, dtype=PARTITION_DTYPE)
+            symbol_idx = np.empty(0, dtype=np.int64)
+        dates, prices = pivot(rows['date'], symbol_idx, len(symbols),
+                              {field: rows[field] for field in PRICE_FIELDS})
+        return MarketData(dates, symbols, prices)
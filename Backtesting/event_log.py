@@ -0,0 +1,85 @@
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+# one row per logged action, message is an index into EventLog.messages
+EVENT_DTYPE = np.dtype([
+    ('time', 'datetime64[ns]'),
+    ('message', np.int32),
+    ('symbol', np.int32),    # index into the strategy's symbols, -1 for none
+    ('value', np.float64),   # optional number attached to the action, NaN for none
+])
+
+
+class EventLog:
+    def __init__(self, capacity=1024):
+        '''
+        Preallocated log of strategy actions
+
+        Rows are written into a EVENT_DTYPE array that doubles in size when it
+        fills up, so logging is O(1) amortized and costs ~24 bytes per event.
+        Message strings are interned: each distinct message is stored once
+        and rows refer to it by index.
+
+        capacity: rows allocated up front
+        '''
+        self._rows = np.empty(max(capacity, 1), dtype=EVENT_DTYPE)
+        self._n = 0
+        self.messages: List[str] = []
+        self._message_ids = {}
+
+    def __len__(self):
+        return self._n
+
+    def append(self, msg, time, symbol=-1, value=np.nan):
+        '''
+        Logs one action
+
+        msg: string describing the action
+        time: datetime-like the action took place at
+        symbol: symbol index the action is about, -1 for none
+        value: number attached to the action (shares, price, score...)
+        '''
+        message_id = self._message_ids.get(msg)
+        if message_id is None:
+            message_id = self._message_ids[msg] = len(self.messages)
+            self.messages.append(msg)
+        if self._n == len(self._rows):
+            grown = np.empty(2 * len(self._rows), dtype=EVENT_DTYPE)
+            grown[:self._n] = self._rows
+            self._rows = grown
+        self._rows[self._n] = (np.datetime64('NaT') if time is None else np.datetime64(time, 'ns'),
+                               message_id, symbol, value)
+        self._n += 1
+
+    @property
+    def events(self) -> np.ndarray:
+        '''
+        The logged rows as a EVENT_DTYPE array (read-only view)
+        '''
+        view = self._rows[:self._n]
+        view.flags.writeable = False
+        return view
+
+    def clear(self):
+        self._n = 0
+        self.messages.clear()
+        self._message_ids.clear()
+
+    def to_frame(self, symbols: Optional[np.ndarray] = None) -> pd.DataFrame:
+        '''
+        The log as a pd dataframe (time; message; symbol; value)
+
+        symbols: names to turn the symbol indexes into, by default the indexes are kept
+        '''
+        events = self.events
+        frame = pd.DataFrame({'time': events['time'],
+                              'message': np.asarray(self.messages, dtype=object)[events['message']]
+                              if len(events) else np.empty(0, dtype=object),
+                              'symbol': events['symbol'],
+                              'value': events['value']})
+        if symbols is not None:
+            names = np.append(np.asarray(symbols, dtype=object), None)  # -1 -> None
+            frame['symbol'] = names[events['symbol']]
+        return frame
@@ -0,0 +1,341 @@
+'''
+Streaming indicators, vectorized across symbols.
+
+Every indicator holds one value per symbol and is advanced one bar at a time
+with update(bar), where bar maps price fields ('open', 'high', 'low', 'close',
+...) to arrays with one entry per symbol. An update costs O(1) per symbol
+whatever the window, so a backtest stays O(days) instead of O(days x window).
+
+Windows are counted in bars. A symbol without a bar (NaN) keeps its slot in
+the window but doesn't contribute to it, and a rolling value is NaN until the
+window holds min_periods valid bars (window by default).
+
+The same IndicatorSet is advanced by Strategy.back_testing() from the daily
+prices, and by the live bar stream through IndicatorSet.on_bars, a sink for
+Ingest/bars.BarBuilder.
+'''
+from typing import Dict, Iterable, Mapping, Optional, Tuple
+
+import numpy as np
+
+_BAR_COLUMNS = ('open', 'high', 'low', 'close', 'volume', 'vwap')  # BAR_FIELDS[3:9]
+
+
+class Indicator:
+    field = 'close'  # bar field the indicator reads
+
+    def __init__(self):
+        self.n = None
+        self.value = None
+
+    def reset(self, n):
+        '''
+        Clears the state for n symbols
+        '''
+        self.n = n
+        self.value = np.full(n, np.nan)
+
+    def update(self, bar: Mapping[str, np.ndarray]) -> np.ndarray:
+        '''
+        Advances by one bar and returns the new values
+
+        bar: price field -> array of one value per symbol, NaN where a symbol has no bar
+        '''
+        if self.n is None:
+            self.reset(len(bar[self.field]))
+        self._update(bar)
+        return self.value
+
+    def _update(self, bar):
+        raise NotImplementedError
+
+
+class _Window:
+    def __init__(self, window, n):
+        '''
+        Ring of the last `window` values of n symbols with their running sum,
+        sum of squares and count of valid (non-NaN) values
+        '''
+        self.window = window
+        self.values = np.zeros((window, n))
+        self.valid = np.zeros((window, n), dtype=bool)
+        self.sum = np.zeros(n)
+        self.sumsq = np.zeros(n)
+        self.count = np.zeros(n, dtype=np.int64)
+        self.pos = 0
+
+    def push(self, x):
+        valid = ~np.isnan(x)
+        x = np.where(valid, x, 0.0)
+        old = self.values[self.pos]
+        self.sum += x - old
+        self.sumsq += x * x - old * old
+        self.count += valid.astype(np.int64) - self.valid[self.pos]
+        self.values[self.pos] = x
+        self.valid[self.pos] = valid
+        self.pos += 1
+        if self.pos == self.window:
+            self.pos = 0
+            # resum once per window, O(1) amortized, so rounding errors don't pile up
+            self.sum = self.values.sum(axis=0)
+            self.sumsq = (self.values * self.values).sum(axis=0)
+
+
+class SMA(Indicator):
+    def __init__(self, window, field='close', min_periods=None):
+        '''
+        Simple moving average over the last `window` bars
+
+        window: number of bars
+        field: bar field to average
+        min_periods: valid bars needed for a value, defaults to window
+        '''
+        super().__init__()
+        self.window = window
+        self.field = field
+        self.min_periods = window if min_periods is None else min_periods
+
+    def reset(self, n):
+        super().reset(n)
+        self._ring = _Window(self.window, n)
+
+    def _mean(self):
+        ring = self._ring
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(ring.count >= max(self.min_periods, 1), ring.sum / ring.count, np.nan)
+
+    def _update(self, bar):
+        self._ring.push(bar[self.field])
+        self.value = self._mean()
+
+
+class RollingStd(SMA):
+    def __init__(self, window, field='close', min_periods=None, ddof=1):
+        '''
+        Rolling standard deviation over the last `window` bars
+
+        ddof: delta degrees of freedom, 1 (sample std) like pandas
+        see SMA for the other arguments
+        '''
+        super().__init__(window, field, min_periods)
+        self.ddof = ddof
+        self.mean = None
+
+    def _std(self):
+        ring = self._ring
+        count = ring.count
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = ring.sum / count
+            var = (ring.sumsq - mean * ring.sum) / (count - self.ddof)
+        ok = (count >= max(self.min_periods, self.ddof + 1))
+        return np.where(ok, mean, np.nan), np.where(ok, np.sqrt(np.maximum(var, 0.0)), np.nan)
+
+    def _update(self, bar):
+        self._ring.push(bar[self.field])
+        self.mean, self.value = self._std()
+
+
+class ZScore(RollingStd):
+    def __init__(self, window, field='close', min_periods=None, ddof=1):
+        '''
+        (x - rolling mean) / rolling std of the latest bar, the window including it
+        see RollingStd for the arguments
+        '''
+        super().__init__(window, field, min_periods, ddof)
+
+    def _update(self, bar):
+        x = bar[self.field]
+        self._ring.push(x)
+        mean, std = self._std()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.value = np.where(std > 0, (x - mean) / std, np.nan)
+
+
+class EMA(Indicator):
+    def __init__(self, span=None, field='close', alpha=None):
+        '''
+        Exponential moving average, seeded with the first valid value
+
+        span: alpha = 2 / (span + 1), like pandas' ewm(span=...)
+        alpha: smoothing factor, instead of span
+        field: bar field to average
+        '''
+        super().__init__()
+        if (span is None) == (alpha is None):
+            raise ValueError('Pass exactly one of span and alpha')
+        self.alpha = alpha if alpha is not None else 2.0 / (span + 1.0)
+        self.field = field
+
+    def _update(self, bar):
+        x = bar[self.field]
+        seeded = ~np.isnan(self.value)
+        self.value = np.where(np.isnan(x), self.value,
+                              np.where(seeded, self.value + self.alpha * (x - self.value), x))
+
+
+class RollingMax(Indicator):
+    _sign = 1.0
+
+    def __init__(self, window, field='close', min_periods=None):
+        '''
+        Rolling maximum over the last `window` bars
+
+        Uses the van Herk/Gil-Werman scheme: bars are grouped in blocks of
+        `window`, and the max of a window is the max of a suffix of the previous
+        block and a prefix of the current one. Prefix maxima are running values
+        and suffix maxima are computed once per block, so each bar costs O(1)
+        amortized.
+
+        see SMA for the arguments
+        '''
+        super().__init__()
+        self.window = window
+        self.field = field
+        self.min_periods = window if min_periods is None else min_periods
+
+    def reset(self, n):
+        super().reset(n)
+        w = self.window
+        self._block = np.full((w, n), -np.inf)   # current block, signed values
+        self._suffix = np.full((w + 1, n), -np.inf)  # suffix maxima of the previous block
+        self._prefix = np.full(n, -np.inf)
+        self._count = _Window(w, n)
+        self._k = 0  # position in the current block
+
+    def _update(self, bar):
+        x = bar[self.field]
+        self._count.push(np.where(np.isnan(x), np.nan, 0.0))
+        signed = np.where(np.isnan(x), -np.inf, self._sign * x)
+        k = self._k
+        self._block[k] = signed
+        self._prefix = np.maximum(self._prefix, signed)
+        extreme = np.maximum(self._suffix[k + 1], self._prefix)
+        self.value = np.where(self._count.count >= max(self.min_periods, 1),
+                              self._sign * extreme, np.nan)
+        self._k = k + 1
+        if self._k == self.window:
+            # the full block becomes the previous one
+            self._suffix[:-1] = np.maximum.accumulate(self._block[::-1], axis=0)[::-1]
+            self._prefix = np.full(self.n, -np.inf)
+            self._k = 0
+
+
+class RollingMin(RollingMax):
+    '''
+    Rolling minimum over the last `window` bars, see RollingMax
+    '''
+    _sign = -1.0
+
+
+class ATR(Indicator):
+    def __init__(self, window=14):
+        '''
+        Average true range with Wilder's smoothing: the mean of the first
+        `window` true ranges, then atr += (tr - atr) / window
+
+        window: number of bars
+        '''
+        super().__init__()
+        self.window = window
+
+    def reset(self, n):
+        super().reset(n)
+        self._prev_close = np.full(n, np.nan)
+        self._count = np.zeros(n, dtype=np.int64)
+        self._sum = np.zeros(n)
+
+    def _update(self, bar):
+        high, low, close = bar['high'], bar['low'], bar['close']
+        prev = self._prev_close
+        tr = np.fmax(high - low, np.fmax(np.abs(high - prev), np.abs(low - prev)))
+        valid = ~np.isnan(tr)
+        self._count += valid
+        warming = valid & (self._count <= self.window)
+        self._sum += np.where(warming, tr, 0.0)
+        smoothed = self.value + (tr - self.value) / self.window
+        value = np.where(valid & (self._count > self.window), smoothed, self.value)
+        self.value = np.where(warming & (self._count == self.window), self._sum / self.window, value)
+        self._prev_close = np.where(np.isnan(close), prev, close)
+
+
+class IndicatorSet:
+    def __init__(self, symbols):
+        '''
+        Named indicators advanced together over one universe of symbols
+
+        symbols: symbol names, in the column order of the bars
+        '''
+        self.symbols = np.asarray(symbols)
+        self._symbol_index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.indicators: Dict[str, Indicator] = {}
+        self._start: Optional[int] = None  # start of the newest live row
+        self._row = None
+        self.late_bars = 0  # live bars older than the last update, dropped
+
+    def add(self, name, indicator: Indicator) -> Indicator:
+        indicator.reset(len(self.symbols))
+        self.indicators[name] = indicator
+        return indicator
+
+    def reset(self):
+        for indicator in self.indicators.values():
+            indicator.reset(len(self.symbols))
+        self._start = self._row = None
+
+    def update(self, bar: Mapping[str, np.ndarray]):
+        '''
+        Advances every indicator by one bar, see Indicator.update
+        '''
+        for indicator in self.indicators.values():
+            indicator.update(bar)
+
+    def __getitem__(self, name) -> np.ndarray:
+        return self.indicators[name].value
+
+    def __contains__(self, name):
+        return name in self.indicators
+
+    def value(self, name, symbol):
+        '''
+        Current value of one indicator for one symbol
+        '''
+        return self.indicators[name].value[self._symbol_index[symbol]]
+
+    def on_bars(self, bars: Iterable[Tuple], resolution=60):
+        '''
+        Sink for bars.BarBuilder: collects the closed bars (laid out as
+        BAR_FIELDS) of one resolution into rows, and advances the indicators
+        once a bar of a later start shows that a row is complete. Bars of
+        unknown symbols or other resolutions are ignored.
+        Use functools.partial to pick another resolution.
+
+        Every bar of a start has to arrive before any bar of a later start,
+        which a BarBuilder with shared_clock (its default) guarantees by closing
+        all symbols' bars on one clock. Bars older than the current row are
+        counted in late_bars and dropped.
+
+        bars: closed bars
+        resolution: bar size in seconds to follow
+        '''
+        for bar in sorted(bars, key=lambda bar: bar[2]):
+            symbol, res, start = bar[:3]
+            column = self._symbol_index.get(symbol)
+            if res != resolution or column is None:
+                continue
+            if self._start is None or start > self._start:
+                self.flush()
+                self._start = start
+                self._row = {field: np.full(len(self.symbols), np.nan) for field in _BAR_COLUMNS}
+            elif start < self._start or self._row is None:
+                self.late_bars += 1  # its row was already used
+                continue
+            for field, value in zip(_BAR_COLUMNS, bar[3:9]):
+                self._row[field][column] = value
+
+    def flush(self):
+        '''
+        Advances the indicators with the live row collected so far, if any
+        '''
+        if self._row is not None:
+            self.update(self._row)
+            self._row = None
@@ -0,0 +1,210 @@
+'''
+Rendering of backtest results into a static image.
+
+A chart is a few thousand pixels wide, so drawing every point of a long
+equity curve only costs time. Series are downsampled to max_points before
+they reach matplotlib:
+
+lttb    Largest-Triangle-Three-Buckets: one point per bucket, the one forming
+        the largest triangle with the point kept before it and the mean of the
+        next bucket. Keeps the visual shape of the curve.
+minmax  the lowest and the highest point of every bucket, so every peak and
+        trough (e.g. the max drawdown) survives exactly.
+
+Both are O(n), and 10M points go through them in well under a second. The
+figure is drawn with the Agg canvas directly, without pyplot, so it works
+headless and never opens a window.
+'''
+from typing import Optional
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from event_log import EventLog
+
+DOWNSAMPLING_METHODS = ('lttb', 'minmax')
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    '''
+    Indexes of the n_out points picked by Largest-Triangle-Three-Buckets,
+    first and last point included
+
+    x: increasing float coordinates
+    y: values
+    n_out: number of points to keep, at least 3
+    '''
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    # the first and last points are kept, the others are split into n_out - 2 buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / counts
+    mean_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / counts
+    # the bucket after the last one is the last point
+    mean_x = np.append(mean_x, x[-1])
+    mean_y = np.append(mean_y, y[-1])
+
+    picked = np.empty(n_out, dtype=np.int64)
+    picked[0], picked[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        ax, ay = x[a], y[a]
+        # twice the triangle area, the constant factor doesn't change the argmax
+        area = np.abs((ax - mean_x[i + 1]) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (mean_y[i + 1] - ay))
+        a = lo + int(np.argmax(area))
+        picked[i + 1] = a
+    return picked
+
+
+def minmax(y: np.ndarray, n_buckets: int) -> np.ndarray:
+    '''
+    Increasing indexes of the lowest and highest point of each of n_buckets
+    equal buckets, first and last point included (at most 2 * n_buckets + 2 points)
+
+    y: values
+    n_buckets: number of buckets
+    '''
+    n = len(y)
+    if 2 * n_buckets >= n or n_buckets < 1:
+        return np.arange(n)
+    size = -(-n // n_buckets)
+    # pad with the last value so the buckets fill a 2-D array, then clip the padding away
+    padded = np.concatenate([y, np.full(size * n_buckets - n, y[-1])]).reshape(n_buckets, size)
+    starts = np.arange(n_buckets) * size
+    lows = starts + np.argmin(padded, axis=1)
+    highs = starts + np.argmax(padded, axis=1)
+    picked = np.concatenate([[0], lows, highs, [n - 1]]).clip(max=n - 1)
+    return np.unique(picked)
+
+
+def downsample(x: np.ndarray, y: np.ndarray, max_points: int, method='lttb') -> np.ndarray:
+    '''
+    Indexes of at most ~max_points points of the series (x, y) to draw
+
+    x: increasing datetime64 or numeric coordinates
+    y: values, NaNs are skipped
+    max_points: number of points to keep
+    method: one of DOWNSAMPLING_METHODS
+    '''
+    if method not in DOWNSAMPLING_METHODS:
+        raise ValueError(f'Unknown downsampling method {method!r}, expected one of {DOWNSAMPLING_METHODS}')
+    valid = np.flatnonzero(~np.isnan(y))
+    if len(valid) <= max_points:
+        return valid
+    if method == 'minmax':
+        return valid[minmax(y[valid], max_points // 2 - 1)]
+    return valid[lttb(np.asarray(x[valid]).astype(np.int64).astype(np.float64), y[valid], max_points)]
+
+
+def drawdown(equity: np.ndarray) -> np.ndarray:
+    '''
+    Relative distance of the equity curve to its running maximum, <= 0
+    '''
+    return equity / np.fmax.accumulate(equity) - 1
+
+
+def _thin(indexes: np.ndarray, n: int, max_markers: int) -> np.ndarray:
+    '''
+    Keeps the first of the indexes (into a series of n points) that fall into
+    each of max_markers buckets of the series
+    '''
+    if len(indexes) <= max_markers:
+        return np.arange(len(indexes))
+    buckets = indexes * max_markers // max(n, 1)
+    return np.unique(buckets, return_index=True)[1]
+
+
+def plot_backtest(dates: np.ndarray, equity: np.ndarray, benchmark: Optional[float] = None,
+                  transactions: Optional[np.ndarray] = None, log: Optional[EventLog] = None,
+                  symbols=None, max_points=2000, method='lttb', max_markers=500, log_lines=40,
+                  title=None, path=None, dpi=100) -> Figure:
+    '''
+    Draws the equity curve, its drawdown and the trades of a backtest, with the
+    latest logged actions by the side. Returns the matplotlib Figure, and also
+    saves it as an image if a path is given.
+
+    dates: datetime64 dates of the equity values, increasing
+    equity: portfolio value at every date
+    benchmark: value to draw as a flat line, e.g. the starting balance
+    transactions: ledger as a portfolio.TRANSACTION_DTYPE array, for the trade markers
+    log: EventLog of the strategy's actions
+    symbols: names of the symbol indexes of the log
+    max_points: points drawn per curve
+    method: downsampling method, one of DOWNSAMPLING_METHODS
+    max_markers: buy and sell markers drawn each
+    log_lines: latest log entries listed
+    title: title of the figure
+    path: file to write, the format follows the extension (png, svg, pdf...),
+          by default nothing is written
+    dpi: resolution of raster images
+    '''
+    equity = np.asarray(equity, dtype=np.float64)
+    dates = np.asarray(dates)
+    drawdowns = drawdown(equity)
+
+    has_log = log is not None and len(log) > 0
+    fig = Figure(figsize=(15 if has_log else 11, 7), dpi=dpi)
+    FigureCanvasAgg(fig)
+    grid = fig.add_gridspec(2, 2 if has_log else 1, height_ratios=(3, 1),
+                            width_ratios=(3, 1) if has_log else None)
+    ax_equity = fig.add_subplot(grid[0, 0])
+    ax_drawdown = fig.add_subplot(grid[1, 0], sharex=ax_equity)
+
+    picked = downsample(dates, equity, max_points, method)
+    ax_equity.plot(dates[picked], equity[picked], color='tab:blue', linewidth=1, label='equity')
+    if benchmark is not None:
+        ax_equity.axhline(benchmark, color='grey', linewidth=0.8, linestyle='--', label='start balance')
+
+    n_trades = 0
+    if transactions is not None and len(transactions) and len(dates):
+        n_trades = len(transactions)
+        # a trade is drawn on the equity curve at the last date at or before it
+        rows = (np.searchsorted(dates.astype('datetime64[ns]'), transactions['time'], side='right') - 1).clip(min=0)
+        for buys, marker, color, label in ((True, '^', 'tab:green', 'buy'), (False, 'v', 'tab:red', 'sell')):
+            side = rows[(transactions['shares'] > 0) == buys]
+            side = side[_thin(side, len(dates), max_markers)]
+            ax_equity.scatter(dates[side], equity[side], marker=marker, color=color, s=18, zorder=3,
+                              label=label)
+
+    picked = downsample(dates, drawdowns, max_points, 'minmax')
+    ax_drawdown.fill_between(dates[picked], drawdowns[picked], 0, color='tab:red', alpha=0.35, linewidth=0)
+    ax_drawdown.set_ylabel('drawdown')
+    ax_equity.set_ylabel('portfolio value')
+    ax_equity.legend(loc='upper left', fontsize='small')
+    ax_equity.grid(alpha=0.3)
+    ax_drawdown.grid(alpha=0.3)
+    ax_equity.tick_params(labelbottom=False)
+
+    if len(equity) and not np.isnan(equity).all():
+        final = equity[~np.isnan(equity)][-1]
+        summary = f'final {final:,.2f}   max drawdown {np.nanmin(drawdowns):.2%}   trades {n_trades:,}'
+    else:
+        summary = 'no equity'
+    fig.suptitle(f'{title}\n{summary}' if title else summary)
+
+    if has_log:
+        ax_log = fig.add_subplot(grid[:, 1])
+        ax_log.axis('off')
+        ax_log.set_title(f'log (latest {min(log_lines, len(log))} of {len(log):,})', fontsize='small', loc='left')
+        events = log.events[-log_lines:]
+        names = None if symbols is None else np.asarray(symbols)
+        days = events['time'].astype('datetime64[D]').astype(str)
+        lines = []
+        for day, message, symbol, value in zip(days, events['message'], events['symbol'], events['value']):
+            line = f'{day} {log.messages[message]}'
+            if symbol >= 0:
+                line += f' {names[symbol] if names is not None else symbol}'
+            if value == value:  # not NaN
+                line += f' {value:g}'
+            lines.append(line)
+        ax_log.text(0, 1, '\n'.join(lines), va='top', ha='left', family='monospace', fontsize=7,
+                    transform=ax_log.transAxes, clip_on=True)
+
+    fig.autofmt_xdate()
+    if path is not None:
+        fig.savefig(path)
+    return fig
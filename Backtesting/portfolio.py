@@ -1,28 +1,100 @@
-from typing import List, Tuple
+from typing import Dict, Iterable
+
+import numpy as np
+
+# one row per filled order, shares > 0 for buys and < 0 for sells
+TRANSACTION_DTYPE = np.dtype([
+    ('time', 'datetime64[ns]'),
+    ('symbol', np.int32),    # index into Portfolio.symbols
+    ('price', np.float64),
+    ('shares', np.float64),
+    ('fee', np.float64),
+])
 
 
 class Portfolio():
-    def __init__(self, starting_balance=None, transaction_cost=None):
-        """_summary_
+    def __init__(self, starting_balance=None, transaction_cost=None, symbols=None):
+        """Cash balance, positions and transaction ledger of a strategy
+
+        Positions live in a numpy array indexed by symbol id, with a dict from
+        symbol name to id, so lookups are O(1) and the whole book can be
+        marked to market with one dot product. Filled orders are appended to
+        a TRANSACTION_DTYPE array that doubles in size when it fills up.
 
         Parameters
         ----------
-        starting_balance : _type_, optional
-            _description_, by default None
-        transaction_cost : _type_, optional
-            _description_, by default None
+        starting_balance : float, optional
+            Starting cash, by default 10000
+        transaction_cost : float, optional
+            Fee as a fraction of traded value, by default 0
+        symbols : Iterable[str], optional
+            Universe of symbols, whose order defines the symbol ids (pass the
+            backtester's symbols so price rows line up), by default symbols
+            get ids in the order they are first traded
         """
         self.balance = starting_balance if starting_balance is not None else 10000
-        self.transaction_cost = transaction_cost if transaction_cost is not None else 10000
-        self.transactions = []
-        self.holdings: List[Tuple[str, int]] = [] # list of lists
-                           # each sublist contains two elements: [stock_name, amount_holding]
-                           # TODO: Add class variables/types to top level class docstring
+        self.transaction_cost = transaction_cost if transaction_cost is not None else 0.0
+        self.symbols = []
+        self._symbol_ids: Dict[str, int] = {}
+        self._positions = np.zeros(0)
+        self._transactions = np.empty(64, dtype=TRANSACTION_DTYPE)
+        self._n_transactions = 0
+        if symbols is not None:
+            self.symbol_ids(symbols)
 
     def get_balance(self): return self.balance  # TODO: You should only use getter methods if the var is private or u need to do cleaning
-    
-    def get_holdings(self): return self.holdings
-    
+
+    def get_holdings(self):
+        """Returns {stock_name: shares} for every non-zero position"""
+        held = np.flatnonzero(self._positions)
+        return {self.symbols[i]: self._positions[i] for i in held}
+
+    def get_position(self, stock_name):
+        """Returns the shares held of a stock, 0 if none"""
+        symbol_id = self._symbol_ids.get(stock_name)
+        return 0 if symbol_id is None else self._positions[symbol_id]
+
+    @property
+    def positions(self):
+        """Shares held per symbol id, aligned with self.symbols (read-only view)"""
+        view = self._positions.view()
+        view.flags.writeable = False
+        return view
+
+    @property
+    def transactions(self):
+        """Ledger of filled orders as a TRANSACTION_DTYPE array (read-only view)"""
+        view = self._transactions[:self._n_transactions]
+        view.flags.writeable = False
+        return view
+
+    def symbol_ids(self, stock_names: Iterable[str]) -> np.ndarray:
+        """Returns the ids of the given symbols, registering new ones"""
+        ids = self._symbol_ids
+        new = [name for name in dict.fromkeys(stock_names) if name not in ids]
+        if new:
+            for name in new:
+                ids[name] = len(self.symbols)
+                self.symbols.append(name)
+            self._positions = np.concatenate([self._positions, np.zeros(len(new))])
+        return np.fromiter((ids[name] for name in stock_names), dtype=np.int64)
+
+    def _record(self, time, symbol_ids, prices, shares, fees):
+        """Appends filled orders to the ledger"""
+        n = len(symbol_ids)
+        end = self._n_transactions + n
+        if end > len(self._transactions):
+            grown = np.empty(max(end, 2 * len(self._transactions)), dtype=TRANSACTION_DTYPE)
+            grown[:self._n_transactions] = self._transactions[:self._n_transactions]
+            self._transactions = grown
+        rows = self._transactions[self._n_transactions:end]
+        rows['time'] = np.datetime64('NaT') if time is None else np.datetime64(time, 'ns')
+        rows['symbol'] = symbol_ids
+        rows['price'] = prices
+        rows['shares'] = shares
+        rows['fee'] = fees
+        self._n_transactions = end
+
     def validate_order(self, stock_name, stock_price, shares):
         """this function validates if orders can be placed, it handles
         both buys and sells (shares > 0 for buy and < 0 for sell)
@@ -31,29 +103,23 @@ class Portfolio():
         Parameters
         ----------
         stock_name : str
-            _description_
+            Symbol of the stock
         stock_price : float
-            _description_
+            Price the order would fill at
         shares : int
-            _description_
+            Shares to buy (> 0) or sell (< 0)
 
         Returns
         -------
-        _type_
-            _description_
+        bool
+            True if there is enough cash (buy) or enough shares (sell)
         """
         if shares > 0:  # buy
-            if self.balance >= stock_price*shares*(1+self.transaction_cost):
-                return True
-            else:
-                return False
+            return self.balance >= stock_price*shares*(1+self.transaction_cost)
         else:  # sell
-            for stock in self.holdings:
-                if stock[0] == stock_name: 
-                    return stock[1] >= abs(shares)
-            return False
+            return self.get_position(stock_name) >= abs(shares)
 
-    def place_order(self, stock_name, stock_price, shares): 
+    def place_order(self, stock_name, stock_price, shares, time=None, fee=None):
         """this function handles both buys and sells (shares > 0 for buy and < 0 for sell)
         first validate the order, if is valid, place the order and return True
         otherwise return false
@@ -61,35 +127,94 @@ class Portfolio():
         Parameters
         ----------
         stock_name : str
-            _description_
+            Symbol of the stock
         stock_price : float
-            _description_
+            Price the order fills at
         shares : int
-            _description_
+            Shares to buy (> 0) or sell (< 0)
+        time : datetime-like, optional
+            Time recorded in the ledger, by default NaT
+        fee : float, optional
+            Fee charged for this fill instead of transaction_cost, e.g. from a
+            fill simulator, by default None
 
         Returns
         -------
-        _type_
-            _description_
+        bool
+            True if the order was filled
         """
-        if self.validate_order(stock_price, shares):
-            if shares > 0:
-                self.transactions.append(['buy',stock_name, stock_price, shares])
-                self.balance -= stock_price*shares*(1+self.transaction_cost)
-
-                for stock in self.holdings:
-                    if stock[0] == stock_name:
-                        stock[1] += shares
-                        return True
-
-                self.holdings.append([stock_name, shares])
-                return True
-            elif shares < 0:
-                self.transactions.append(['sell', stock_name, stock_price, shares])
-                self.balance += stock_price*shares*(1-self.transaction_cost)
-                for stock in self.holdings:
-                    if stock[0] == stock_name:
-                        stock[1] -= shares
-                        return True
-        else: 
+        if shares == 0:
+            return False
+        value = stock_price * shares
+        if fee is None:
+            if not self.validate_order(stock_name, stock_price, shares):
+                return False
+            fee = abs(value) * self.transaction_cost
+        elif (shares > 0 and self.balance < value + fee) or \
+                (shares < 0 and self.get_position(stock_name) < -shares):
             return False
+        symbol_id = self.symbol_ids([stock_name])
+        self.balance -= value + fee
+        self._positions[symbol_id] += shares
+        self._record(time, symbol_id, stock_price, shares, fee)
+        return True
+
+    def place_orders(self, stock_names, stock_prices, shares, time=None):
+        """Validates and places a whole batch of orders (e.g. a rebalance) at once
+
+        Sells are validated against the current positions and filled first.
+        Their proceeds are added to the cash, then buys are filled in the
+        given order until the cash runs out.
+
+        Parameters
+        ----------
+        stock_names : Sequence[str]
+            Symbols, each at most once per batch
+        stock_prices : array-like of float
+            Fill price of each order
+        shares : array-like of float
+            Shares to buy (> 0) or sell (< 0) of each order
+        time : datetime-like, optional
+            Time recorded in the ledger, by default NaT
+
+        Returns
+        -------
+        np.ndarray
+            Boolean mask of the orders that were filled
+        """
+        symbol_ids = self.symbol_ids(stock_names)
+        if len(np.unique(symbol_ids)) != len(symbol_ids):
+            raise ValueError('each symbol may appear only once per batch')
+        prices = np.asarray(stock_prices, dtype=np.float64)
+        shares = np.asarray(shares, dtype=np.float64)
+        values = prices * shares
+        fees = np.abs(values) * self.transaction_cost
+
+        sells = (shares < 0) & (self._positions[symbol_ids] >= -shares)
+        cash = self.balance - np.sum(values[sells] + fees[sells])
+        buy_costs = np.where(shares > 0, values + fees, 0.0)
+        buys = (shares > 0) & (np.cumsum(buy_costs) <= cash)
+
+        filled = sells | buys
+        filled_ids = symbol_ids[filled]
+        self.balance -= np.sum(values[filled] + fees[filled])
+        self._positions[filled_ids] += shares[filled]
+        self._record(time, filled_ids, prices[filled], shares[filled], fees[filled])
+        return filled
+
+    def mark_to_market(self, prices: np.ndarray) -> float:
+        """Returns cash plus the value of every position
+
+        Parameters
+        ----------
+        prices : np.ndarray
+            Price per symbol id, aligned with self.symbols (NaN prices are
+            ignored, so only positions without a price are left out)
+
+        Returns
+        -------
+        float
+            Total portfolio value
+        """
+        prices = np.asarray(prices, dtype=np.float64)[:len(self._positions)]
+        return self.balance + np.nansum(self._positions[:len(prices)] * prices)
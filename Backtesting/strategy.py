@@ -1,82 +1,186 @@
 from abc import ABC, abstractclassmethod
 
 import matplotlib
+import numpy as np
 import pandas as pd
-import holidays
-import datetime
+from data_store import PRICE_FIELDS, MarketData, PriceStore
+from event_log import EventLog
+from indicators import IndicatorSet
+from plotting import plot_backtest
 from portfolio import Portfolio
+from trading_calendar import TradingCalendar
 
 
 class BackTester:
-    def __init__(self, data_file_path=None):
+    def __init__(self, data_file_path=None, market_data=None, symbols=None, date_range=None):
         # init a backtester, retrieve data from local file
         # data are stored as a pd dataframe that has the following cols
         # date; open; high; low; close; volume; Name 
         # TODO: Validate csv format
+        # the csv goes through a PriceStore, which caches it as binary
+        # partitions and loads only the requested symbols/dates
+        # symbols: names to load, defaults to all of them
+        # date_range: (start, end) "yyyy-mm-dd" strings to load, defaults to all dates
+        # market_data: a MarketData to use instead of the csv
         self._data_file_path = data_file_path or 'data/2013-2018.csv'
-        self.data = pd.read_csv(self._data_file_path)
+        self._data = None
+        if market_data is None:
+            start, end = date_range or (None, None)
+            market_data = PriceStore(self._data_file_path).load(symbols, start, end)
+        self.dates, self.symbols, self.prices = market_data
+        self._symbol_index = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+    @property
+    def data(self):
+        '''
+        The loaded prices as a long pd dataframe (date; open; high; low; close;
+        volume; Name), only built the first time it is used
+        '''
+        if self._data is None:
+            dates, symbols = np.nonzero(~np.isnan(self.prices['close']))
+            frame = {'date': self.dates[dates]}
+            for field in PRICE_FIELDS:
+                frame[field] = self.prices[field][dates, symbols]
+            frame['Name'] = self.symbols[symbols]
+            self._data = pd.DataFrame(frame)
+        return self._data
+
+    def market_data(self):
+        '''
+        Returns the pivoted price arrays as a MarketData
+        '''
+        return MarketData(self.dates, self.symbols, self.prices)
 
 
 class Strategy(ABC, BackTester):  # TODO: Not sure why this originally inherits from BackTester if we don't use anything from it. Is BackTester supposed to be a parent class or a wrapper?
-    def __init__(self, transaction_cost=None, start_balance=None, week_day=None, month_day=None): 
+    def __init__(self, transaction_cost=None, start_balance=None, week_day=None, month_day=None,
+                 data_file_path=None, market_data=None, symbols=None, date_range=None): 
         '''
         transaction_cost: float that determines the cost of every transaction
         start_balance: the balance that the strategy is starting with
+        data_file_path: csv of daily OHLCV data, see BackTester
+        market_data: preloaded MarketData, used instead of data_file_path
+        symbols, date_range: restrict the loaded data, see BackTester
         
         week_day:   every week, when it comes to the week_day specified, execute
-                    the run_weekly function. Default is Monday.
+                    the run_weekly function. Default is Monday (0, as in
+                    datetime.date.weekday()).
         month_day:  every month, when it comes to the month_day specified, execute
                     the run_monthly function. Default is 1st.
             Note:   if date specified is not a trading date, execute the functions on 
                     the next nearest trading date
         '''
+        BackTester.__init__(self, data_file_path, market_data, symbols, date_range)
         self.start_balance = start_balance # benchmark for visualization
+        self.week_day = week_day if week_day is not None else 0
+        self.month_day = month_day if month_day is not None else 1
         self.portfolio = Portfolio(starting_balance = start_balance, 
-                                   transaction_cost = transaction_cost)
+                                   transaction_cost = transaction_cost,
+                                   symbols = self.symbols)
+        if self.start_balance is None:
+            self.start_balance = self.portfolio.balance
         self.current_date = None    # datetime object for tracking the date in backtesting
         self.open_close = None      # a boolean for tracking if it's currently market open/close
                                     # True for open and False for close
-        self.nyse_holidays = holidays.NYSE() # a dictionary storing all stock market holidays
+        self.calendar = None        # TradingCalendar of the current/last backtest
+        self._day = None            # row of the current date in self.dates/self.prices
+        self._session = None        # index of the current date in self.calendar.sessions
+        self.indicators = IndicatorSet(self.symbols)  # see add_indicator
+        self.events = EventLog()    # actions logged with log(), see event_log.py
+        self.equity = None          # portfolio value at every close of the last backtest
+        self.equity_dates = None
+        self.figure = None          # matplotlib Figure of the last visualize()
     
-    def back_testing(self, start_time=None, end_time=None):
+    def back_testing(self, start_time=None, end_time=None, visualize=True):
         '''
         back_testing takes in the start and end time, then proceed to 
         test the performance of the strategy
+        the portfolio value at every close is stored in self.equity, next to
+        the dates in self.equity_dates
         
         start_time, end_time: strings in the format of "yyyy-mm-dd"
+        visualize: whether to call visualize() at the end, which draws
+                   self.figure without writing any file
         '''
         start = start_time or '2013-03-28'
         end = end_time or '2018-02-05'
+        self.calendar = TradingCalendar(start, end, self.week_day, self.month_day)
+
+        # only sessions that have price data are simulated
+        sessions = self.calendar.sessions
+        self.indicators.reset()
+        self.events.clear()
+        rows = np.searchsorted(self.dates, sessions).clip(max=max(len(self.dates) - 1, 0))
+        present = np.flatnonzero(self.dates[rows] == sessions) if len(self.dates) else rows[:0]
 
-        self.current_time = datetime.strptime(start, "%Y-%m-%d").date()
-        end_time = datetime.strptime(end, "%Y-%m-%d").date()
-        
         print('\n started backtesting')
-        while self.current_time != end_time:
-            pass
-        print('\n finished backtesting, started visualizing')
-        
-        self.visualize()
+        self.equity_dates = sessions[present]
+        self.equity = np.full(len(present), np.nan)
+        for i, session in enumerate(present):
+            self._session = session
+            self._day = rows[session]
+            self.current_date = sessions[session].item()
+
+            self.open_close = True
+            self.on_market_open()
+            self.handle_run_daily()
+            self.handle_run_weekly()
+            self.handle_run_monthly()
+
+            self.open_close = False
+            self.on_market_close()
+            self.equity[i] = self.portfolio_value('close')
+            self.indicators.update({field: self.prices[field][self._day] for field in PRICE_FIELDS})
+        if visualize:
+            print('\n finished backtesting, started visualizing')
+            self.visualize()
+        else:
+            print('\n finished backtesting')
     
-    def log(self, msg, time): 
+    def log(self, msg, time=None, stock_name=None, value=np.nan):
         '''
         This function logs every action that the strategy has taken, from
-        stock selection to buying/selling a stock
-        The logs should be display alongside the curves and visualizing
+        stock selection to buying/selling a stock, into self.events
+        The latest logs are displayed by the side of the curves by visualize()
         
         msg: a string that describes the action to be logged
-        time: the time that the action took place
+        time: the time that the action took place, defaults to the current date
+        stock_name: string, the stock the action is about, if any
+        value: a number attached to the action (shares, price, score...), if any
+        '''
+        symbol = -1 if stock_name is None else self._symbol_index[stock_name]
+        self.events.append(msg, self.current_date if time is None else time, symbol, value)
+
+    def logs(self):
         '''
-        self.log.append([msg, time]) # probs a good place to use numpy or pandas for performance
+        The logged actions as a pd dataframe (time; message; symbol; value)
+        '''
+        return self.events.to_frame(self.symbols)
     
-    def visualize(self): 
+    def visualize(self, path=None, max_points=2000, method='lttb', title=None):
         '''
         This function should be executed after backtesting for visualizing the 
         performance of the strategy
-        Use matplotlibe/seaborn/etc. to make graphs, then display the logs by the 
-        side, gotta make this look fancy
+        Draws the equity curve against the start balance, the drawdown and the
+        buy/sell markers, with the latest logs by the side, and returns the
+        matplotlib Figure (also kept in self.figure). Curves are downsampled to
+        max_points (see plotting.py), so the time to render doesn't grow with
+        the backtest.
+
+        path: image file to save the figure to, by default nothing is written
+        max_points: points drawn per curve
+        method: downsampling of the equity curve, 'lttb' or 'minmax'
+        title: title of the figure, defaults to the strategy class name
         '''
-        pass
+        if self.equity is None:
+            raise RuntimeError('Nothing to visualize yet, run back_testing() first')
+        self.figure = plot_backtest(self.equity_dates, self.equity,
+                                    benchmark=self.start_balance,
+                                    transactions=self.portfolio.transactions,
+                                    log=self.events, symbols=self.symbols,
+                                    max_points=max_points, method=method,
+                                    title=title or type(self).__name__, path=path)
+        return self.figure
 
     def is_trading_date(self, date):
         '''
@@ -85,8 +189,20 @@ class Strategy(ABC, BackTester):  # TODO: Not sure why this originally inherits
         
         date: datetime object
         '''
-        return date not in self.nyse_holidays # checking if date exists in holiday dict
+        return self._calendar_for(date).is_trading_date(date)
     
+    def _calendar_for(self, date):
+        '''
+        The calendar of the current backtest if it covers the date, else one
+        built for the date alone, so the date helpers also work before or
+        outside back_testing()
+        '''
+        day = np.datetime64(date, 'D')
+        calendar = self.calendar
+        if calendar is not None and calendar.start <= day <= calendar.end:
+            return calendar
+        return TradingCalendar(day, day, self.week_day, self.month_day)
+
     def next_nearest_trading_date(self, date):
         '''
         Return the next nearest trading date as a datetime object
@@ -94,43 +210,100 @@ class Strategy(ABC, BackTester):  # TODO: Not sure why this originally inherits
         
         date: datetime object
         '''
-        while not self.is_trading_date(date): # check if current date is trading date
-            date+= datetime.timedelta(days=1) # move onto next date
-        
-        return date
+        return self._calendar_for(date).next_trading_date(date).item()
     
     def handle_run_daily(self):
         '''
         handler for run_daily, to be called in back_testing()
         '''
-        pass
+        self.run_daily()
     
     def handle_run_weekly(self):
         '''
         handler for run_weekly, to be called in back_testing()
         '''
-        pass
+        if self.calendar.weekly[self._session]:
+            self.run_weekly()
     
     def handle_run_monthly(self):
         '''
         handler for run_monthly, to be called in back_testing()
         '''
-        pass
+        if self.calendar.monthly[self._session]:
+            self.run_monthly()
+
+    def add_indicator(self, name, indicator):
+        '''
+        Registers an indicator (see indicators.py) that back_testing() advances
+        with every symbol's bar after each market close, so the callbacks of a
+        day see values up to the previous close. Returns the indicator.
+
+        name: key to read it back with self.indicator(name)
+        indicator: e.g. SMA(20), ATR(14)
+        '''
+        return self.indicators.add(name, indicator)
+
+    def indicator(self, name, stock_name=None):
+        '''
+        Current value of an indicator, for one stock or as an array over self.symbols
+
+        name: name given to add_indicator
+        stock_name: string, defaults to every symbol
+        '''
+        if stock_name is None:
+            return self.indicators[name]
+        return self.indicators.value(name, stock_name)
+
+    def price(self, stock_name, field=None):
+        '''
+        Returns the price of a stock on the current date, NaN if it didn't trade
+
+        stock_name: string
+        field: one of PRICE_FIELDS, defaults to open before the market opens
+               and close before it closes
+        '''
+        if field is None:
+            field = 'open' if self.open_close else 'close'
+        return self.prices[field][self._day, self._symbol_index[stock_name]]
 
     def place_order(self, stock_name, shares):
         '''
         handler for buy/sell, set shares > 0 for buy and < 0 for sell
         this function should be called by users in the followed functions only
+        returns whether the order was filled
 
         stock_name: string
         shares: float
         '''
-        stock_price = self.data['date'==self.current_date & 'Name'==stock_name]
-        if self.current_time: 
-            stock_price = stock_price['open']
-        else:
-            stock_price = stock_price['close']
-        self.portfolio.place_order(stock_name, stock_price, shares)
+        stock_price = self.price(stock_name)
+        if np.isnan(stock_price):
+            return False
+        return self.portfolio.place_order(stock_name, stock_price, shares, self.current_date)
+
+    def place_orders(self, stock_names, shares):
+        '''
+        batch version of place_order, e.g. for a rebalance, sells are filled
+        before buys, returns a boolean array of the orders that were filled
+
+        stock_names: list of strings, each at most once
+        shares: list/array of floats
+        '''
+        field = 'open' if self.open_close else 'close'
+        columns = [self._symbol_index[name] for name in stock_names]
+        stock_prices = self.prices[field][self._day, columns]
+        shares = np.where(np.isnan(stock_prices), 0.0, shares)
+        return self.portfolio.place_orders(stock_names, stock_prices, shares, self.current_date)
+
+    def portfolio_value(self, field=None):
+        '''
+        Returns cash plus the holdings marked at the current date's prices
+
+        field: price field, defaults to open before the market opens and
+               close before it closes
+        '''
+        if field is None:
+            field = 'open' if self.open_close else 'close'
+        return self.portfolio.mark_to_market(self.prices[field][self._day])
 
         
     ################################################################################
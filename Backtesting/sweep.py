@@ -0,0 +1,147 @@
+'''
+Parameter sweeps: run one Strategy subclass over a grid of parameters and date
+windows on every core.
+
+The price arrays are loaded once in the parent and copied into a single
+shared-memory block. Every worker process attaches to that block read-only when
+it starts, so the data is neither re-read from csv nor copied per worker.
+Each backtest returns one row of metrics, and the rows come back as one
+DataFrame.
+
+Strategy subclasses with their own __init__ must pass **kwargs on to
+Strategy.__init__ so that market_data reaches the BackTester.
+'''
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from strategy import PRICE_FIELDS, BackTester, MarketData
+
+TRADING_DAYS = 252
+
+
+class SharedMarketData:
+    def __init__(self, market_data: MarketData):
+        '''
+        Copies the price arrays of a MarketData into one shared memory block,
+        to be created once by the parent process
+
+        market_data: the pivoted prices to share
+        '''
+        dates, symbols, prices = market_data
+        self.dates = dates
+        self.symbols = symbols
+        self.shape = (len(PRICE_FIELDS), len(dates), len(symbols))
+        self._shm = shared_memory.SharedMemory(create=True, size=max(8 * int(np.prod(self.shape)), 1))
+        stacked = np.ndarray(self.shape, dtype=np.float64, buffer=self._shm.buf)
+        for i, field in enumerate(PRICE_FIELDS):
+            stacked[i] = prices[field]
+        self.name = self._shm.name
+
+    def __getstate__(self):
+        # workers get the block's name, dates and symbols, never the prices
+        return {'dates': self.dates, 'symbols': self.symbols, 'shape': self.shape, 'name': self.name}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._shm = shared_memory.SharedMemory(name=self.name)
+
+    def attach(self) -> MarketData:
+        '''
+        Returns a MarketData whose price arrays are read-only views of the block
+        '''
+        stacked = np.ndarray(self.shape, dtype=np.float64, buffer=self._shm.buf)
+        stacked.flags.writeable = False
+        return MarketData(self.dates, self.symbols,
+                          {field: stacked[i] for i, field in enumerate(PRICE_FIELDS)})
+
+    def close(self):
+        self._shm.close()
+
+    def unlink(self):
+        self._shm.unlink()
+
+
+def performance_metrics(equity: np.ndarray) -> Dict[str, float]:
+    '''
+    Summarizes a daily equity curve
+
+    equity: portfolio value at every close
+    '''
+    equity = equity[~np.isnan(equity)]
+    if len(equity) < 2:
+        return {'final_value': equity[-1] if len(equity) else np.nan, 'total_return': np.nan,
+                'volatility': np.nan, 'sharpe': np.nan, 'max_drawdown': np.nan}
+    returns = np.diff(equity) / equity[:-1]
+    std = returns.std(ddof=1)
+    drawdown = equity / np.maximum.accumulate(equity) - 1
+    return {
+        'final_value': equity[-1],
+        'total_return': equity[-1] / equity[0] - 1,
+        'volatility': std * np.sqrt(TRADING_DAYS),
+        'sharpe': returns.mean() / std * np.sqrt(TRADING_DAYS) if std > 0 else np.nan,
+        'max_drawdown': drawdown.min(),
+    }
+
+
+_market_data: Optional[MarketData] = None  # set in each worker by _init_worker
+
+
+def _init_worker(shared: SharedMarketData):
+    global _market_data
+    _market_data = shared.attach()
+
+
+def _run_one(strategy_cls, params: Dict, window: Tuple[str, str]) -> Dict:
+    strategy = strategy_cls(market_data=_market_data, **params)
+    strategy.back_testing(window[0], window[1], visualize=False)
+    row = dict(params)
+    row['start'], row['end'] = window
+    row.update(performance_metrics(strategy.equity))
+    row['transactions'] = len(strategy.portfolio.transactions)
+    return row
+
+
+def parameter_grid(**values: Sequence) -> List[Dict]:
+    '''
+    Returns every combination of the given parameter values as kwargs dicts,
+    e.g. parameter_grid(window=[10, 20], threshold=[1, 2]) -> 4 dicts
+    '''
+    names = list(values)
+    return [dict(zip(names, combo)) for combo in itertools.product(*values.values())]
+
+
+def run_sweep(strategy_cls, params: Iterable[Dict], windows: Iterable[Tuple[str, str]],
+              data_file_path=None, market_data=None, max_workers=None, chunksize=4):
+    '''
+    Backtests strategy_cls for every (params, window) pair in a process pool
+    and returns one DataFrame row per run: the params, the window and the
+    performance_metrics of its equity curve
+
+    strategy_cls: Strategy subclass defined at module level (so it pickles)
+    params: kwargs dicts for strategy_cls, e.g. from parameter_grid()
+    windows: (start_time, end_time) strings for back_testing
+    data_file_path: csv to load the prices from, see BackTester
+    market_data: already loaded MarketData, used instead of data_file_path
+    max_workers: pool size, defaults to the number of cores
+    chunksize: runs handed to a worker at a time
+    '''
+    if market_data is None:
+        market_data = BackTester(data_file_path).market_data()
+    jobs = list(itertools.product(list(params), list(windows)))
+    shared = SharedMarketData(market_data)
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(),
+                                 initializer=_init_worker, initargs=(shared,)) as executor:
+            rows = list(executor.map(_run_one, itertools.repeat(strategy_cls),
+                                     [job[0] for job in jobs], [job[1] for job in jobs],
+                                     chunksize=chunksize))
+    finally:
+        shared.close()
+        shared.unlink()
+    return pd.DataFrame(rows)
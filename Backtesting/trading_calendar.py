@@ -0,0 +1,64 @@
+import holidays
+import numpy as np
+
+
+class TradingCalendar:
+    def __init__(self, start, end, week_day=0, month_day=1):
+        '''
+        Precomputes the NYSE sessions between start and end (inclusive) and the
+        sessions that trigger the weekly/monthly rules of a Strategy, so that a
+        backtest only has to walk arrays
+
+        start, end: anything np.datetime64 accepts, e.g. "yyyy-mm-dd"
+        week_day:   weekday of the weekly rule, 0 is Monday
+        month_day:  day of month of the monthly rule, clipped to the month's length
+
+        Attributes
+        sessions:   datetime64[D] array of every trading date
+        weekly:     boolean array, True on the sessions run_weekly fires on
+        monthly:    boolean array, True on the sessions run_monthly fires on
+
+        A rule fires on its day, or on the next trading date when its day
+        isn't one.
+        '''
+        start = np.datetime64(start, 'D')
+        end = np.datetime64(end, 'D')
+        self.start, self.end = start, end
+        first_year = start.astype('datetime64[Y]').astype(int) + 1970
+        last_year = end.astype('datetime64[Y]').astype(int) + 1970
+        # one extra year so that rules late in December can roll into January
+        nyse = holidays.NYSE(years=range(first_year, last_year + 2))
+        self.holidays = np.array(sorted(nyse), dtype='datetime64[D]')
+
+        days = np.arange(start, end + 1)
+        self.sessions = days[np.is_busday(days, holidays=self.holidays)]
+        self.weekly = np.isin(self.sessions, self._weekly_triggers(week_day))
+        self.monthly = np.isin(self.sessions, self._monthly_triggers(month_day))
+
+    def _roll_forward(self, dates):
+        return np.busday_offset(dates, 0, roll='forward', holidays=self.holidays)
+
+    def _weekly_triggers(self, week_day):
+        # datetime64 day 0 (1970-01-01) is a Thursday, so day 4 is a Monday
+        first_monday = self.start - (self.start - np.datetime64(4, 'D')) % np.timedelta64(7, 'D')
+        mondays = np.arange(first_monday, self.end + 1, 7)
+        return self._roll_forward(mondays + week_day)
+
+    def _monthly_triggers(self, month_day):
+        months = np.arange(self.start.astype('datetime64[M]'),
+                           self.end.astype('datetime64[M]') + 1)
+        month_starts = months.astype('datetime64[D]')
+        month_ends = (months + 1).astype('datetime64[D]') - 1
+        return self._roll_forward(np.minimum(month_starts + (month_day - 1), month_ends))
+
+    def is_trading_date(self, date):
+        '''
+        Whether the given date (datetime/date/np.datetime64) is a session
+        '''
+        return bool(np.is_busday(np.datetime64(date, 'D'), holidays=self.holidays))
+
+    def next_trading_date(self, date):
+        '''
+        Returns the given date if it is a session, else the next session, as np.datetime64
+        '''
+        return self._roll_forward(np.datetime64(date, 'D'))
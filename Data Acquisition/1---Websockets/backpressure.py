@@ -0,0 +1,150 @@
+'''
+Overflow policies for the queues a WebSocket publishes to.
+
+Every flushed batch goes through the Outbox of its queue. With the 'block'
+policy it is put on the queue right away, which stalls the socket's read loop
+while a bounded queue is full. The other policies never wait on the queue.
+They keep what the queue can't take in the outbox, retry every drain, and
+bound what they keep to max_pending records:
+
+block        put() and wait, nothing is ever lost
+drop_oldest  keep whole batches in order, dropping the oldest ones beyond
+             max_pending records (counted in metrics 'drops')
+conflate     keep only the latest record per key: (ticker, side, price) for
+             level 2 changes and ticker for depth records. A consumer that
+             catches up gets the current state of every level instead of its
+             whole history. Records merged away are counted in 'conflated',
+             and the oldest keys beyond max_pending in 'drops'. Level 1
+             records (tickers, trades) are events rather than state, so a
+             WebSocket applies drop_oldest to its level 1 queue instead (see
+             channel_policy).
+'''
+from collections import deque
+from queue import Full
+from typing import Callable, List, Optional, Tuple
+
+OVERFLOW_POLICIES = ('block', 'drop_oldest', 'conflate')
+
+
+def channel_policy(policy: str, channel: str) -> str:
+    """Policy actually applied to a channel: 'conflate' only merges level 2
+    state, level 1 falls back to 'drop_oldest'"""
+    if policy == 'conflate' and channel != 'level2':
+        return 'drop_oldest'
+    return policy
+
+
+def conflation_key(record: tuple):
+    """(ticker, side, price) of a level 2 change, ticker of a depth record.
+    Holds for LEVEL_2_FIELDS tuples and compact LEVEL_2_RECORDs alike."""
+    return record[2:5] if len(record) == 6 else record[2]
+
+
+class Outbox:
+    def __init__(self, queue, channel: str, metrics, policy: str = 'block',
+                 max_pending: int = 100_000, to_batch: Callable[[List], object] = list):
+        """Hands batches of one channel over to its queue
+
+        Parameters
+        ----------
+        queue : multiprocessing.Queue
+            Destination, anything with put()/full() (and ideally put_nowait())
+        channel : str
+            Channel name used in metrics, e.g. 'level2'
+        metrics : metrics.SocketMetrics
+            Counts drops/conflations and records enqueue latencies
+        policy : str, optional
+            One of OVERFLOW_POLICIES, by default 'block'
+        max_pending : int, optional
+            Records kept while the queue is full, by default 100_000
+        to_batch : Callable[[List], object], optional
+            Turns a list of records into what is put on the queue, by default list
+        """
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f'Unknown overflow policy {policy!r}, expected one of {OVERFLOW_POLICIES}')
+        self.queue = queue
+        self.channel = channel
+        self.metrics = metrics
+        self.policy = policy
+        self.max_pending = max_pending
+        self.to_batch = to_batch
+        self._put_nowait = getattr(queue, 'put_nowait', None)
+        self._batches = deque()  # drop_oldest: (records, stamps), oldest first
+        self._latest = {}  # conflate: key -> (record, stamp), oldest key first
+        self._pending = 0
+
+    def __len__(self):
+        """Records waiting for room in the queue"""
+        return self._pending if self.policy == 'drop_oldest' else len(self._latest)
+
+    def send(self, records: List, stamps: List[Tuple]) -> None:
+        """Puts a batch on the queue, or keeps it according to the policy
+
+        Parameters
+        ----------
+        records : List
+            Records of the batch
+        stamps : List[Tuple]
+            (exchange, receive, decode) ns per record for metrics, may be empty
+        """
+        if self.policy == 'block':
+            self.queue.put(self.to_batch(records))
+            self._enqueued(stamps)
+            return
+        if self.policy == 'drop_oldest':
+            self._batches.append((records, stamps))
+            self._pending += len(records)
+            while self._pending > self.max_pending and len(self._batches) > 1:
+                dropped, _ = self._batches.popleft()
+                self._pending -= len(dropped)
+                self.metrics.dropped(len(dropped))
+        else:
+            latest = self._latest
+            aligned = len(stamps) == len(records)
+            merged = 0
+            for i, record in enumerate(records):
+                key = conflation_key(record)
+                if latest.pop(key, None) is not None:
+                    merged += 1
+                latest[key] = (record, stamps[i] if aligned else None)
+            if merged:
+                self.metrics.conflated(merged)
+            overflow = len(latest) - self.max_pending
+            if overflow > 0:
+                for key in list(latest)[:overflow]:
+                    del latest[key]
+                self.metrics.dropped(overflow)
+        self.drain()
+
+    def drain(self) -> None:
+        """Moves what is kept to the queue, for as long as it has room"""
+        if self.policy == 'drop_oldest':
+            while self._batches:
+                records, stamps = self._batches[0]
+                if not self._offer(records):
+                    return
+                self._batches.popleft()
+                self._pending -= len(records)
+                self._enqueued(stamps)
+        elif self._latest:
+            kept = list(self._latest.values())
+            if self._offer([record for record, _ in kept]):
+                self._latest.clear()
+                self._enqueued([stamp for _, stamp in kept if stamp is not None])
+
+    def _offer(self, records) -> bool:
+        batch = self.to_batch(records)
+        if self._put_nowait is not None:
+            try:
+                self._put_nowait(batch)
+            except Full:
+                return False
+            return True
+        if self.queue.full():
+            return False
+        self.queue.put(batch)
+        return True
+
+    def _enqueued(self, stamps: Optional[List[Tuple]]) -> None:
+        if stamps:
+            self.metrics.enqueued(self.channel, stamps)
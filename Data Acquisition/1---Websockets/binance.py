@@ -5,7 +5,6 @@ import multiprocessing
 from datetime import datetime
 from uuid import uuid4
 
-import pandas as pd
 import websockets
 
 from web_socket import WebSocket
@@ -1,36 +1,92 @@
 import asyncio
 import json
+import logging
 import multiprocessing
 import time
 import traceback
-from datetime import datetime
-from time import time
-from uuid import uuid4
 
-import pandas as pd
-import requests
 import websockets
-from scipy.fft import idst
 
+from feed_merger import FeedMerger
+from metrics import parse_exchange_time
+from order_book import OrderBook
 from web_socket import WebSocket
 
+logger = logging.getLogger(__name__)
 
 # Build Coinbase Websocket Class 
 class CoinbaseWebSocket(WebSocket):
-    def __init__(self, queue_1, queue_2, coins):
+    exchange = 'coinbase'
+    url = 'wss://ws-feed.exchange.coinbase.com'
+    level_1_map = {'time': 'time', 'ticker': 'product_id', 'price': 'price'}
+    level_2_map = {'time': 'time', 'ticker': 'product_id', 'side': 'side', 'price': 'price',
+                   'quantity': 'quantity'}  # side/price/quantity are passed per change
+
+    def __init__(self, queue_1, queue_2, coins, batch_size=1, batch_interval=None,
+                 book_depth=None, book_interval=1.0, url=None, metrics_interval=None,
+                 compact=False, connections=1, reconnect_delay=1.0, max_reconnect_delay=30.0,
+                 overflow='block', max_pending=100_000):
         """Passing queue_1, queue_2, coins, setting subscription message and channels to subscribe to
 
         Parameters
         ----------
-        queue_1 : _type_
-            _description_
-        queue_2 : _type_
-            _description_
-        coins : _type_
-            _description_
+        queue_1 : multiprocessing.Queue
+            Receives batches of ticker records (see LEVEL_1_FIELDS)
+        queue_2 : multiprocessing.Queue
+            Receives batches of l2update records (see LEVEL_2_FIELDS)
+        coins : List[str]
+            Coinbase product ids, e.g. 'BTC-USD'
+        batch_size : int, optional
+            Records per batch, by default 1
+        batch_interval : float, optional
+            Max seconds a record waits before its batch is flushed, by default None
+        book_depth : int, optional
+            When set, queue_2 receives top-N depth records (see DEPTH_FIELDS)
+            of each product's order book instead of one record per change,
+            by default None
+        book_interval : float, optional
+            Min seconds between two depth records of a product, by default 1.0
+        url : str, optional
+            Endpoint to connect to instead of the Coinbase feed, by default None
+        metrics_interval : float, optional
+            Seconds between two metrics log lines, by default None
+        compact : bool, optional
+            Publish LEVEL_1_RECORD/LEVEL_2_RECORD record arrays, by default False
+            (not available with book_depth)
+        connections : int, optional
+            Redundant connections subscribed to the same products, by default 1.
+            With more than one, messages go through a FeedMerger and the first
+            copy of each one is published (see feed_merger.py). The matches
+            channel is then subscribed too: its trade ids are contiguous, so
+            matches missed by every connection show a gap, and the product's
+            book is re-synced
+        reconnect_delay : float, optional
+            Seconds before a dropped connection reconnects, doubling up to
+            max_reconnect_delay while it keeps failing, by default 1.0
+        max_reconnect_delay : float, optional
+            Cap on the reconnect delay, by default 30.0
+        overflow : str, optional
+            'block', 'drop_oldest' or 'conflate' when a queue is full, by default 'block'
+        max_pending : int, optional
+            Records per queue kept while it is full, by default 100_000
         """        
-        super().__init__(self, queue_1, queue_2, coins)
-        self.channels = ['ticker', 'level2']
+        if compact and book_depth is not None:
+            raise ValueError('Depth records have no compact layout, use book_depth or compact')
+        super().__init__(queue_1, queue_2, coins, batch_size, batch_interval, metrics_interval,
+                         compact, overflow, max_pending)
+        self.channels = ['ticker', 'level2'] + (['matches'] if connections > 1 else [])
+        if url is not None:
+            self.url = url
+        self.book_depth = book_depth
+        self.book_interval = book_interval
+        self.books = {}  # product_id -> OrderBook, built from each snapshot
+        self._book_published = {}  # product_id -> monotonic time of the last depth record
+        self.connections = connections
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.merger = FeedMerger() if connections > 1 else None
+        self._sockets = {}  # connection number -> live websocket
+        self._resync = set()  # products whose next snapshot replaces their book
         self.sub_message = self.on_open()
    
     def on_open(self):
@@ -38,8 +94,9 @@ class CoinbaseWebSocket(WebSocket):
 
         Returns
         -------
-        _type_
-            _description_
+        Dict
+            Subscribe message for the ticker and level2 channels (and matches
+            with redundant connections)
         """        
         subscribe_message = {
             "type": "subscribe",
@@ -49,62 +106,120 @@ class CoinbaseWebSocket(WebSocket):
         return subscribe_message
     
     async def _run(self):  # Full Asynchronous Run 
-        try:
-            async with websockets.connect('wss://ws-feed.exchange.coinbase.com', max_size = 1_000_000_000) as websocket:
-                await websocket.send(json.dumps(self.sub_message))
-                while True:
-                    message = await websocket.recv()
-                    temp_json = json.loads(message)
-                    # Organizing Data for pandas DataFrame
-                    msg_data = []
-                    time_id = []
-                    curr_dt = None 
-                    if temp_json['type'] == 'ticker':
-                        curr_dt = temp_json['time'].replace('Z', '')
-                        curr_dt = curr_dt.replace('T', ' ')
-                        msg_data = {
-                            'exchange': 'coinbase',
-                            'ticker': temp_json['product_id'],
-                            'price': temp_json['price']
-                        }
-                        time_id = [curr_dt]
-                        if self.queue_1.full():
-                            print('working 1')
-                        if msg_data != [] and time_id != []:
-                            df = pd.DataFrame(data=msg_data, index=time_id)
-                            print(df)
-                            self.queue_1.put(df) 
-                    # If market 2 data
-                    elif temp_json['type'] == 'l2update':
-                        curr_dt = temp_json['time'].replace('Z', '')
-                        curr_dt = curr_dt.replace('T', ' ')
-                        msg_data = {
-                                'exchange': 'coinbase',
-                                'ticker': temp_json['product_id'],
-                                'side': temp_json['changes'][0][0],
-                                'price': temp_json['changes'][0][1],
-                                'quantity': temp_json['changes'][0][2]
-                            }
-                        time_id = [curr_dt]
-                        if self.queue_2.full():
-                            print('working 2')
-                        if msg_data != [] and time_id != []:
-                            df = pd.DataFrame(data=msg_data, index=time_id)
-                            print(df)
-                            self.queue_2.put(df) 
-        except Exception:
-            print(traceback.format_exc())
+        tasks = [self._connection(number) for number in range(self.connections)]
+        if self.merger is not None:
+            tasks.append(self._check_gaps())
+        await asyncio.gather(*tasks)
+
+    async def _connection(self, number):
+        """Keeps one connection subscribed, reconnecting with exponential backoff"""
+        delay = self.reconnect_delay
+        while True:
+            try:
+                async with websockets.connect(self.url, max_size = 1_000_000_000) as websocket:
+                    await websocket.send(json.dumps(self.sub_message))
+                    self._sockets[number] = websocket
+                    delay = self.reconnect_delay
+                    while True:
+                        self._on_message(await websocket.recv())
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning('coinbase connection %d dropped\n%s', number, traceback.format_exc())
+            finally:
+                self._sockets.pop(number, None)
+            if not self._sockets:
+                # nothing was received meanwhile, the books need fresh snapshots
+                self._resync.update(self.coins)
+            self.metrics.reconnected()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def _on_message(self, message):
+        recv_ns = self.metrics.received(len(message))
+        temp_json = json.loads(message)
+        msg_type = temp_json['type']
+        merger = self.merger
+        if msg_type == 'ticker':
+            if merger is not None and not merger.accept(('ticker', temp_json['product_id']),
+                                                        int(temp_json['sequence'])):
+                return
+            self.emit_1(temp_json, recv_ns)
+        elif msg_type in ('match', 'last_match'):
+            # only subscribed with a merger, for gap detection
+            merger.accept(('match', temp_json['product_id']), int(temp_json['trade_id']),
+                          contiguous=True)
+        # If market 2 data
+        elif msg_type == 'l2update':
+            if merger is not None and not merger.accept_key(
+                    ('l2update', temp_json['product_id']),
+                    (temp_json['time'], json.dumps(temp_json['changes']))):
+                return
+            self._on_l2update(temp_json, recv_ns)
+        elif msg_type == 'snapshot':
+            product_id = temp_json['product_id']
+            if product_id in self.books and product_id not in self._resync:
+                return  # another connection's copy of a book that is current
+            book = OrderBook(product_id)
+            book.apply_snapshot(temp_json['bids'], temp_json['asks'])
+            self.books[book.product_id] = book
+            self._resync.discard(product_id)
+
+    async def _check_gaps(self):
+        """Re-syncs the products whose missed matches no connection delivered.
+        Ticker trade ids are not checked: the ticker channel batches cascading
+        matches, so its trade ids skip values all the time"""
+        while True:
+            await asyncio.sleep(self.merger.gap_timeout)
+            for (channel, product_id), first, last in self.merger.expired_gaps():
+                if channel != 'match':
+                    continue
+                logger.warning('coinbase %s: matches %d-%d missed on every connection, re-syncing',
+                               product_id, first, last)
+                await self.resync(product_id)
+
+    async def resync(self, product_id):
+        """Re-subscribes one live connection to the level2 channel of a product,
+        so its book is rebuilt from a fresh snapshot while the other connections
+        keep streaming"""
+        self._resync.add(product_id)
+        if self.merger is not None:
+            self.merger.reset(('l2update', product_id))
+        for websocket in list(self._sockets.values()):
+            try:
+                for msg_type in ('unsubscribe', 'subscribe'):
+                    await websocket.send(json.dumps({'type': msg_type, 'product_ids': [product_id],
+                                                     'channels': ['level2']}))
+                return
+            except websockets.ConnectionClosed:
+                continue
+
+    def _on_l2update(self, temp_json, recv_ns=None):
+        """Applies every change of an l2update to the product's book and
+        publishes either the changes or a depth record to queue_2"""
+        product_id = temp_json['product_id']
+        book = self.books.get(product_id)
+        for side, price, quantity in temp_json['changes']:
+            price = float(price)
+            quantity = float(quantity)
+            if book is not None:
+                book.apply_change(side, price, quantity)
+            if self.book_depth is None:
+                self.emit_2(temp_json, recv_ns, side=side, price=price, quantity=quantity)
+        if self.book_depth is not None and book is not None:
+            now = time.monotonic()
+            if now - self._book_published.get(product_id, float('-inf')) >= self.book_interval:
+                self._book_published[product_id] = now
+                bids, asks = book.depth(self.book_depth)
+                curr_dt = temp_json['time'].replace('Z', '').replace('T', ' ')
+                self.publish_2((curr_dt, 'coinbase', product_id, bids, asks),
+                               parse_exchange_time(temp_json['time']), recv_ns)
         
 
-# Async Script Start
-async def main(coins): 
-    q = multiprocessing.Queue()
-    r = multiprocessing.Queue()
-    cwr = CoinbaseWebSocket(q, r, coins)
-    await cwr._run()  # TODO: Don't access private methods
+if __name__ == '__main__':
+    q = multiprocessing.Queue(maxsize=10_000)
+    r = multiprocessing.Queue(maxsize=10_000)
+    coins = ['BTC-USDT', 'ETH-USDT']
+    cwr = CoinbaseWebSocket(q, r, coins, overflow='drop_oldest')
+    cwr.run()
 
-q = multiprocessing.Queue()
-r = multiprocessing.Queue()
-coins = ['BTC-USDT', 'ETH-USDT']
-cwr = CoinbaseWebSocket(q, r,coins)
-cwr.run()
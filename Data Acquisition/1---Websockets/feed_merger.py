@@ -0,0 +1,120 @@
+'''
+First-arrival merging of redundant copies of one feed.
+
+A WebSocket in redundant mode holds two or more live connections to the same
+products. Every message is passed through a FeedMerger before it's handled:
+the first copy of a message is accepted and later copies are dropped, so the
+output always follows whichever connection is ahead and a connection dropping
+out costs nothing while another one is live.
+
+Messages are identified per stream (e.g. ('ticker', 'BTC-USD')) by:
+- a sequence number or trade id (accept). Contiguous ids (trade ids) also
+  detect gaps: ids skipped by the leading connection are remembered and still
+  accepted if a slower connection delivers them within gap_timeout seconds,
+  otherwise they are reported by expired_gaps() so the caller can re-sync.
+- a content key for feeds without sequence numbers (accept_key), checked
+  against the last `window` keys of the stream.
+'''
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Tuple
+
+
+class FeedMerger:
+    def __init__(self, window=4096, gap_timeout=1.0):
+        """Tracks what was already delivered on every stream
+
+        Parameters
+        ----------
+        window : int, optional
+            Content keys remembered per stream, and the largest gap (in ids)
+            waited on before it's reported, by default 4096
+        gap_timeout : float, optional
+            Seconds a missing id can still be filled by another connection,
+            by default 1.0
+        """
+        self.window = window
+        self.gap_timeout = gap_timeout
+        self._high: Dict[Hashable, int] = {}  # highest id accepted per stream
+        self._missing: Dict[Hashable, Dict[int, float]] = {}  # stream -> id -> deadline
+        self._keys: Dict[Hashable, OrderedDict] = {}
+        self._gaps: List[Tuple[Hashable, int, int]] = []
+        self.duplicates = 0
+        self.gaps = 0
+
+    def accept(self, stream: Hashable, seq: int, contiguous: bool = False) -> bool:
+        """Whether a message is the first copy of `seq` on `stream`
+
+        Parameters
+        ----------
+        stream : Hashable
+            Sequence space of the id, e.g. ('match', product_id)
+        seq : int
+            Sequence number or trade id, increasing along the stream
+        contiguous : bool, optional
+            Ids increase by exactly 1, so skipped ones are gaps, by default False
+        """
+        high = self._high.get(stream)
+        if high is None or seq > high:
+            if contiguous and high is not None and seq > high + 1:
+                self._open_gap(stream, high + 1, seq - 1)
+            self._high[stream] = seq
+            return True
+        missing = self._missing.get(stream)
+        if missing and missing.pop(seq, None) is not None:
+            return True  # the other connection filled the gap
+        self.duplicates += 1
+        return False
+
+    def accept_key(self, stream: Hashable, key: Hashable) -> bool:
+        """Whether a message without a sequence number is the first copy of `key`
+        among the last `window` messages of `stream`"""
+        keys = self._keys.get(stream)
+        if keys is None:
+            keys = self._keys[stream] = OrderedDict()
+        if key in keys:
+            self.duplicates += 1
+            return False
+        keys[key] = None
+        if len(keys) > self.window:
+            keys.popitem(last=False)
+        return True
+
+    def _open_gap(self, stream, first, last):
+        if last - first + 1 > self.window:
+            self._report(stream, first, last)
+            return
+        deadline = time.monotonic() + self.gap_timeout
+        missing = self._missing.setdefault(stream, {})
+        for seq in range(first, last + 1):
+            missing[seq] = deadline
+
+    def _report(self, stream, first, last):
+        self.gaps += 1
+        self._gaps.append((stream, first, last))
+
+    def expired_gaps(self) -> List[Tuple[Hashable, int, int]]:
+        """Returns the (stream, first id, last id) ranges no connection delivered
+        in time, each once"""
+        now = time.monotonic()
+        for stream, missing in self._missing.items():
+            expired = sorted(seq for seq, deadline in missing.items() if deadline <= now)
+            if not expired:
+                continue
+            for seq in expired:
+                del missing[seq]
+            start = prev = expired[0]
+            for seq in expired[1:]:
+                if seq != prev + 1:
+                    self._report(stream, start, prev)
+                    start = seq
+                prev = seq
+            self._report(stream, start, prev)
+        gaps, self._gaps = self._gaps, []
+        return gaps
+
+    def reset(self, stream: Hashable) -> None:
+        """Forgets a stream, e.g. after re-syncing it from a snapshot"""
+        self._high.pop(stream, None)
+        self._missing.pop(stream, None)
+        self._keys.pop(stream, None)
@@ -5,7 +5,6 @@ import multiprocessing
 import time
 from datetime import datetime
 
-import pandas
 import websockets
 
 from web_socket import WebSocket
@@ -4,7 +4,6 @@ import multiprocessing
 import time
 from datetime import datetime
 
-import pandas
 import websockets
 
 from web_socket import WebSocket
@@ -1,25 +1,215 @@
-import concurrent.futures as cf
-import multiprocessing as mp
-import Kucoin_Websocket as ks
-import Coinbase_Websocket as cb
-import Gemini_Websocket as gm
-import Binance_Websocket as bc
-import Kraken_Websocket as kr  # TODO: Fix these imports, and just import the class "from kraken import KrakenWebSocket"
-import pandas as pd
+'''
+Supervisor that runs every exchange websocket in its own process.
+
+Each exchange's coin list is split into shards of at most coins_per_connection
+coins, and each shard gets one worker process (one connection). Workers are
+pinned round-robin to the available cores, and each writes a heartbeat into a
+shared array from its event loop. A worker is restarted on its own when its
+process dies or its heartbeat goes stale; the other workers keep running.
+
+Both queues are bounded (queue_size batches). When a consumer falls behind,
+each worker applies its overflow policy (see backpressure.py) instead of
+growing the queue without limit. 'drop_oldest' is the default here: with
+'block', a worker stuck in put() stops beating and gets restarted.
+
+Exchanges are looked up in registry.py. The supervising process only reads the
+registry's metadata, so neither importing this module (which every spawned
+worker does) nor building a Supervisor or listing exchanges imports exchange
+code; each worker imports only its own.
+
+Usage: python main_script.py --exchanges coinbase --coins BTC-USD ETH-USD
+       python main_script.py --overflow conflate --queue-size 10000
+       python main_script.py --list
+'''
+import argparse
 import asyncio
-import schedule
-import datetime
+import multiprocessing as mp
 import os
+import time
+from typing import Dict, List, Optional
+
+import registry
+from backpressure import OVERFLOW_POLICIES
+
+HEARTBEAT_INTERVAL = 1.0
+QUEUE_SIZE = 10_000  # batches per queue
+
+
+async def _beat(heartbeats, slot):
+    """Stamps this worker's heartbeat slot for as long as its event loop is responsive"""
+    while True:
+        heartbeats[slot] = time.time()
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+
+async def _run_with_heartbeat(socket, heartbeats, slot):
+    beat = asyncio.create_task(_beat(heartbeats, slot))
+    try:
+        await socket._main()
+    finally:
+        beat.cancel()
+
+
+def _worker(exchange, queue_1, queue_2, coins, heartbeats, slot, core, options):
+    """Entry point of a worker process: one connection for one shard of coins"""
+    if core is not None and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, {core})
+    socket = registry.load(exchange)(queue_1, queue_2, coins, **options)
+    asyncio.run(_run_with_heartbeat(socket, heartbeats, slot))
+
+
+class Worker:
+    def __init__(self, slot, exchange, coins, core):
+        """Bookkeeping for one supervised connection"""
+        self.slot = slot
+        self.exchange = exchange
+        self.coins = coins
+        self.core = core
+        self.process: Optional[mp.Process] = None
+        self.restarts = 0  # consecutive restarts, reset once it stays healthy
+        self.started = 0.0
+        self.next_start = 0.0  # time.time() before which it won't be restarted
+
+
+class Supervisor:
+    def __init__(self, exchanges: Dict[str, List[str]], queue_1=None, queue_2=None,
+                 coins_per_connection=50, heartbeat_timeout=30.0, pin_cores=True,
+                 max_backoff=60.0, queue_size=QUEUE_SIZE, overflow='drop_oldest',
+                 max_pending=100_000):
+        """Builds one worker per (exchange, shard of coins)
+
+        Parameters
+        ----------
+        exchanges : Dict[str, List[str]]
+            Exchange name (see registry.names()) -> coins to subscribe to
+        queue_1 : multiprocessing.Queue, optional
+            Level 1 queue shared by every worker, by default a new Queue of
+            queue_size batches
+        queue_2 : multiprocessing.Queue, optional
+            Level 2 queue shared by every worker, by default a new Queue of
+            queue_size batches
+        coins_per_connection : int, optional
+            Max coins on a single connection, by default 50
+        heartbeat_timeout : float, optional
+            Seconds without a heartbeat before a worker is restarted, by default 30.0
+        pin_cores : bool, optional
+            Pin workers round-robin to cores (Linux only), by default True
+        max_backoff : float, optional
+            Cap in seconds on the delay between restarts of a crashing worker,
+            by default 60.0
+        queue_size : int, optional
+            Max batches in each default queue, by default QUEUE_SIZE
+        overflow : str, optional
+            Overflow policy of the workers when a queue is full, 'block',
+            'drop_oldest' or 'conflate', by default 'drop_oldest'
+        max_pending : int, optional
+            Records per queue a worker keeps while it is full, by default 100_000
+        """
+        self.queue_1 = queue_1 if queue_1 is not None else mp.Queue(maxsize=queue_size)
+        self.queue_2 = queue_2 if queue_2 is not None else mp.Queue(maxsize=queue_size)
+        self.socket_options = {'overflow': overflow, 'max_pending': max_pending}
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_backoff = max_backoff
+        self.workers: List[Worker] = []
+        cores = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') \
+            else list(range(mp.cpu_count()))
+        for exchange, coins in exchanges.items():
+            if not registry.implemented(exchange):
+                print(f'{exchange} has no websocket implementation yet, skipping')
+                continue
+            for start in range(0, len(coins), coins_per_connection):
+                slot = len(self.workers)
+                core = cores[slot % len(cores)] if pin_cores else None
+                self.workers.append(Worker(slot, exchange,
+                                           coins[start:start + coins_per_connection], core))
+        self.heartbeats = mp.Array('d', max(len(self.workers), 1), lock=False)
+
+    def _start(self, worker: Worker):
+        worker.started = time.time()
+        self.heartbeats[worker.slot] = worker.started  # grace period while it connects
+        worker.process = mp.Process(
+            target=_worker,
+            args=(worker.exchange, self.queue_1, self.queue_2, worker.coins,
+                  self.heartbeats, worker.slot, worker.core, self.socket_options),
+            name=f'{worker.exchange}-{worker.slot}',
+            daemon=True,
+        )
+        worker.process.start()
+
+    def start(self):
+        """Starts every worker"""
+        for worker in self.workers:
+            self._start(worker)
+
+    def check(self):
+        """Restarts the workers that died or stopped beating, leaves the rest alone"""
+        now = time.time()
+        for worker in self.workers:
+            process = worker.process
+            alive = process is not None and process.is_alive()
+            if alive and now - self.heartbeats[worker.slot] <= self.heartbeat_timeout:
+                if worker.restarts and now - worker.started > self.max_backoff:
+                    worker.restarts = 0
+                continue
+            if alive:
+                print(f'{process.name} missed its heartbeat, terminating')
+                process.terminate()
+                process.join(5)
+            if now < worker.next_start:
+                continue
+            worker.restarts += 1
+            worker.next_start = now + min(2 ** worker.restarts, self.max_backoff)
+            print(f'restarting {worker.exchange}-{worker.slot} (restart #{worker.restarts})')
+            self._start(worker)
+
+    def run(self, poll_interval=1.0):
+        """Starts the workers and supervises them until interrupted"""
+        self.start()
+        try:
+            while True:
+                time.sleep(poll_interval)
+                self.check()
+        finally:
+            self.stop()
+
+    def stop(self):
+        """Terminates every worker"""
+        for worker in self.workers:
+            if worker.process is not None and worker.process.is_alive():
+                worker.process.terminate()
+        for worker in self.workers:
+            if worker.process is not None:
+                worker.process.join(5)
 
-async def main(coins):  # TODO: Don't think this needs to be async
-    with cf.ProcessPoolExecutor(max_workers=mp.cpu_count()) as executor:
-        pass
 
+def main(argv=None):
+    """Command line entry point, see the module docstring"""
+    parser = argparse.ArgumentParser(description='Runs exchange websockets under a Supervisor')
+    parser.add_argument('--exchanges', nargs='+', default=['coinbase'], choices=registry.names())
+    parser.add_argument('--coins', nargs='+', default=['BTC-USD'])
+    parser.add_argument('--coins-per-connection', type=int, default=50)
+    parser.add_argument('--heartbeat-timeout', type=float, default=30.0)
+    parser.add_argument('--no-pin', action='store_true', help="don't pin workers to cores")
+    parser.add_argument('--queue-size', type=int, default=QUEUE_SIZE, help='batches per queue')
+    parser.add_argument('--overflow', choices=OVERFLOW_POLICIES, default='drop_oldest',
+                        help='what a worker does when a queue is full')
+    parser.add_argument('--max-pending', type=int, default=100_000,
+                        help='records per queue kept while it is full')
+    parser.add_argument('--list', action='store_true', help='list the exchanges and exit')
+    args = parser.parse_args(argv)
+    if args.list:
+        for name in registry.names():
+            status = 'implemented' if registry.implemented(name) else 'not implemented'
+            print(f'{name:<10} {status}')
+        return
+    Supervisor({exchange: args.coins for exchange in args.exchanges},
+               coins_per_connection=args.coins_per_connection,
+               heartbeat_timeout=args.heartbeat_timeout,
+               pin_cores=not args.no_pin,
+               queue_size=args.queue_size,
+               overflow=args.overflow,
+               max_pending=args.max_pending).run()
 
-# Test if it works!
-def activate(coins):
-    if __name__ == '__main__':
-        asyncio.get_event_loop().run_until_complete(main(coins))
 
-coins = ['BTH-USDT']
-activate(coins)
\ No newline at end of file
+if __name__ == '__main__':
+    main()
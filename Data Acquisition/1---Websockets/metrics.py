@@ -0,0 +1,186 @@
+'''
+Per-exchange latency histograms and counters for the WebSocket classes.
+
+Each record published by a WebSocket carries up to four timestamps (epoch ns):
+exchange  -> the time the exchange stamped on the message
+receive   -> recv() returned the raw message
+decode    -> the record was built and handed to publish_1/publish_2
+enqueue   -> its batch was put on the queue
+
+These are turned into per-channel histograms of the stages between them:
+network (receive - exchange, includes clock offset), decode, batch
+(enqueue - decode) and end_to_end (enqueue - exchange).
+'''
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+STAGES = ('network', 'decode', 'batch', 'end_to_end')
+COUNTERS = ('messages', 'bytes', 'drops', 'conflated', 'reconnects')
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def parse_exchange_time(timestamp: str) -> int:
+    """Converts an ISO-8601 exchange timestamp (e.g. "2022-01-01T00:00:00.123456Z")
+    into epoch nanoseconds"""
+    dt = datetime.fromisoformat(timestamp)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    delta = dt - _EPOCH
+    return (delta.days * 86_400 + delta.seconds) * 1_000_000_000 + delta.microseconds * 1_000
+
+
+class LatencyHistogram:
+    def __init__(self, sub_bucket_bits=5):
+        """HDR-style histogram of non-negative integer values (ns)
+
+        Values below 2**sub_bucket_bits get their own bucket. Above that, every
+        power of two is split into 2**(sub_bucket_bits - 1) buckets, so the
+        relative error stays under 2**-(sub_bucket_bits - 1) (~6% by default)
+        with a few hundred buckets covering the whole int64 range.
+
+        Parameters
+        ----------
+        sub_bucket_bits : int, optional
+            Precision, by default 5
+        """
+        self.bits = sub_bucket_bits
+        self.half = 1 << (sub_bucket_bits - 1)
+        self.linear = 1 << sub_bucket_bits
+        self.counts = [0] * (self.linear + (64 - sub_bucket_bits) * self.half)
+        self.count = 0
+        self.max = 0
+
+    def _index(self, value: int) -> int:
+        if value < self.linear:
+            return value
+        shift = value.bit_length() - self.bits
+        return self.linear + (shift - 1) * self.half + ((value >> shift) - self.half)
+
+    def _lower_bound(self, index: int) -> int:
+        if index < self.linear:
+            return index
+        shift, offset = divmod(index - self.linear, self.half)
+        return (offset + self.half) << (shift + 1)
+
+    def record(self, value: int) -> None:
+        value = int(value) if value > 0 else 0
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def percentiles(self, quantiles: Iterable[float]) -> Dict[float, float]:
+        """Returns {quantile: value} for quantiles in [0, 1], using the lower
+        bound of the bucket each quantile falls in (NaN when empty)"""
+        quantiles = list(quantiles)
+        if not self.count:
+            return {q: np.nan for q in quantiles}
+        cumulative = np.cumsum(self.counts)
+        result = {}
+        for q in quantiles:
+            index = int(np.searchsorted(cumulative, max(1, int(np.ceil(q * self.count)))))
+            result[q] = float(min(self._lower_bound(index), self.max))
+        return result
+
+    def reset(self) -> None:
+        self.counts = [0] * len(self.counts)
+        self.count = 0
+        self.max = 0
+
+
+class SocketMetrics:
+    def __init__(self, exchange: str):
+        """Counters and per-channel stage histograms of one WebSocket
+
+        Parameters
+        ----------
+        exchange : str
+            Exchange name used in snapshots and log lines
+        """
+        self.exchange = exchange
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.channels: Dict[str, Dict[str, LatencyHistogram]] = {}
+
+    def _channel(self, channel: str) -> Dict[str, LatencyHistogram]:
+        histograms = self.channels.get(channel)
+        if histograms is None:
+            histograms = self.channels[channel] = {stage: LatencyHistogram() for stage in STAGES}
+        return histograms
+
+    def received(self, nbytes: int) -> int:
+        """Counts one raw message and returns its receive time (epoch ns)"""
+        self.counters['messages'] += 1
+        self.counters['bytes'] += nbytes
+        return time.time_ns()
+
+    def dropped(self, n: int = 1) -> None:
+        self.counters['drops'] += n
+
+    def conflated(self, n: int = 1) -> None:
+        """Counts records merged into a newer one of the same key"""
+        self.counters['conflated'] += n
+
+    def reconnected(self) -> None:
+        self.counters['reconnects'] += 1
+
+    def enqueued(self, channel: str, stamps: Iterable[Tuple[Optional[int], int, int]]) -> None:
+        """Records the stages of records whose batch was just put on a queue
+
+        Parameters
+        ----------
+        channel : str
+            Channel the batch belongs to, e.g. 'level1'
+        stamps : Iterable[Tuple[Optional[int], int, int]]
+            (exchange, receive, decode) epoch ns per record, exchange may be None
+        """
+        enqueue_ns = time.time_ns()
+        histograms = self._channel(channel)
+        network, decode, batch, end_to_end = (histograms[stage] for stage in STAGES)
+        for exchange_ns, recv_ns, decode_ns in stamps:
+            decode.record(decode_ns - recv_ns)
+            batch.record(enqueue_ns - decode_ns)
+            if exchange_ns is not None:
+                network.record(recv_ns - exchange_ns)
+                end_to_end.record(enqueue_ns - exchange_ns)
+
+    def snapshot(self, reset: bool = False) -> Dict:
+        """Returns the counters and, per channel and stage, count/p50/p99/p999/max
+        in microseconds
+
+        Parameters
+        ----------
+        reset : bool, optional
+            Clear everything afterwards (for per-interval stats), by default False
+        """
+        channels = {}
+        for channel, histograms in self.channels.items():
+            channels[channel] = {}
+            for stage, histogram in histograms.items():
+                p50, p99, p999 = histogram.percentiles((0.5, 0.99, 0.999)).values()
+                channels[channel][stage] = {
+                    'count': histogram.count, 'p50': p50 / 1e3, 'p99': p99 / 1e3,
+                    'p999': p999 / 1e3, 'max': histogram.max / 1e3,
+                }
+                if reset:
+                    histogram.reset()
+        snapshot = {'exchange': self.exchange, 'counters': dict(self.counters), 'channels': channels}
+        if reset:
+            self.counters = dict.fromkeys(COUNTERS, 0)
+        return snapshot
+
+    @staticmethod
+    def format(snapshot: Dict) -> str:
+        """One log line summarizing a snapshot"""
+        counters = ' '.join(f'{name}={value}' for name, value in snapshot['counters'].items())
+        parts = [f"[{snapshot['exchange']}] {counters}"]
+        for channel, stages in snapshot['channels'].items():
+            e2e = stages['end_to_end']
+            stage = 'end_to_end' if e2e['count'] else 'decode'
+            stats = stages[stage]
+            parts.append(f"{channel} {stage} p50={stats['p50']:.0f}us p99={stats['p99']:.0f}us "
+                         f"p999={stats['p999']:.0f}us n={stats['count']}")
+        return ' | '.join(parts)
@@ -0,0 +1,131 @@
+'''
+In-memory level 2 order book, built from an exchange snapshot and kept current
+from incremental changes.
+
+Each side keeps a price -> size dict next to a binary heap of its prices (best
+price on top) with lazy deletion:
+- a size change on an existing level is a dict write, O(1)
+- a new level is a dict write plus a heap push, O(log n)
+- a removed level is only dropped from the dict; its heap entry is skipped
+  (and popped) once it reaches the top, and the heap is rebuilt from the dict
+  when stale entries outnumber live ones, so removal is O(log n) amortized
+- the best price is the top of the heap, top-N depth a best-first walk of the
+  heap, O(N log N)
+'''
+import heapq
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+DEPTH_FIELDS = ('time', 'exchange', 'ticker', 'bids', 'asks')
+
+
+class OrderBookSide:
+    def __init__(self, is_bid: bool):
+        """One side of the book
+
+        Parameters
+        ----------
+        is_bid : bool
+            True for bids (best = highest price), False for asks (best = lowest)
+        """
+        self.is_bid = is_bid
+        self._sign = -1.0 if is_bid else 1.0  # heap keys, so the best price is the smallest key
+        self._heap: List[float] = []
+        self._in_heap: Set[float] = set()  # prices with an entry in the heap, live or stale
+        self._sizes: Dict[float, float] = {}
+
+    def __len__(self):
+        return len(self._sizes)
+
+    def clear(self) -> None:
+        self._heap.clear()
+        self._in_heap.clear()
+        self._sizes.clear()
+
+    def update(self, price: float, size: float) -> None:
+        """Sets the size resting at a price level, removing it when size is 0"""
+        if size == 0:
+            if self._sizes.pop(price, None) is not None and \
+                    len(self._heap) > 2 * len(self._sizes) + 64:
+                self._rebuild()
+        else:
+            if price not in self._in_heap:
+                heapq.heappush(self._heap, self._sign * price)
+                self._in_heap.add(price)
+            self._sizes[price] = size
+
+    def _rebuild(self) -> None:
+        """Drops the stale heap entries, O(n)"""
+        self._heap = [self._sign * price for price in self._sizes]
+        heapq.heapify(self._heap)
+        self._in_heap = set(self._sizes)
+
+    def best(self) -> Optional[Tuple[float, float]]:
+        """Returns the best (price, size), or None if the side is empty"""
+        heap, sizes = self._heap, self._sizes
+        while heap:
+            price = self._sign * heap[0]
+            size = sizes.get(price)
+            if size is not None:
+                return price, size
+            heapq.heappop(heap)  # removed level
+            self._in_heap.discard(price)
+        return None
+
+    def top(self, n: int) -> List[Tuple[float, float]]:
+        """Returns the best n levels as (price, size), best first"""
+        heap, sizes, sign = self._heap, self._sizes, self._sign
+        levels = []
+        # best-first walk of the heap tree: a node is only reached after its parent
+        frontier = [(heap[0], 0)] if heap else []
+        while frontier and len(levels) < n:
+            key, i = heapq.heappop(frontier)
+            size = sizes.get(sign * key)
+            if size is not None:
+                levels.append((sign * key, size))
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (heap[child], child))
+        return levels
+
+
+class OrderBook:
+    def __init__(self, product_id: str):
+        """Level 2 book for a single product
+
+        Parameters
+        ----------
+        product_id : str
+            Exchange product id, e.g. 'BTC-USD'
+        """
+        self.product_id = product_id
+        self.bids = OrderBookSide(is_bid=True)
+        self.asks = OrderBookSide(is_bid=False)
+
+    def apply_snapshot(self, bids: Iterable, asks: Iterable) -> None:
+        """Replaces the whole book with the [price, size] levels of a snapshot"""
+        self.bids.clear()
+        self.asks.clear()
+        for price, size, *_ in bids:
+            self.bids.update(float(price), float(size))
+        for price, size, *_ in asks:
+            self.asks.update(float(price), float(size))
+
+    def apply_change(self, side: str, price: float, size: float) -> None:
+        """Applies one change, side being 'buy' (bid) or 'sell' (ask)"""
+        book_side = self.bids if side == 'buy' else self.asks
+        book_side.update(price, size)
+
+    def apply_changes(self, changes: Iterable) -> None:
+        """Applies every [side, price, size] change of an update message"""
+        for side, price, size in changes:
+            self.apply_change(side, float(price), float(size))
+
+    def best_bid(self) -> Optional[Tuple[float, float]]:
+        return self.bids.best()
+
+    def best_ask(self) -> Optional[Tuple[float, float]]:
+        return self.asks.best()
+
+    def depth(self, n: int) -> Tuple[List[Tuple[float, float]], List[Tuple[float, float]]]:
+        """Returns the top n (bids, asks) levels, best first"""
+        return self.bids.top(n), self.asks.top(n)
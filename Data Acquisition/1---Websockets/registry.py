@@ -0,0 +1,100 @@
+'''
+Registry of the exchange WebSocket plugins, keyed by exchange name.
+
+Plugins are registered as 'module:Class' strings with a declared implemented
+flag, and a module is only imported the first time its exchange is loaded.
+Listing, validating or sharding exchanges only reads that metadata (see
+implemented()), so it imports no exchange module and none of its dependencies,
+and a worker process only pays for the one exchange it runs.
+'''
+import importlib
+import importlib.util
+from typing import Dict, List, NamedTuple, Optional
+
+
+class Plugin(NamedTuple):
+    """Registry entry of one exchange
+
+    Attributes
+    ----------
+    target : str
+        'module:Class' of its WebSocket subclass
+    implemented : bool
+        Whether the class exists yet, so stubs are skipped without importing them
+    """
+    target: str
+    implemented: bool = True
+
+
+_PLUGINS: Dict[str, Plugin] = {
+    'coinbase': Plugin('coinbase:CoinbaseWebSocket'),
+    'binance': Plugin('binance:BinanceWebSocket', implemented=False),
+    'kraken': Plugin('kraken:KrakenWebSocket', implemented=False),
+    'gemini': Plugin('gemini:GeminiWebSocket', implemented=False),
+    'kucoin': Plugin('kucoin:KucoinWebSocket', implemented=False),
+}
+_loaded: Dict[str, Optional[type]] = {}
+
+
+def register(name: str, target: str, implemented: bool = True) -> None:
+    """Registers (or replaces) an exchange plugin
+
+    Parameters
+    ----------
+    name : str
+        Exchange name, e.g. 'coinbase'
+    target : str
+        'module:Class' of its WebSocket subclass, importable from sys.path
+    implemented : bool, optional
+        Whether the class is ready to run, by default True
+    """
+    module_name, _, class_name = target.partition(':')
+    if not module_name or not class_name:
+        raise ValueError(f"Expected 'module:Class', got {target!r}")
+    _PLUGINS[name] = Plugin(target, implemented)
+    _loaded.pop(name, None)
+
+
+def names() -> List[str]:
+    """Every registered exchange name"""
+    return list(_PLUGINS)
+
+
+def _plugin(name: str) -> Plugin:
+    plugin = _PLUGINS.get(name)
+    if plugin is None:
+        raise KeyError(f'Unknown exchange {name!r}, registered: {", ".join(_PLUGINS)}')
+    return plugin
+
+
+def installed(name: str) -> bool:
+    """Whether the plugin's module can be found, without importing it"""
+    module_name = _plugin(name).target.partition(':')[0]
+    return importlib.util.find_spec(module_name) is not None
+
+
+def implemented(name: str) -> bool:
+    """Whether an exchange is declared implemented and its module is installed,
+    without importing it
+
+    Raises
+    ------
+    KeyError
+        For exchanges that aren't registered
+    """
+    return _plugin(name).implemented and installed(name)
+
+
+def load(name: str) -> Optional[type]:
+    """Imports and returns the WebSocket subclass of an exchange, or None if
+    its module doesn't define it yet
+
+    Raises
+    ------
+    KeyError
+        For exchanges that aren't registered
+    """
+    if name not in _loaded:
+        module_name, _, class_name = _plugin(name).target.partition(':')
+        _loaded[name] = getattr(importlib.import_module(module_name), class_name, None)
+    return _loaded[name]
@@ -0,0 +1,195 @@
+'''
+Shared-memory transport that can stand in for queue_1/queue_2.
+
+SharedRingBuffer is a single-producer/multi-consumer ring of fixed-size numpy
+records in a multiprocessing.shared_memory block. The producing WebSocket calls
+put(batch) exactly like it would on a multiprocessing.Queue, but the records
+are copied straight into shared memory instead of being pickled and piped.
+Every consumer reads through its own RingReader, so consumers never block the
+producer or each other.
+
+Each record gets a sequence number. The producer never waits: once the ring is
+full it overwrites the oldest records, and a reader that falls more than
+`capacity` records behind sees the gap and counts it in `lost`.
+
+Layout of the block: [write_seq (int64) | padding][seq per slot (int64)][records]
+'''
+from multiprocessing import resource_tracker, shared_memory
+from typing import Optional, Tuple
+
+import numpy as np
+
+from web_socket import LEVEL_1_RECORD, LEVEL_2_RECORD
+
+_HEADER_BYTES = 64
+
+# Fixed-size layouts of the tuples non-compact sockets publish (LEVEL_1_FIELDS/LEVEL_2_FIELDS)
+LEVEL_1_DTYPE = np.dtype([('time', 'U26'), ('exchange', 'U16'), ('ticker', 'U16'),
+                          ('price', np.float64)])
+LEVEL_2_DTYPE = np.dtype([('time', 'U26'), ('exchange', 'U16'), ('ticker', 'U16'),
+                          ('side', 'U4'), ('price', np.float64), ('quantity', np.float64)])
+
+
+def ring_dtypes(compact: bool = False) -> Tuple[np.dtype, np.dtype]:
+    """Returns the (level 1, level 2) ring dtypes matching what a WebSocket
+    publishes: LEVEL_1_RECORD/LEVEL_2_RECORD with compact=True, else
+    LEVEL_1_DTYPE/LEVEL_2_DTYPE"""
+    if compact:
+        return LEVEL_1_RECORD, LEVEL_2_RECORD
+    return LEVEL_1_DTYPE, LEVEL_2_DTYPE
+
+
+class SharedRingBuffer:
+    def __init__(self, dtype, capacity, name=None, create=True, _inherited=False):
+        """Creates (or attaches to) a ring of `capacity` records of `dtype`
+
+        Parameters
+        ----------
+        dtype : np.dtype
+            Fixed-size record layout
+        capacity : int
+            Number of record slots
+        name : str, optional
+            Shared memory block name, by default a generated one
+        create : bool, optional
+            Create the block (producer) or attach to an existing one, by default True
+        """
+        self.dtype = np.dtype(dtype)
+        self.capacity = capacity
+        size = _HEADER_BYTES + capacity * (8 + self.dtype.itemsize)
+        self._shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+        if not create and not _inherited:
+            # Attaching registers the block with this process' resource tracker, which
+            # would unlink it when this process exits. Only the creator owns it.
+            # Child processes share the creator's tracker, so they skip this.
+            resource_tracker.unregister(self._shm._name, 'shared_memory')
+        self._owner = create
+        buf = self._shm.buf
+        self._header = np.ndarray((1,), dtype=np.int64, buffer=buf)
+        self._seqs = np.ndarray((capacity,), dtype=np.int64, buffer=buf, offset=_HEADER_BYTES)
+        self._records = np.ndarray((capacity,), dtype=self.dtype, buffer=buf,
+                                   offset=_HEADER_BYTES + 8 * capacity)
+        if create:
+            self._header[0] = 0
+            self._seqs[:] = -1
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    @property
+    def write_seq(self) -> int:
+        """Sequence number the next record will get"""
+        return int(self._header[0])
+
+    def __getstate__(self):
+        # Sent to consumer processes by name, like a Queue handle
+        return {'dtype': self.dtype, 'capacity': self.capacity, 'name': self.name}
+
+    def __setstate__(self, state):
+        self.__init__(state['dtype'], state['capacity'], name=state['name'], create=False,
+                      _inherited=True)
+
+    def full(self) -> bool:
+        """Never full, the oldest records are overwritten instead"""
+        return False
+
+    def put(self, batch) -> None:
+        """Appends a batch (list of record tuples or a record array of the ring's dtype)
+
+        Raises
+        ------
+        ValueError
+            If a record array has other fields than the ring, e.g. compact
+            records put on a LEVEL_*_DTYPE ring (see ring_dtypes)
+        """
+        if isinstance(batch, np.ndarray):
+            if batch.dtype.names != self.dtype.names or \
+                    any(batch.dtype[name].kind != self.dtype[name].kind for name in self.dtype.names):
+                raise ValueError(f'Records of dtype {batch.dtype} don\'t fit a ring of {self.dtype}')
+            records = batch.astype(self.dtype, copy=False)
+        else:
+            records = np.asarray(batch, dtype=self.dtype)
+        n = len(records)
+        if n == 0:
+            return
+        if n > self.capacity:
+            records = records[-self.capacity:]
+            self._header[0] += n - self.capacity
+            n = self.capacity
+        start = int(self._header[0])
+        seqs = np.arange(start, start + n, dtype=np.int64)
+        slots = seqs % self.capacity
+        self._seqs[slots] = -1  # mark the slots as being written
+        self._records[slots] = records
+        self._seqs[slots] = seqs
+        self._header[0] = start + n
+
+    def reader(self, from_oldest=False) -> 'RingReader':
+        """Returns a reader starting at the newest (or oldest retained) record"""
+        return RingReader(self, from_oldest)
+
+    def close(self) -> None:
+        self._header = self._seqs = self._records = None
+        self._shm.close()
+
+    def unlink(self) -> None:
+        """Frees the block, to be called once by the creator"""
+        if self._owner:
+            self._shm.unlink()
+
+
+class RingReader:
+    def __init__(self, ring: SharedRingBuffer, from_oldest=False):
+        """Independent read cursor over a SharedRingBuffer
+
+        Parameters
+        ----------
+        ring : SharedRingBuffer
+            Ring to read from
+        from_oldest : bool, optional
+            Start at the oldest retained record instead of the next new one,
+            by default False
+        """
+        self.ring = ring
+        write_seq = ring.write_seq
+        self.read_seq = max(0, write_seq - ring.capacity) if from_oldest else write_seq
+        self.lost = 0  # records overwritten before this reader got to them
+
+    def read(self, max_records: Optional[int] = None) -> Tuple[np.ndarray, int]:
+        """Copies out every record published since the last read
+
+        Parameters
+        ----------
+        max_records : int, optional
+            Upper bound on records returned, by default no bound
+
+        Returns
+        -------
+        Tuple[np.ndarray, int]
+            The records, and how many records were lost to an overrun
+            since the previous read
+        """
+        ring = self.ring
+        write_seq = ring.write_seq
+        lost = 0
+        oldest = write_seq - ring.capacity
+        if self.read_seq < oldest:
+            lost = oldest - self.read_seq
+            self.read_seq = oldest
+        end = write_seq if max_records is None else min(write_seq, self.read_seq + max_records)
+        seqs = np.arange(self.read_seq, end, dtype=np.int64)
+        slots = seqs % ring.capacity
+        records = ring._records[slots]
+        # Anything overwritten while we were copying no longer carries its sequence number
+        valid = ring._seqs[slots] == seqs
+        if not valid.all():
+            first_bad = int(np.argmin(valid))
+            records = records[:first_bad]
+            resume = max(int(seqs[first_bad]), ring.write_seq - ring.capacity)
+            lost += resume - int(seqs[first_bad])
+            self.read_seq = resume
+        else:
+            self.read_seq = end
+        self.lost += lost
+        return records, lost
@@ -8,18 +8,370 @@ The main_script will create each websocket with the following inputs:
 queue_1 -> stores the multiprocessing queue that stores market level 1 data (see Coinbase_Websocket.py)
 queue_2 -> stores the multiprocessing queue that stores market level 2 data (ditto)
 coins -> stores strings that each represent crypto tickers 
+
+Records are published with publish_1/publish_2 as plain tuples laid out as
+LEVEL_1_FIELDS/LEVEL_2_FIELDS. They are put on the queues in batches (lists of
+records) every batch_size records per queue or every batch_interval seconds,
+whichever comes first, so a consumer can do
+pd.DataFrame.from_records(batch, columns=LEVEL_1_FIELDS) if it wants a frame.
+
+Anything with put(batch)/full() works as a queue. shm_ring.SharedRingBuffer is a
+shared-memory alternative that skips pickling; give it the dtypes of
+shm_ring.ring_dtypes(compact).
+
+With compact=True, records are normalized by a RecordCodec into the fixed
+LEVEL_1_RECORD/LEVEL_2_RECORD dtypes instead (epoch ns times, float64 prices,
+interned integer exchange/ticker ids, +1/-1 sides) and every batch is put on
+its queue as one numpy record array, so batches of different exchanges
+concatenate as-is. Subclasses only declare level_1_map/level_2_map (record
+field -> message key or callable) and pass raw messages to emit_1/emit_2,
+which publish the compact record or its LEVEL_1_FIELDS/LEVEL_2_FIELDS tuple
+depending on compact. The tuples are built straight from the message
+(RecordCodec.encode_legacy), not decoded from the record.
+
+When a consumer falls behind a bounded queue, overflow picks what happens to
+the batches it can't take yet: 'block' (put() waits, the default),
+'drop_oldest' or 'conflate' (level 2 changes merged per product, side and
+price, level 1 records dropped oldest first). See backpressure.py.
+
+Every WebSocket keeps latency histograms and counters in self.metrics (see
+metrics.py). Subclasses call self.metrics.received(len(message)) right after
+recv() and pass the exchange and receive times to publish_1/publish_2;
+self.metrics.snapshot() returns the stats and metrics_interval logs them.
 '''
 from abc import ABC, abstractmethod
-from typing import Dict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional, Union
 
 import asyncio
+import logging
+import time
+import zlib
+
+import numpy as np
+
+from backpressure import Outbox, channel_policy
+from metrics import SocketMetrics, parse_exchange_time
+
+logger = logging.getLogger(__name__)
+
+LEVEL_1_FIELDS = ('time', 'exchange', 'ticker', 'price')
+LEVEL_2_FIELDS = ('time', 'exchange', 'ticker', 'side', 'price', 'quantity')
+
+# Compact layouts produced by RecordCodec, time in epoch ns and ids from intern()
+LEVEL_1_RECORD = np.dtype([('time', np.int64), ('exchange', np.uint32), ('ticker', np.uint32),
+                           ('price', np.float64)])
+LEVEL_2_RECORD = np.dtype([('time', np.int64), ('exchange', np.uint32), ('ticker', np.uint32),
+                           ('side', np.int8), ('price', np.float64), ('quantity', np.float64)])
+SIDES = {'buy': 1, 'bid': 1, 'bids': 1, 'sell': -1, 'ask': -1, 'asks': -1, 'offer': -1}
+SIDE_NAMES = {1: 'buy', -1: 'sell', 0: ''}
+
+_EPOCH = datetime(1970, 1, 1)
+_names: Dict[int, str] = {}
+
+
+def intern(name: str) -> int:
+    """Returns the integer id of an exchange or ticker name
+
+    Ids are the CRC-32 of the name, so every process (and every exchange)
+    assigns the same id to the same name without sharing a table.
+
+    Raises
+    ------
+    ValueError
+        If the id is already taken by another name this process interned,
+        rather than letting two names share it
+    """
+    key = zlib.crc32(name.encode())
+    known = _names.setdefault(key, name)
+    if known != name:
+        raise ValueError(f'{name!r} and {known!r} have the same id {key}, rename one of them')
+    return key
+
+
+def name_of(key: int) -> str:
+    """Returns the name behind an id this process has interned"""
+    return _names[int(key)]
+
+
+def _to_ns(value) -> int:
+    if isinstance(value, str):
+        return parse_exchange_time(value)
+    return int(value)
+
+
+def _to_legacy_time(value) -> str:
+    if isinstance(value, str):
+        return value.replace('Z', '').replace('T', ' ')
+    return _format_ns(int(value))
+
+
+def _format_ns(value: int) -> str:
+    return (_EPOCH + timedelta(microseconds=value // 1000)).strftime('%Y-%m-%d %H:%M:%S.%f')
+
+
+_CONVERTERS = {'time': _to_ns, 'exchange': intern, 'ticker': intern,
+               'side': lambda side: SIDES.get(side, 0) if isinstance(side, str) else int(side)}
+# non-compact records keep the exchange's own strings, with ISO times made 'YYYY-MM-DD hh:mm:ss'
+_LEGACY_CONVERTERS = {'time': _to_legacy_time, 'exchange': str, 'ticker': str,
+                      'side': lambda side: side if isinstance(side, str) else SIDE_NAMES.get(int(side), '')}
+
+
+class RecordCodec:
+    def __init__(self, dtype: np.dtype, mapping: Dict[str, Union[str, Callable]], exchange: str):
+        """Normalizes raw exchange messages into records of a compact dtype
+
+        Parameters
+        ----------
+        dtype : np.dtype
+            LEVEL_1_RECORD or LEVEL_2_RECORD
+        mapping : Dict[str, Union[str, Callable]]
+            Record field -> message key, or callable taking the message. The
+            exchange field defaults to `exchange`.
+        exchange : str
+            Exchange name stored in every record
+        """
+        self.dtype = np.dtype(dtype)
+        self.exchange = exchange
+        exchange_id = intern(exchange)
+        self._getters = []
+        self._legacy_getters = []  # same fields, converted straight to the legacy tuple
+        for field in self.dtype.names:
+            source = mapping.get(field)
+            convert = _CONVERTERS.get(field, float)
+            legacy = _LEGACY_CONVERTERS.get(field, float)
+            if source is None:
+                if field != 'exchange':
+                    raise ValueError(f'No mapping for field {field!r}')
+                self._getters.append((field, lambda message, value=exchange_id: value))
+                self._legacy_getters.append((field, lambda message, value=exchange: value))
+            elif callable(source):
+                self._getters.append((field, lambda message, f=source, c=convert: c(f(message))))
+                self._legacy_getters.append((field, lambda message, f=source, c=legacy: c(f(message))))
+            else:
+                self._getters.append((field, lambda message, k=source, c=convert: c(message[k])))
+                self._legacy_getters.append((field, lambda message, k=source, c=legacy: c(message[k])))
+        self._encoders = [get for _, get in self._getters]
+        self._legacy_encoders = [get for _, get in self._legacy_getters]
+        self._time = self._encoders[0]  # time is the first field of every layout
+
+    def encode(self, message, **values) -> tuple:
+        """Returns the record of a message as a tuple laid out as self.dtype
+
+        Parameters
+        ----------
+        message : Dict
+            Decoded exchange message
+        **values
+            Raw field values taking precedence over the mapping, e.g. the
+            side/price/quantity of one change of a multi-change message
+        """
+        if values:
+            return tuple(_CONVERTERS.get(field, float)(values[field]) if field in values
+                         else get(message) for field, get in self._getters)
+        return tuple([get(message) for get in self._encoders])
+
+    def encode_legacy(self, message, **values) -> tuple:
+        """Returns the LEVEL_1_FIELDS/LEVEL_2_FIELDS style tuple of a message
+        directly, without the ns/id round trip of legacy(encode(message))
+
+        Parameters
+        ----------
+        message : Dict
+            Decoded exchange message
+        **values
+            Raw field values taking precedence over the mapping, see encode
+        """
+        if values:
+            return tuple(_LEGACY_CONVERTERS.get(field, float)(values[field]) if field in values
+                         else get(message) for field, get in self._legacy_getters)
+        return tuple([get(message) for get in self._legacy_encoders])
+
+    def time_ns(self, message) -> int:
+        """Returns the exchange time of a message in epoch ns"""
+        return self._time(message)
+
+    def to_array(self, records) -> np.ndarray:
+        """Packs encoded records into one record array"""
+        return np.array(records, dtype=self.dtype)
+
+    def legacy(self, record: tuple) -> tuple:
+        """Converts an encoded record back to the LEVEL_1_FIELDS/LEVEL_2_FIELDS
+        style tuple (string time and names, 'buy'/'sell' sides)"""
+        out = []
+        for field, value in zip(self.dtype.names, record):
+            if field == 'time':
+                value = _format_ns(value)
+            elif field in ('exchange', 'ticker'):
+                value = name_of(value)
+            elif field == 'side':
+                value = SIDE_NAMES.get(value, '')
+            out.append(value)
+        return tuple(out)
 
 
 class WebSocket(ABC): # TODO: Decide whether its "websocket" or "web socket"
-    def __init__(self, queue_1, queue_2, coins=[]):  # TODO: Add more descriptive queue names
+    exchange = None  # name used in metrics and records, defaults to the class name
+    level_1_map = None  # RecordCodec mappings, see emit_1/emit_2
+    level_2_map = None
+
+    def __init__(self, queue_1, queue_2, coins=[], batch_size=1, batch_interval=None,
+                 metrics_interval=None, compact=False, overflow='block',
+                 max_pending=100_000):  # TODO: Add more descriptive queue names
+        """Stores the queues and coins, and sets up the outgoing batches
+
+        Parameters
+        ----------
+        queue_1 : multiprocessing.Queue
+            Receives batches of market level 1 records
+        queue_2 : multiprocessing.Queue
+            Receives batches of market level 2 records
+        coins : List[str], optional
+            Tickers to subscribe to, by default []
+        batch_size : int, optional
+            Records per batch before a queue is flushed, by default 1
+        batch_interval : float, optional
+            Max seconds a record waits in a batch, by default None (no timer)
+        metrics_interval : float, optional
+            Seconds between two metrics log lines, by default None (no logging)
+        compact : bool, optional
+            Publish LEVEL_1_RECORD/LEVEL_2_RECORD record arrays instead of lists
+            of LEVEL_1_FIELDS/LEVEL_2_FIELDS tuples, by default False
+        overflow : str, optional
+            What to do with batches a full queue can't take, 'block',
+            'drop_oldest' or 'conflate' (see backpressure.py), by default 'block'
+        max_pending : int, optional
+            Records per queue kept while it is full (not with 'block'),
+            by default 100_000
+        """
         self.queue_1 = queue_1
         self.queue_2 = queue_2
         self.coins = coins
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self._batch_1 = []
+        self._batch_2 = []
+        self._batch_started: Optional[float] = None  # monotonic time of the oldest pending record
+        self._stamps_1 = []  # (exchange, receive, decode) ns of each pending record
+        self._stamps_2 = []
+        self.metrics_interval = metrics_interval
+        self.metrics = SocketMetrics(self.exchange or type(self).__name__)
+        self.compact = compact
+        self.overflow = overflow
+        self._outbox_1 = Outbox(queue_1, 'level1', self.metrics, channel_policy(overflow, 'level1'),
+                                max_pending, self._level_1_batch)
+        self._outbox_2 = Outbox(queue_2, 'level2', self.metrics, channel_policy(overflow, 'level2'),
+                                max_pending, self._level_2_batch)
+        name = self.exchange or type(self).__name__
+        self.codecs = {channel: RecordCodec(dtype, mapping, name)
+                       for channel, dtype, mapping in (('level1', LEVEL_1_RECORD, self.level_1_map),
+                                                       ('level2', LEVEL_2_RECORD, self.level_2_map))
+                       if mapping is not None}
+
+    def emit_1(self, message: Dict, recv_ns: Optional[int] = None, **values) -> None:
+        """Encodes a raw message with level_1_map and publishes it to queue_1
+
+        Parameters
+        ----------
+        message : Dict
+            Decoded exchange message
+        recv_ns : int, optional
+            Receive time from self.metrics.received(), by default None
+        **values
+            Field values overriding the mapping, see RecordCodec.encode
+        """
+        codec = self.codecs['level1']
+        if self.compact:
+            record = codec.encode(message, **values)
+            self.publish_1(record, record[0], recv_ns)
+        else:
+            self.publish_1(codec.encode_legacy(message, **values),
+                           codec.time_ns(message) if recv_ns is not None else None, recv_ns)
+
+    def emit_2(self, message: Dict, recv_ns: Optional[int] = None, **values) -> None:
+        """Encodes a raw message with level_2_map and publishes it to queue_2, see emit_1"""
+        codec = self.codecs['level2']
+        if self.compact:
+            record = codec.encode(message, **values)
+            self.publish_2(record, record[0], recv_ns)
+        else:
+            self.publish_2(codec.encode_legacy(message, **values),
+                           codec.time_ns(message) if recv_ns is not None else None, recv_ns)
+
+    def publish_1(self, record: tuple, exchange_ns: Optional[int] = None,
+                  recv_ns: Optional[int] = None) -> None:
+        """Adds a level 1 record to the pending batch for queue_1
+
+        Parameters
+        ----------
+        record : tuple
+            Record laid out as LEVEL_1_FIELDS
+        exchange_ns : int, optional
+            Exchange timestamp of the message in epoch ns, by default None
+        recv_ns : int, optional
+            Receive time from self.metrics.received(), by default None (not timed)
+        """
+        if self._batch_started is None:
+            self._batch_started = time.monotonic()
+        self._batch_1.append(record)
+        if recv_ns is not None:
+            self._stamps_1.append((exchange_ns, recv_ns, time.time_ns()))
+        if len(self._batch_1) >= self.batch_size:
+            self.flush()
+
+    def publish_2(self, record: tuple, exchange_ns: Optional[int] = None,
+                  recv_ns: Optional[int] = None) -> None:
+        """Adds a level 2 record to the pending batch for queue_2, see publish_1"""
+        if self._batch_started is None:
+            self._batch_started = time.monotonic()
+        self._batch_2.append(record)
+        if recv_ns is not None:
+            self._stamps_2.append((exchange_ns, recv_ns, time.time_ns()))
+        if len(self._batch_2) >= self.batch_size:
+            self.flush()
+
+    def _level_1_batch(self, records):
+        return np.array(records, dtype=LEVEL_1_RECORD) if self.compact else records
+
+    def _level_2_batch(self, records):
+        return np.array(records, dtype=LEVEL_2_RECORD) if self.compact else records
+
+    def flush(self) -> None:
+        """Hands every pending batch to its queue's Outbox"""
+        if self._batch_1:
+            self._outbox_1.send(self._batch_1, self._stamps_1)
+            self._batch_1 = []
+            self._stamps_1 = []
+        if self._batch_2:
+            self._outbox_2.send(self._batch_2, self._stamps_2)
+            self._batch_2 = []
+            self._stamps_2 = []
+        self._batch_started = None
+
+    async def _drain_periodically(self, interval=0.005) -> None:
+        """Retries what the outboxes kept while their queues were full"""
+        while True:
+            await asyncio.sleep(interval)
+            self._outbox_1.drain()
+            self._outbox_2.drain()
+
+    async def _flush_periodically(self) -> None:
+        """Flushes batches that have waited batch_interval seconds"""
+        while True:
+            started = self._batch_started
+            delay = self.batch_interval
+            if started is not None:
+                delay = started + self.batch_interval - time.monotonic()
+                if delay <= 0:
+                    self.flush()
+                    continue
+            await asyncio.sleep(delay)
+
+    async def _log_metrics_periodically(self) -> None:
+        """Logs the metrics of the last metrics_interval seconds"""
+        while True:
+            await asyncio.sleep(self.metrics_interval)
+            logger.info(self.metrics.format(self.metrics.snapshot(reset=True)))
 
     @abstractmethod
     def on_open(self) -> Dict:
@@ -40,8 +392,22 @@ class WebSocket(ABC): # TODO: Decide whether its "websocket" or "web socket"
         """
         raise NotImplementedError
 
-    async def _main(self):  # TODO: Not sure if this is needed add docstring for purpose
-        await self.run()
+    async def _main(self):
+        """Runs the socket alongside the batch timer and metrics logger, flushing
+        on the way out"""
+        tasks = []
+        if self.batch_interval is not None:
+            tasks.append(asyncio.create_task(self._flush_periodically()))
+        if self.metrics_interval is not None:
+            tasks.append(asyncio.create_task(self._log_metrics_periodically()))
+        if self.overflow != 'block':
+            tasks.append(asyncio.create_task(self._drain_periodically()))
+        try:
+            await self._run()
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.flush()
 
     def run(self):  # TODO: Add docstring for purpose
         asyncio.run(self._main())
@@ -0,0 +1,190 @@
+'''
+Throughput/latency benchmark of the websocket clients against a local ExchangeStub.
+
+Each client runs in its own process against the stub (itself another process),
+so no network access is needed. Reported per client:
+- messages: records that reached the queue (CoinbaseWebSocket) or the minute
+  files on disk (Ingest/tradesocket.py)
+- msgs/s:   messages / duration
+- p50/p99/p999: end-to-end latency in ms, from the stub stamping a message to
+  it being taken off the queue, or to the file holding it being written
+  (tradesocket's includes the wait for its discharge interval)
+- cpu %, peak RSS: of the client process, sampled from /proc (Linux only)
+
+Usage: python benchmark.py --rate 5000 --shape burst --duration 10
+'''
+import argparse
+import glob
+import multiprocessing as mp
+import os
+import queue
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', '1---Websockets'))
+sys.path.insert(0, os.path.join(HERE, '..', '..', 'Ingest'))
+
+from exchange_stub import run_stub  # noqa: E402
+
+CLIENTS = ('coinbase', 'tradesocket')
+
+
+class ProcessSampler:
+    def __init__(self, pid, interval=0.1):
+        """Polls CPU time and RSS of a process from /proc in a background thread"""
+        self.pid = pid
+        self.interval = interval
+        self.cpu_seconds = None
+        self.peak_rss_mb = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._poll, daemon=True)
+        self._thread.start()
+
+    def _poll(self):
+        ticks = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+        while not self._stop.is_set():
+            try:
+                with open(f'/proc/{self.pid}/stat') as f:
+                    fields = f.read().rsplit(')', 1)[1].split()
+                self.cpu_seconds = (int(fields[11]) + int(fields[12])) / ticks  # utime + stime
+                with open(f'/proc/{self.pid}/status') as f:
+                    for line in f:
+                        if line.startswith('VmRSS:'):
+                            rss = int(line.split()[1]) / 1024
+                            self.peak_rss_mb = max(self.peak_rss_mb or 0, rss)
+            except (OSError, IndexError, ValueError):
+                pass
+            self._stop.wait(self.interval)
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def latency_summary(latencies_ns):
+    """Returns p50/p99/p999 of latencies in ms (NaN when empty)"""
+    if len(latencies_ns) == 0:
+        return {'p50': np.nan, 'p99': np.nan, 'p999': np.nan}
+    p50, p99, p999 = np.percentile(np.asarray(latencies_ns) / 1e6, [50, 99, 99.9])
+    return {'p50': p50, 'p99': p99, 'p999': p999}
+
+
+def _run_coinbase(url, coins, queue_1, queue_2, batch_size, batch_interval):
+    from coinbase import CoinbaseWebSocket
+    CoinbaseWebSocket(queue_1, queue_2, coins, batch_size=batch_size,
+                      batch_interval=batch_interval, url=url).run()
+
+
+def _run_tradesocket(url, coins, basepath, interval):
+    import tradesocket
+    from tradebuffer import TradeBuffer
+    tradesocket.URL = url
+    tradesocket.SYMBOLS[:] = coins
+    tradesocket.BASEPATH = basepath
+    tradesocket.DISCHARGE_INTERVAL = interval
+    tradesocket.symbol_data = {symbol: TradeBuffer() for symbol in coins}
+    tradesocket.spare_data = {symbol: TradeBuffer() for symbol in coins}
+    threading.Thread(target=tradesocket.start_socket, daemon=True).start()
+    tradesocket.start_discharge()
+
+
+def bench_coinbase(url, coins, duration, batch_size=100, batch_interval=0.01):
+    queue_1, queue_2 = mp.Queue(), mp.Queue()
+    process = mp.Process(target=_run_coinbase,
+                         args=(url, coins, queue_1, queue_2, batch_size, batch_interval))
+    process.start()
+    sampler = ProcessSampler(process.pid)
+    stamps, received = [], []
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        for q in (queue_1, queue_2):
+            try:
+                batch = q.get(timeout=0.005)
+            except queue.Empty:
+                continue
+            now = time.time_ns()
+            for record in batch:
+                stamps.append(record[0])
+                received.append(now)
+    process.terminate()
+    process.join()
+    sampler.stop()
+    sent = np.array(stamps, dtype='datetime64[ns]').astype(np.int64)
+    return _report('coinbase', len(stamps), duration, np.array(received) - sent, sampler)
+
+
+def bench_tradesocket(url, coins, duration, interval=1.0):
+    from replay import load_trade_file
+    basepath = tempfile.mkdtemp(prefix='tradesocket-bench-') + os.sep
+    process = mp.Process(target=_run_tradesocket, args=(url, coins, basepath, interval))
+    process.start()
+    sampler = ProcessSampler(process.pid)
+    time.sleep(duration + interval)
+    process.terminate()
+    process.join()
+    sampler.stop()
+    latencies = []
+    for path in glob.glob(os.path.join(basepath, '*', '*_UATrades_*')):
+        try:
+            rows = load_trade_file(path)
+        except ValueError:
+            continue  # cut short by terminate()
+        latencies.append(os.stat(path).st_mtime_ns - rows['time'])
+    shutil.rmtree(basepath, ignore_errors=True)
+    latencies = np.concatenate(latencies) if latencies else np.empty(0)
+    return _report('tradesocket', len(latencies), duration, latencies, sampler)
+
+
+def _report(client, messages, duration, latencies_ns, sampler):
+    row = {'client': client, 'messages': messages, 'msgs/s': messages / duration}
+    row.update(latency_summary(latencies_ns))
+    cpu = sampler.cpu_seconds
+    row['cpu %'] = 100 * cpu / duration if cpu is not None else np.nan
+    row['peak RSS MB'] = sampler.peak_rss_mb if sampler.peak_rss_mb is not None else np.nan
+    return row
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--rate', type=float, default=1000.0, help='base messages/s')
+    parser.add_argument('--shape', choices=['constant', 'burst'], default='constant')
+    parser.add_argument('--recording', help='file of raw feed messages to replay')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per client')
+    parser.add_argument('--coins', nargs='+', default=['BTC-USD', 'ETH-USD'])
+    parser.add_argument('--clients', nargs='+', choices=CLIENTS, default=list(CLIENTS))
+    args = parser.parse_args(argv)
+
+    port_queue = mp.Queue()
+    stub = mp.Process(target=run_stub, args=(port_queue,),
+                      kwargs={'rate': args.rate, 'shape': args.shape, 'recording': args.recording},
+                      daemon=True)
+    stub.start()
+    url = f'ws://127.0.0.1:{port_queue.get(timeout=10)}'
+    rows = []
+    try:
+        if 'coinbase' in args.clients:
+            rows.append(bench_coinbase(url, args.coins, args.duration))
+        if 'tradesocket' in args.clients:
+            rows.append(bench_tradesocket(url, args.coins, args.duration))
+    finally:
+        stub.terminate()
+        stub.join()
+
+    columns = ['client', 'messages', 'msgs/s', 'p50', 'p99', 'p999', 'cpu %', 'peak RSS MB']
+    print(f'rate={args.rate:g}/s shape={args.shape} duration={args.duration:g}s '
+          f'coins={",".join(args.coins)} (latency in ms)')
+    print(''.join(f'{c:>13}' for c in columns))
+    for row in rows:
+        print(''.join(f'{row[c]:>13}' if isinstance(row[c], (str, int)) else f'{row[c]:>13.2f}'
+                      for c in columns))
+    return rows
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+'''
+Local stand-in for the Coinbase websocket feed, for benchmarks and offline testing.
+
+ExchangeStub serves ws://host:port. Each connection sends a Coinbase-style
+subscribe message, and the stub answers with the matching 'ticker', 'l2update'
+(after one 'snapshot' per product) and 'match' messages. The stub paces them
+at a configurable rate and burst shape.
+
+Every message is stamped with the time it is sent ("time", ISO-8601 with
+microseconds), so the receiving side can measure end-to-end latency on one
+machine. Messages can be synthetic or replayed from a recording: a file with
+one raw feed message (JSON) per line, whose times are re-stamped on send.
+'''
+import asyncio
+import itertools
+import json
+import random
+import time
+from datetime import datetime, timezone
+
+import websockets
+
+CHANNEL_TYPES = {'ticker': ('ticker',), 'level2': ('l2update',), 'matches': ('match',)}
+
+
+def now_iso():
+    """Returns the current UTC time the way Coinbase stamps messages"""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+class ExchangeStub:
+    def __init__(self, host='127.0.0.1', port=0, rate=1000.0, shape='constant',
+                 burst_factor=10.0, burst_period=1.0, burst_duty=0.1, recording=None, seed=0):
+        """Configures the feed
+
+        Parameters
+        ----------
+        host : str, optional
+            Interface to listen on, by default '127.0.0.1'
+        port : int, optional
+            Port to listen on, by default 0 (any free port, see self.port)
+        rate : float, optional
+            Base messages per second per connection, by default 1000.0
+        shape : str, optional
+            'constant', or 'burst' for rate * burst_factor during the first
+            burst_duty of every burst_period seconds, by default 'constant'
+        burst_factor : float, optional
+            Rate multiplier inside a burst, by default 10.0
+        burst_period : float, optional
+            Seconds between the starts of two bursts, by default 1.0
+        burst_duty : float, optional
+            Fraction of each period spent bursting, by default 0.1
+        recording : str, optional
+            File of raw feed messages (one JSON per line) to replay in a loop
+            instead of synthetic ones, by default None
+        seed : int, optional
+            Seed of the synthetic price walk, by default 0
+        """
+        self.host = host
+        self.port = port
+        self.rate = rate
+        self.shape = shape
+        self.burst_factor = burst_factor
+        self.burst_period = burst_period
+        self.burst_duty = burst_duty
+        self.recording = recording
+        self.seed = seed
+        self.sent = 0
+
+    def current_rate(self, elapsed):
+        """Messages per second the feed should be sending `elapsed` seconds in"""
+        if self.shape == 'burst' and (elapsed % self.burst_period) < self.burst_period * self.burst_duty:
+            return self.rate * self.burst_factor
+        return self.rate
+
+    def _synthetic(self, products, types):
+        """Endless synthetic messages of the given types, round-robin over products"""
+        rng = random.Random(self.seed)
+        prices = {product: 100.0 for product in products}
+        sequence = itertools.count(1)
+        for product, msg_type in itertools.cycle(itertools.product(products, types)):
+            price = prices[product] = max(0.01, prices[product] * (1 + rng.gauss(0, 1e-4)))
+            side = 'buy' if rng.random() < 0.5 else 'sell'
+            size = round(rng.expovariate(10), 8)
+            seq = next(sequence)
+            if msg_type == 'ticker':
+                yield {'type': 'ticker', 'sequence': seq, 'product_id': product,
+                       'price': f'{price:.2f}', 'last_size': f'{size:.8f}', 'side': side}
+            elif msg_type == 'l2update':
+                level = price * (1 - 1e-4) if side == 'buy' else price * (1 + 1e-4)
+                yield {'type': 'l2update', 'product_id': product,
+                       'changes': [[side, f'{level:.2f}', f'{size:.8f}']]}
+            else:
+                yield {'type': 'match', 'trade_id': seq, 'sequence': seq, 'product_id': product,
+                       'price': f'{price:.2f}', 'size': f'{size:.8f}', 'side': side}
+
+    def _recorded(self, products, types):
+        """Endless loop over the recording, keeping the subscribed messages"""
+        with open(self.recording) as f:
+            messages = [json.loads(line) for line in f if line.strip()]
+        messages = [m for m in messages if m.get('type') in types
+                    and (not products or m.get('product_id') in products)]
+        if not messages:
+            return
+        yield from itertools.cycle(messages)
+
+    async def _handler(self, websocket, *_):
+        subscribe = json.loads(await websocket.recv())
+        products = subscribe.get('product_ids', [])
+        channels = [c['name'] if isinstance(c, dict) else c for c in subscribe.get('channels', [])]
+        for channel in subscribe.get('channels', []):
+            if isinstance(channel, dict) and not products:
+                products = channel.get('product_ids', [])
+        types = [t for channel in channels for t in CHANNEL_TYPES.get(channel, ())]
+        if 'l2update' in types:
+            for product in products:
+                await websocket.send(json.dumps({
+                    'type': 'snapshot', 'product_id': product,
+                    'bids': [[f'{100 - i * 0.01:.2f}', '1.0'] for i in range(1, 51)],
+                    'asks': [[f'{100 + i * 0.01:.2f}', '1.0'] for i in range(1, 51)],
+                }))
+        messages = self._recorded(products, types) if self.recording else \
+            self._synthetic(products, types)
+        sent = 0
+        owed = 0.0  # integral of the rate shape since the first message
+        last = time.monotonic()
+        start = last
+        try:
+            while True:
+                await asyncio.sleep(0.001)
+                now = time.monotonic()
+                owed += self.current_rate(now - start) * (now - last)
+                last = now
+                stamp = now_iso()
+                for _ in range(int(owed) - sent):
+                    message = next(messages, None)
+                    if message is None:
+                        return
+                    await websocket.send(json.dumps(dict(message, time=stamp)))
+                    sent += 1
+                    self.sent += 1
+        except websockets.ConnectionClosed:
+            pass
+
+    @property
+    def url(self):
+        return f'ws://{self.host}:{self.port}'
+
+    async def serve(self, ready=None, duration=None):
+        """Serves until cancelled, or for `duration` seconds
+
+        Parameters
+        ----------
+        ready : Callable[[int], None], optional
+            Called with the bound port once the server listens, by default None
+        duration : float, optional
+            Seconds to serve for, by default forever
+        """
+        async with websockets.serve(self._handler, self.host, self.port, max_size=None) as server:
+            self.port = server.sockets[0].getsockname()[1]
+            if ready is not None:
+                ready(self.port)
+            if duration is None:
+                await asyncio.Future()
+            else:
+                await asyncio.sleep(duration)
+
+
+def run_stub(port_queue, **kwargs):
+    """Process entry point: serves an ExchangeStub(**kwargs) forever and puts
+    its port on port_queue once listening"""
+    asyncio.run(ExchangeStub(**kwargs).serve(ready=port_queue.put))
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Local Coinbase-style websocket feed')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--rate', type=float, default=1000.0)
+    parser.add_argument('--shape', choices=['constant', 'burst'], default='constant')
+    parser.add_argument('--recording')
+    args = parser.parse_args()
+    stub = ExchangeStub(port=args.port, rate=args.rate, shape=args.shape, recording=args.recording)
+    print(f'serving on {stub.url}')
+    asyncio.run(stub.serve())
@@ -0,0 +1,442 @@
+'''
+Fill simulation of backtest orders against recorded level 2 books and trades.
+
+A FillSimulator replays one product's recorded book changes and trades in
+time order, and fills the orders sent to it the way the market would have:
+
+- market orders walk the book level by level from the best price, so large
+  orders pay for the depth they eat (partial fills when the book runs out)
+- limit orders that cross the spread take liquidity like a market order up to
+  their price, the rest rests at its price behind the size already displayed
+  there. The queue ahead shrinks with the trades printed at that price (and
+  when the level itself shrinks below it), and then the order fills from
+  further trades at its price. Trades through its price fill it outright.
+
+The simulator advances in steps: everything recorded between two calls
+(orders, cancels or advance()) is one step, and resting orders are matched
+against all trades of a step at once with sorted cumulative volumes instead
+of trade by trade. Smaller steps (calling advance() more often) mean finer
+time resolution, not different results for orders that don't rest.
+
+Recorded data is passed in as numpy record arrays:
+book updates  time (epoch ns), side (+1 bid, -1 ask), price, quantity (the new
+              size of the level, 0 removes it). These are the fields of
+              web_socket.LEVEL_2_RECORD, filtered to one ticker, and a snapshot is just
+              one update per level.
+trades        time (epoch ns), price, size, side (the maker's side: +1 means
+              the bids were hit), e.g. Ingest's TRADE_DTYPE / a TickStore read
+
+Fills are FILL_DTYPE rows, shares > 0 for buys and < 0 for sells.
+'''
+from typing import Dict, Optional
+
+import numpy as np
+
+FILL_DTYPE = np.dtype([
+    ('order', np.int64),    # id returned by market_order/limit_order
+    ('time', np.int64),     # epoch ns
+    ('price', np.float64),
+    ('shares', np.float64),
+    ('fee', np.float64),
+    ('maker', np.bool_),    # filled while resting
+])
+
+
+def _to_ns(time) -> int:
+    if isinstance(time, (int, np.integer)):
+        return int(time)
+    return int(np.datetime64(time, 'ns').astype(np.int64))
+
+
+class BookSide:
+    def __init__(self):
+        """Live levels of one side of a book, as price-sorted arrays
+
+        Levels whose size drops to 0 are removed, so lookups and walks only
+        ever see the levels currently displayed. Updates are merged in batches
+        with one sort of (live levels + batch), so a step costs O((L + k) log)
+        numpy work for L live levels and k updates.
+        """
+        self.prices = np.zeros(0)  # ascending
+        self.sizes = np.zeros(0)
+
+    def __len__(self):
+        return len(self.prices)
+
+    def get(self, price, default=0.0) -> float:
+        """Size displayed at a price"""
+        i = int(np.searchsorted(self.prices, price))
+        if i < len(self.prices) and self.prices[i] == price:
+            return float(self.sizes[i])
+        return default
+
+    def sizes_at(self, prices: np.ndarray) -> np.ndarray:
+        """Sizes displayed at many prices, 0 where there is no level"""
+        i = np.searchsorted(self.prices, prices).clip(max=max(len(self.prices) - 1, 0))
+        if len(self.prices) == 0:
+            return np.zeros(len(prices))
+        return np.where(self.prices[i] == prices, self.sizes[i], 0.0)
+
+    def update(self, prices: np.ndarray, sizes: np.ndarray) -> None:
+        """Sets the size of levels, in order (a later update of a price wins),
+        0 removes a level"""
+        # newest update per price first, then the current levels: np.unique keeps the first
+        prices = np.concatenate((prices[::-1], self.prices))
+        sizes = np.concatenate((sizes[::-1], self.sizes))
+        prices, first = np.unique(prices, return_index=True)
+        sizes = sizes[first]
+        live = sizes > 0
+        self.prices = prices[live]
+        self.sizes = sizes[live]
+
+    def take(self, index: np.ndarray, sizes: np.ndarray) -> None:
+        """Removes traded sizes from the levels at `index`, until the recorded
+        data updates them again"""
+        self.sizes[index] -= sizes
+        live = self.sizes > 1e-12
+        if not live.all():
+            self.prices = self.prices[live]
+            self.sizes = self.sizes[live]
+
+
+class FillSimulator:
+    def __init__(self, book_updates: np.ndarray, trades: np.ndarray, taker_fee=0.0,
+                 maker_fee=0.0, latency=0.0):
+        """Replays one product's recorded market data for order matching
+
+        Parameters
+        ----------
+        book_updates : np.ndarray
+            Records with time, side, price and quantity fields, see module docstring
+        trades : np.ndarray
+            Records with time, price, size and side fields
+        taker_fee : float, optional
+            Fee as a fraction of traded value for liquidity taken, by default 0.0
+        maker_fee : float, optional
+            Fee as a fraction of traded value for resting fills, by default 0.0
+        latency : float, optional
+            Seconds between an order being sent and it reaching the book, by default 0.0
+        """
+        order = np.argsort(book_updates['time'], kind='stable')
+        self._u_time = np.ascontiguousarray(book_updates['time'][order], dtype=np.int64)
+        self._u_side = np.ascontiguousarray(book_updates['side'][order], dtype=np.int8)
+        self._u_price = np.ascontiguousarray(book_updates['price'][order], dtype=np.float64)
+        self._u_size = np.ascontiguousarray(book_updates['quantity'][order], dtype=np.float64)
+        order = np.argsort(trades['time'], kind='stable')
+        self._t_time = np.ascontiguousarray(trades['time'][order], dtype=np.int64)
+        self._t_price = np.ascontiguousarray(trades['price'][order], dtype=np.float64)
+        self._t_size = np.ascontiguousarray(trades['size'][order], dtype=np.float64)
+        self._t_side = np.ascontiguousarray(trades['side'][order], dtype=np.int8)
+        self._u_pos = 0
+        self._t_pos = 0
+        self.now = np.iinfo(np.int64).min
+        self.taker_fee = taker_fee
+        self.maker_fee = maker_fee
+        self.latency_ns = int(latency * 1e9)
+        self.bids = BookSide()
+        self.asks = BookSide()
+        # one entry per order id in arrays that double when full
+        self._n_orders = 0
+        self._side = np.zeros(64, dtype=np.int8)
+        self._price = np.zeros(64)
+        self._remaining = np.zeros(64)
+        self._ahead = np.zeros(64)  # displayed size queued in front of the order
+        self._resting = np.zeros(0, dtype=np.int64)  # ids of the orders with shares left
+        self._fills = []
+
+    @property
+    def fills(self) -> np.ndarray:
+        """Every fill so far as a FILL_DTYPE array"""
+        return np.array(self._fills, dtype=FILL_DTYPE)
+
+    def remaining(self, order_id) -> float:
+        """Unfilled shares of a resting order (0 once filled or cancelled)"""
+        return self._remaining[order_id]
+
+    def best_bid(self) -> Optional[float]:
+        return float(self.bids.prices[-1]) if len(self.bids) else None
+
+    def best_ask(self) -> Optional[float]:
+        return float(self.asks.prices[0]) if len(self.asks) else None
+
+    def advance(self, time) -> None:
+        """Replays the recorded trades and book changes up to `time` (inclusive),
+        filling resting orders from the trades
+
+        Parameters
+        ----------
+        time : int or datetime-like
+            Epoch ns, or anything np.datetime64 accepts
+        """
+        until = _to_ns(time)
+        if until <= self.now:
+            return
+        t_end = int(np.searchsorted(self._t_time, until, side='right'))
+        if t_end > self._t_pos and len(self._resting):
+            self._match_resting(slice(self._t_pos, t_end))
+        self._t_pos = t_end
+        u_end = int(np.searchsorted(self._u_time, until, side='right'))
+        if u_end > self._u_pos:
+            step = slice(self._u_pos, u_end)
+            bid = self._u_side[step] > 0
+            prices, sizes = self._u_price[step], self._u_size[step]
+            self.bids.update(prices[bid], sizes[bid])
+            self.asks.update(prices[~bid], sizes[~bid])
+            self._u_pos = u_end
+            self._clamp_queues()
+        self.now = until
+
+    def _match_resting(self, step):
+        """Fills resting orders from one step of trades, vectorized over the trades"""
+        prices, sizes, sides = self._t_price[step], self._t_size[step], self._t_side[step]
+        times = self._t_time[step]
+        for side in (1, -1):
+            active = self._resting[self._side[self._resting] == side]
+            if len(active) == 0:
+                continue
+            # resting buys are hit by trades against the bids (maker side +1), sells by -1
+            hits = (sides == side) | (sides == 0)
+            if not np.any(hits):
+                continue
+            hit_prices = prices[hits] * side  # "through" is below a buy and above a sell
+            hit_sizes = sizes[hits]
+            order = np.argsort(hit_prices, kind='stable')
+            sorted_prices = hit_prices[order]
+            cumulative = np.concatenate(([0.0], np.cumsum(hit_sizes[order])))
+            limits = self._price[active] * side
+            below = cumulative[np.searchsorted(sorted_prices, limits, side='left')]
+            upto = cumulative[np.searchsorted(sorted_prices, limits, side='right')]
+            at_price = upto - below
+            # volume strictly through the limit, plus what traded at it past the queue
+            available = below + np.maximum(at_price - self._ahead[active], 0.0)
+            self._ahead[active] = np.maximum(self._ahead[active] - at_price, 0.0)
+            # the same prints can't fill two of our orders: most aggressive first, then
+            # front of the queue first, so `available` doesn't increase along the orders
+            # and the volume taken after each one is max.accumulate(min(cumulative
+            # remaining, available))
+            rank = np.lexsort((-available, -limits))
+            active, available = active[rank], available[rank]
+            remaining = self._remaining[active]
+            taken = np.maximum.accumulate(np.minimum(np.cumsum(remaining), available).clip(min=0.0))
+            filled = np.diff(taken, prepend=0.0)
+            hit = filled > 0
+            if not np.any(hit):
+                continue
+            active, filled = active[hit], filled[hit]
+            self._remaining[active] -= filled
+            fill_time = int(times[-1])
+            fill_prices = self._price[active]
+            self._fills.extend(zip(active.tolist(), [fill_time] * len(active), fill_prices.tolist(),
+                                   (side * filled).tolist(),
+                                   (fill_prices * filled * self.maker_fee).tolist(),
+                                   [True] * len(active)))
+        self._resting = self._resting[self._remaining[self._resting] > 1e-12]
+
+    def _clamp_queues(self):
+        """A level that shrank below an order's queue position moved it up"""
+        resting = self._resting
+        if len(resting) == 0:
+            return
+        bid = self._side[resting] > 0
+        levels = np.empty(len(resting))
+        levels[bid] = self.bids.sizes_at(self._price[resting[bid]])
+        levels[~bid] = self.asks.sizes_at(self._price[resting[~bid]])
+        self._ahead[resting] = np.minimum(self._ahead[resting], levels)
+
+    def _walk(self, side, shares, limit=None, budget=None):
+        """Takes up to `shares` from the opposite side of the book, best price
+        first, without going past `limit` or spending more than `budget` (fees
+        included). Returns (prices, sizes) taken."""
+        book = self.asks if side > 0 else self.bids
+        if side > 0:
+            end = len(book) if limit is None else int(np.searchsorted(book.prices, limit, side='right'))
+            index = np.arange(end)
+        else:
+            start = 0 if limit is None else int(np.searchsorted(book.prices, limit, side='left'))
+            index = np.arange(len(book) - 1, start - 1, -1)
+        prices, sizes = book.prices[index], book.sizes[index]
+        before = np.concatenate(([0.0], np.cumsum(sizes)[:-1]))
+        taken = np.clip(shares - before, 0.0, sizes)
+        if budget is not None:
+            unit_cost = prices * (1.0 + self.taker_fee)
+            costs = taken * unit_cost
+            spent_before = np.cumsum(costs) - costs
+            taken = np.clip((budget - spent_before) / unit_cost, 0.0, taken)
+        used = taken > 0
+        book.take(index[used], taken[used])
+        return prices[used], taken[used]
+
+    def _new_order(self, side, price):
+        n = self._n_orders
+        if n == len(self._side):
+            for name in ('_side', '_price', '_remaining', '_ahead'):
+                old = getattr(self, name)
+                grown = np.zeros(2 * len(old), dtype=old.dtype)
+                grown[:n] = old
+                setattr(self, name, grown)
+        self._side[n] = side
+        self._price[n] = price
+        self._remaining[n] = 0.0
+        self._ahead[n] = 0.0
+        self._n_orders = n + 1
+        return n
+
+    def _take(self, order_id, side, shares, limit, time_ns, budget=None):
+        """Fills an order against the book, returns (shares, cost with fees)"""
+        prices, sizes = self._walk(side, shares, limit, budget)
+        for price, size in zip(prices.tolist(), sizes.tolist()):
+            self._fills.append((order_id, time_ns, price, side * size,
+                                price * size * self.taker_fee, False))
+        return float(sizes.sum()), float(prices @ sizes) * (1.0 + self.taker_fee)
+
+    def market_order(self, shares, time, max_cost=None) -> np.ndarray:
+        """Fills an order against the book at `time` plus latency
+
+        Parameters
+        ----------
+        shares : float
+            Shares to buy (> 0) or sell (< 0)
+        time : int or datetime-like
+            Time the order is sent
+        max_cost : float, optional
+            Cash a buy may spend, fees included, by default no limit
+
+        Returns
+        -------
+        np.ndarray
+            FILL_DTYPE rows of the order, fewer shares than asked if the book
+            ran out
+        """
+        arrival = _to_ns(time) + self.latency_ns
+        self.advance(arrival)
+        side = 1 if shares > 0 else -1
+        order_id = self._new_order(side, np.nan)
+        start = len(self._fills)
+        self._take(order_id, side, abs(shares), None, arrival, max_cost if side > 0 else None)
+        return np.array(self._fills[start:], dtype=FILL_DTYPE)
+
+    def limit_order(self, shares, price, time, max_cost=None) -> int:
+        """Sends a limit order, taking what crosses and resting the rest
+
+        Parameters
+        ----------
+        shares : float
+            Shares to buy (> 0) or sell (< 0)
+        price : float
+            Limit price
+        time : int or datetime-like
+            Time the order is sent
+        max_cost : float, optional
+            Cash a buy may spend, fees included, by default no limit. What
+            rests is cut to what the cash left covers at the limit price.
+
+        Returns
+        -------
+        int
+            Order id, for remaining()/cancel() and the order field of fills
+        """
+        arrival = _to_ns(time) + self.latency_ns
+        self.advance(arrival)
+        side = 1 if shares > 0 else -1
+        order_id = self._new_order(side, price)
+        budget = max_cost if side > 0 else None
+        taken, spent = self._take(order_id, side, abs(shares), price, arrival, budget)
+        left = abs(shares) - taken
+        if budget is not None:
+            left = min(left, max(budget - spent, 0.0) / (price * (1.0 + self.maker_fee)))
+        if left > 0:
+            book = self.bids if side > 0 else self.asks
+            self._remaining[order_id] = left
+            self._ahead[order_id] = book.get(price)
+            self._resting = np.append(self._resting, order_id)
+        return order_id
+
+    def cancel(self, order_id, time=None) -> float:
+        """Cancels what is left of a resting order once it reaches the book
+        (right away without `time`), returns the shares cancelled"""
+        if time is not None:
+            self.advance(_to_ns(time) + self.latency_ns)
+        left = float(self._remaining[order_id])
+        self._remaining[order_id] = 0.0
+        self._resting = self._resting[self._resting != order_id]
+        return left
+
+    def fills_since(self, start) -> np.ndarray:
+        """Fills from position `start` of the fill list, see SimulatedBroker"""
+        return np.array(self._fills[start:], dtype=FILL_DTYPE)
+
+
+class SimulatedBroker:
+    def __init__(self, portfolio, simulators: Dict[str, FillSimulator]):
+        """Routes a Portfolio's orders through FillSimulators and books their fills
+
+        It is driven directly, next to recorded L2 data: the daily-bar
+        Strategy in Backtesting keeps filling its orders at bar prices.
+
+        Parameters
+        ----------
+        portfolio : Portfolio
+            Portfolio whose cash and positions the fills update, fees are the
+            simulators' (the portfolio's transaction_cost isn't applied)
+        simulators : Dict[str, FillSimulator]
+            One simulator per stock name
+        """
+        self.portfolio = portfolio
+        self.simulators = simulators
+        self._booked = {name: 0 for name in simulators}  # fills already seen per stock
+        self.rejected = []  # FILL_DTYPE arrays of the fills the portfolio couldn't book
+
+    def _book(self, stock_name):
+        """Books the new fills of a stock, returns those the portfolio accepted.
+        A resting fill the cash (or position) no longer covers is rejected and
+        the rest of its order cancelled, so the simulator stops filling it. Its
+        later fills in the same batch (already simulated) are rejected too."""
+        simulator = self.simulators[stock_name]
+        fills = simulator.fills_since(self._booked[stock_name])
+        self._booked[stock_name] += len(fills)
+        booked = np.ones(len(fills), dtype=bool)
+        cancelled = set()
+        for i, fill in enumerate(fills):
+            order = int(fill['order'])
+            if order in cancelled:
+                booked[i] = False
+                continue
+            booked[i] = self.portfolio.place_order(stock_name, fill['price'], fill['shares'],
+                                                   np.datetime64(int(fill['time']), 'ns'),
+                                                   fee=fill['fee'])
+            if not booked[i]:
+                simulator.cancel(order)
+                cancelled.add(order)
+        if not booked.all():
+            self.rejected.append(fills[~booked])
+        return fills[booked]
+
+    def advance(self, time) -> Dict[str, np.ndarray]:
+        """Replays every simulator up to `time` and books resting fills,
+        returns the new fills per stock"""
+        fills = {}
+        for stock_name, simulator in self.simulators.items():
+            simulator.advance(_to_ns(time))
+            fills[stock_name] = self._book(stock_name)
+        return fills
+
+    def place_order(self, stock_name, shares, time, limit_price=None) -> np.ndarray:
+        """Sends a market order (or a limit order with limit_price) and books
+        whatever fills right away, returns those fills
+
+        Sells are capped at the shares held and buys at the cash balance (fees
+        included) before they reach the simulator, so what fills right away is
+        always booked. Resting fills are booked as they come, see _book.
+        """
+        if shares < 0:
+            shares = -min(-shares, self.portfolio.get_position(stock_name))
+        if shares == 0:
+            return np.zeros(0, dtype=FILL_DTYPE)
+        simulator = self.simulators[stock_name]
+        # a hair under the balance, so rounding in the fills' costs can't exceed it
+        max_cost = self.portfolio.balance * (1 - 1e-9) if shares > 0 else None
+        if limit_price is None:
+            simulator.market_order(shares, time, max_cost)
+        else:
+            simulator.limit_order(shares, limit_price, time, max_cost)
+        return self._book(stock_name)
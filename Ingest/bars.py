@@ -0,0 +1,193 @@
+import datetime, os
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from tradebuffer import parse_time_ns
+
+# layout of every emitted bar, start in epoch ns and resolution in seconds
+BAR_FIELDS = ("symbol", "resolution", "start", "open", "high", "low", "close",
+              "volume", "vwap", "trades")
+
+# indexes into the mutable state of an open bar
+_OPEN, _HIGH, _LOW, _CLOSE, _VOLUME, _NOTIONAL, _TRADES, _FIRST, _LAST = range(9)
+
+
+class BarBuilder:
+    def __init__(self, resolutions=(1, 60, 300, 3600), lateness=2.0, sinks=(), shared_clock=True):
+        """Builds OHLCV+VWAP bars per symbol incrementally from single trades.
+
+        Every trade updates one open bar per resolution in O(1). A bar
+        [start, start + resolution) stays open until the newest trade time
+        passes its end by `lateness` seconds, so trades arriving late or out
+        of order within that window still land in the right bar (open/close
+        follow trade time, not arrival order). Trades for bars that already
+        closed are counted in `late_trades` and dropped.
+
+        With shared_clock the newest trade time is taken across all symbols
+        (one exchange clock): the bars of a start close for every symbol at
+        once and reach the sinks in the same list, so consumers building rows
+        across symbols (indicators.IndicatorSet.on_bars) never see an illiquid
+        symbol's bar after a liquid one has moved past it. Without it, each
+        symbol's bars close on that symbol's own newest trade.
+
+        Parameters
+        ----------
+        resolutions : Iterable[float], optional
+            Bar sizes in seconds, by default 1s, 1m, 5m and 1h
+        lateness : float, optional
+            Seconds a bar waits for late trades after its end, by default 2.0
+        sinks : Iterable[Callable[[List[Tuple]], None]], optional
+            Called with each list of closed bars (see BAR_FIELDS), e.g.
+            queue_sink(queue) or a BarWriter, by default none
+        shared_clock : bool, optional
+            Close bars on the newest trade time of all symbols instead of the
+            symbol's own, by default True
+        """
+        self.resolutions = tuple(resolutions)
+        self._resolutions_ns = [(res, int(res * 1e9)) for res in self.resolutions]
+        self.lateness_ns = int(lateness * 1e9)
+        self.sinks = list(sinks)
+        self._open: Dict[Tuple[str, int], Dict[int, list]] = {}  # (symbol, res ns) -> start -> bar
+        self._watermark: Dict[str, int] = {}  # newest trade time per symbol
+        self.shared_clock = shared_clock
+        self._clock = 0  # newest trade time of all symbols
+        self._deadline = 0  # clock at which the next bar (of any symbol) closes
+        self.late_trades = 0
+
+    def on_trade(self, symbol, time_ns, price, size):
+        """Adds one trade, emitting any bars it closes
+
+        Parameters
+        ----------
+        symbol : str
+            Product id
+        time_ns : int
+            Trade time in epoch ns
+        price : float
+            Trade price
+        size : float
+            Trade size
+        """
+        watermark = max(self._watermark.get(symbol, time_ns), time_ns)
+        self._watermark[symbol] = watermark
+        if self.shared_clock:
+            watermark = self._clock = max(self._clock, time_ns)
+        late = False
+        for _, res_ns in self._resolutions_ns:
+            start = time_ns - time_ns % res_ns
+            bars = self._open.get((symbol, res_ns))
+            if bars is None:
+                bars = self._open[(symbol, res_ns)] = {}
+            bar = bars.get(start)
+            if bar is None:
+                if start + res_ns + self.lateness_ns <= watermark:
+                    late = True  # its bar has already been emitted
+                    continue
+                bars[start] = [price, price, price, price, size, price * size, 1, time_ns, time_ns]
+                continue
+            if price > bar[_HIGH]:
+                bar[_HIGH] = price
+            if price < bar[_LOW]:
+                bar[_LOW] = price
+            if time_ns < bar[_FIRST]:
+                bar[_FIRST], bar[_OPEN] = time_ns, price
+            if time_ns >= bar[_LAST]:
+                bar[_LAST], bar[_CLOSE] = time_ns, price
+            bar[_VOLUME] += size
+            bar[_NOTIONAL] += price * size
+            bar[_TRADES] += 1
+        if late:
+            self.late_trades += 1
+        if not self.shared_clock:
+            self._emit(self._close(symbol, watermark))
+        elif watermark >= self._deadline:
+            self.advance(watermark)
+
+    def on_match(self, message):
+        """Adds a decoded Coinbase match message"""
+        self.on_trade(message["product_id"], parse_time_ns(message["time"]),
+                      float(message["price"]), float(message["size"]))
+
+    def advance(self, now_ns):
+        """Closes every bar that ended more than `lateness` before now_ns, for
+        symbols that have stopped trading
+
+        Parameters
+        ----------
+        now_ns : int
+            Current time in epoch ns
+        """
+        closed = []
+        for symbol in list(self._watermark):
+            closed.extend(self._close(symbol, now_ns))
+        # the earliest clock at which a bar ending after now_ns - lateness closes
+        after = now_ns - self.lateness_ns
+        self._deadline = min((after // res_ns + 1) * res_ns for _, res_ns in self._resolutions_ns) \
+            + self.lateness_ns
+        self._emit(closed)
+
+    def close_all(self):
+        """Emits every open bar, e.g. at shutdown"""
+        closed = []
+        for (symbol, res_ns), bars in self._open.items():
+            for start in sorted(bars):
+                closed.append(self._bar(symbol, res_ns, start, bars[start]))
+            bars.clear()
+        self._emit(closed)
+
+    def _close(self, symbol, watermark) -> List[Tuple]:
+        closed = []
+        for _, res_ns in self._resolutions_ns:
+            bars = self._open.get((symbol, res_ns))
+            if not bars:
+                continue
+            cutoff = watermark - res_ns - self.lateness_ns
+            ready = [start for start in bars if start <= cutoff]
+            for start in sorted(ready):
+                closed.append(self._bar(symbol, res_ns, start, bars.pop(start)))
+        return closed
+
+    def _bar(self, symbol, res_ns, start, bar) -> Tuple:
+        volume = bar[_VOLUME]
+        vwap = bar[_NOTIONAL] / volume if volume else bar[_CLOSE]
+        return (symbol, res_ns / 1e9, start, bar[_OPEN], bar[_HIGH], bar[_LOW], bar[_CLOSE],
+                volume, vwap, bar[_TRADES])
+
+    def _emit(self, closed):
+        if closed:
+            for sink in self.sinks:
+                sink(closed)
+
+
+def queue_sink(queue) -> Callable[[List[Tuple]], None]:
+    """Returns a sink that puts each list of closed bars on a queue"""
+    return queue.put
+
+
+class BarWriter:
+    def __init__(self, basepath):
+        """Sink appending closed bars to one csv per symbol, resolution and
+        UTC day: <basepath><symbol>/<symbol>_Bars_<resolution>s_<YYYY-MM-DD>.csv
+
+        Parameters
+        ----------
+        basepath : str
+            Same BASEPATH convention as tradesocket
+        """
+        self.basepath = basepath
+
+    def path(self, symbol, resolution, start_ns):
+        day = datetime.datetime.fromtimestamp(start_ns / 1e9, datetime.timezone.utc).strftime("%Y-%m-%d")
+        return f"{self.basepath}{symbol}/{symbol}_Bars_{resolution:g}s_{day}.csv"
+
+    def __call__(self, bars: Iterable[Tuple]):
+        by_path: Dict[str, List[str]] = {}
+        for bar in bars:
+            line = "%d,%r,%r,%r,%r,%r,%r,%d\n" % bar[2:]
+            by_path.setdefault(self.path(bar[0], bar[1], bar[2]), []).append(line)
+        for path, lines in by_path.items():
+            new = not os.path.exists(path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "a") as f:
+                if new:
+                    f.write(",".join(BAR_FIELDS[2:]) + "\n")
+                f.writelines(lines)
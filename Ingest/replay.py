@@ -0,0 +1,196 @@
+import glob, heapq, itertools, os, time, warnings
+from typing import Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+from tradebuffer import TRADE_DTYPE
+
+# layout of every replayed trade, time in epoch nanoseconds
+REPLAY_FIELDS = ("time", "symbol", "trade_id", "price", "size", "side")
+CHUNK_ROWS = 65536  # rows of a minute file read and converted at a time
+
+
+def trade_files(basepath, symbol):
+    """Returns the minute files tradesocket wrote for a symbol, oldest first
+
+    Parameters
+    ----------
+    basepath : str
+        BASEPATH the files were written under
+    symbol : str
+        Product id, e.g. "BTC-USD"
+
+    Returns
+    -------
+    List[str]
+        Paths of the .csv and .npy files, sorted by their time stamp
+    """
+    pattern = os.path.join(basepath + symbol, symbol + "_UATrades_*")
+    paths = [p for p in glob.glob(pattern) if p.endswith((".csv", ".npy"))]
+    return sorted(paths, key=lambda p: os.path.basename(p).rsplit(".", 1)[0])
+
+
+def load_trade_file(path):
+    """Loads one minute file (either output format) as a TRADE_DTYPE array"""
+    if path.endswith(".npy"):
+        return np.load(path, mmap_mode="r")
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")  # minutes without trades are header-only
+        return np.loadtxt(path, dtype=TRADE_DTYPE, delimiter=",", skiprows=1, ndmin=1)
+
+
+def read_trade_chunks(path, chunk_rows=CHUNK_ROWS) -> Iterator[np.ndarray]:
+    """Reads one minute file as TRADE_DTYPE arrays of at most chunk_rows rows
+
+    .npy files are memory-mapped and copied out a slice at a time, .csv files
+    are parsed chunk_rows lines at a time, so memory is bounded by chunk_rows
+    whatever the file size.
+    """
+    if path.endswith(".npy"):
+        rows = np.load(path, mmap_mode="r")
+        for lo in range(0, len(rows), chunk_rows):
+            yield np.array(rows[lo:lo + chunk_rows])
+        return
+    with open(path) as f, warnings.catch_warnings():
+        warnings.simplefilter("ignore")  # minutes without trades are header-only
+        next(f, None)  # header
+        while True:
+            lines = list(itertools.islice(f, chunk_rows))
+            if not lines:
+                return
+            yield np.loadtxt(lines, dtype=TRADE_DTYPE, delimiter=",", ndmin=1)
+
+
+def _sorted_chunks(chunks: Iterable[np.ndarray]) -> Iterator[np.ndarray]:
+    """Puts a stream of chunks in time order, assuming no row is more than one
+    chunk out of place: each chunk is sorted, and the rows of the previous one
+    that aren't later than its first time are released"""
+    held = None
+    for chunk in chunks:
+        if len(chunk) > 1 and np.any(chunk["time"][1:] < chunk["time"][:-1]):
+            chunk = chunk[np.argsort(chunk["time"], kind="stable")]
+        if held is None or len(held) == 0:
+            held = chunk
+            continue
+        if held["time"][-1] > chunk["time"][0]:
+            merged = np.concatenate((held, chunk))
+            merged = merged[np.argsort(merged["time"], kind="stable")]
+            cut = int(np.searchsorted(merged["time"], chunk["time"][0], side="right"))
+            yield merged[:cut]
+            held = merged[cut:]
+        else:
+            yield held
+            held = chunk
+    if held is not None and len(held):
+        yield held
+
+
+def _trades(symbol, rows) -> Iterator[Tuple]:
+    """Converts TRADE_DTYPE rows to REPLAY_FIELDS tuples"""
+    return zip(rows["time"].tolist(), [symbol] * len(rows), rows["trade_id"].tolist(),
+               rows["price"].tolist(), rows["size"].tolist(), rows["side"].tolist())
+
+
+def _symbol_stream(symbol, paths, start, end, chunk_rows=CHUNK_ROWS) -> Iterator[Tuple]:
+    """Yields the trades of one symbol in time order, chunk_rows rows in memory at a time"""
+    chunks = (chunk for path in paths for chunk in read_trade_chunks(path, chunk_rows))
+    for rows in _sorted_chunks(chunks):
+        times = rows["time"]
+        lo = np.searchsorted(times, start) if start is not None else 0
+        hi = np.searchsorted(times, end) if end is not None else len(rows)
+        if lo >= hi:
+            continue
+        yield from _trades(symbol, rows[lo:hi])
+
+
+def _store_stream(symbol, store, start, end, chunk_rows=CHUNK_ROWS) -> Iterator[Tuple]:
+    """Yields the trades of one symbol from a TickStore, one day in memory at a
+    time, converted chunk_rows rows at a time"""
+    for rows in store.read_days(symbol, start, end):
+        for lo in range(0, len(rows), chunk_rows):
+            yield from _trades(symbol, rows[lo:lo + chunk_rows])
+
+
+def replay(basepath, symbols, start=None, end=None, speed=None, store=None,
+           chunk_rows=CHUNK_ROWS) -> Iterator[Tuple]:
+    """Replays recorded trades of several symbols as one stream in time order
+
+    The per-symbol files are k-way merged with a heap, and only the current
+    chunk (chunk_rows rows) of each symbol is held in memory, so memory grows
+    neither with the length of the replay nor with the size of a file.
+
+    Parameters
+    ----------
+    basepath : str
+        BASEPATH the files were written under
+    symbols : Iterable[str]
+        Product ids to replay
+    start : int, optional
+        First trade time to replay in epoch ns (inclusive), by default the first
+    end : int, optional
+        Trade time to stop at in epoch ns (exclusive), by default the last
+    speed : float, optional
+        Multiple of wall-clock time to replay at (1.0 = real time), by default
+        None for as fast as possible
+    store : tickstore.TickStore, optional
+        Read the trades from this store instead of the minute files under
+        basepath, by default None
+    chunk_rows : int, optional
+        Rows of a minute file (or of a store day) read and converted at a
+        time, by default CHUNK_ROWS. Rows recorded out of time order are put back in order as
+        long as they are no more than one chunk out of place.
+
+    Yields
+    ------
+    Tuple
+        One trade laid out as REPLAY_FIELDS
+    """
+    if store is not None:
+        streams = [_store_stream(symbol, store, start, end, chunk_rows) for symbol in symbols]
+    else:
+        streams = [_symbol_stream(symbol, trade_files(basepath, symbol), start, end, chunk_rows)
+                   for symbol in symbols]
+    merged = heapq.merge(*streams, key=lambda trade: trade[0])
+    if speed is None:
+        yield from merged
+        return
+    first_trade = wall_start = None
+    for trade in merged:
+        if first_trade is None:
+            first_trade, wall_start = trade[0], time.monotonic()
+        delay = (trade[0] - first_trade) / 1e9 / speed - (time.monotonic() - wall_start)
+        if delay > 0:
+            time.sleep(delay)
+        yield trade
+
+
+def replay_to_queue(queue, trades: Iterable[Tuple], batch_size=500):
+    """Puts a replayed stream on a queue in batches (lists of trades), like
+    the WebSocket classes do with live data
+
+    Parameters
+    ----------
+    queue : multiprocessing.Queue
+        Any object with put()
+    trades : Iterable[Tuple]
+        Usually the output of replay()
+    batch_size : int, optional
+        Trades per batch, by default 500
+
+    Returns
+    -------
+    int
+        Number of trades replayed
+    """
+    batch: List[Tuple] = []
+    count = 0
+    for trade in trades:
+        batch.append(trade)
+        if len(batch) >= batch_size:
+            queue.put(batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        queue.put(batch)
+        count += len(batch)
+    return count
@@ -0,0 +1,239 @@
+import datetime, glob, mmap, os, zlib
+from typing import Iterator, List
+
+import numpy as np
+
+from replay import load_trade_file, trade_files
+from tradebuffer import TRADE_DTYPE
+
+DAY_NS = 86_400 * 10**9
+RAW, ZLIB = 0, 1  # block codecs
+
+# One entry per block in <segment>.idx, appended after the block itself is on disk
+INDEX_DTYPE = np.dtype([
+    ("offset", np.uint64),  # byte offset of the block in the segment
+    ("length", np.uint64),  # stored (compressed) bytes
+    ("rows", np.uint32),
+    ("codec", np.uint8),
+    ("first", np.int64),  # min and max trade time in the block
+    ("last", np.int64),
+])
+
+# zlib blocks store each column contiguously, these ones delta encoded
+_DELTA_FIELDS = ("trade_id", "time")
+
+
+def _encode(rows, codec, level):
+    if codec == RAW:
+        return rows.tobytes()
+    columns = []
+    for name in TRADE_DTYPE.names:
+        column = np.ascontiguousarray(rows[name])
+        if name in _DELTA_FIELDS:
+            column = np.diff(column, prepend=column.dtype.type(0))
+        columns.append(column.tobytes())
+    return zlib.compress(b"".join(columns), level)
+
+
+def _decode(buffer, rows, codec):
+    if codec == RAW:
+        return np.frombuffer(buffer, dtype=TRADE_DTYPE, count=rows)
+    raw = zlib.decompress(buffer)
+    out = np.empty(rows, dtype=TRADE_DTYPE)
+    offset = 0
+    for name in TRADE_DTYPE.names:
+        dtype = TRADE_DTYPE[name]
+        column = np.frombuffer(raw, dtype=dtype, count=rows, offset=offset)
+        out[name] = np.cumsum(column, dtype=dtype) if name in _DELTA_FIELDS else column
+        offset += rows * dtype.itemsize
+    return out
+
+
+class TickStore:
+    def __init__(self, root, block_rows=16384, compression="zlib", level=1):
+        """Append-only store of trades, one segment per symbol and UTC day:
+        <root><symbol>/<symbol>_<YYYY-MM-DD>.ticks
+
+        A segment is a sequence of blocks of up to block_rows trades (sorted
+        by time within a block). Next to it, <segment>.idx holds one
+        INDEX_DTYPE entry per block with its offset and time range. That sparse
+        index is only appended once the block is written, so a crash mid-append
+        leaves a tail the index doesn't point to, and the next append overwrites it.
+        Reads memory-map the segment and only touch the blocks whose time
+        range overlaps the query.
+
+        Parameters
+        ----------
+        root : str
+            Directory of the store, same BASEPATH convention as tradesocket
+        block_rows : int, optional
+            Max trades per block, by default 16384
+        compression : str, optional
+            "zlib" (columnar, delta encoded ids and times) or None, by default "zlib"
+        level : int, optional
+            zlib compression level, by default 1
+        """
+        if compression not in ("zlib", None):
+            raise ValueError(f"Unknown compression {compression!r}")
+        self.root = root
+        self.block_rows = block_rows
+        self.codec = ZLIB if compression == "zlib" else RAW
+        self.level = level
+        self._recovered = set()  # segments whose tail was checked by this process
+
+    def segment_path(self, symbol, day):
+        """Path of the segment of a symbol for a day (epoch days)"""
+        stamp = str(np.datetime64(int(day), "D"))
+        return f"{self.root}{symbol}/{symbol}_{stamp}.ticks"
+
+    def symbols(self) -> List[str]:
+        return sorted({os.path.basename(os.path.dirname(p))
+                       for p in glob.glob(os.path.join(self.root + "*", "*.ticks"))})
+
+    def days(self, symbol) -> List[int]:
+        """Epoch days a symbol has segments for, oldest first"""
+        paths = glob.glob(os.path.join(self.root + symbol, symbol + "_*.ticks"))
+        stamps = [os.path.basename(p)[len(symbol) + 1:-len(".ticks")] for p in paths]
+        return sorted(int(np.datetime64(stamp, "D").astype(np.int64)) for stamp in stamps)
+
+    def index(self, symbol, day) -> np.ndarray:
+        """Block index of one segment (empty if it doesn't exist)"""
+        path = self.segment_path(symbol, day) + ".idx"
+        if not os.path.exists(path):
+            return np.empty(0, dtype=INDEX_DTYPE)
+        with open(path, "rb") as f:
+            data = f.read()
+        usable = len(data) - len(data) % INDEX_DTYPE.itemsize  # ignore a torn last entry
+        return np.frombuffer(data[:usable], dtype=INDEX_DTYPE)
+
+    def append(self, symbol, rows):
+        """Appends trades (TRADE_DTYPE array, any order) as new blocks
+
+        Parameters
+        ----------
+        symbol : str
+            Product id
+        rows : np.ndarray
+            Trades to store, e.g. TradeBuffer.to_array()
+        """
+        if len(rows) == 0:
+            return
+        rows = rows[np.argsort(rows["time"], kind="stable")]
+        days = rows["time"] // DAY_NS
+        bounds = np.flatnonzero(np.diff(days)) + 1
+        for day_rows in np.split(rows, bounds):
+            self._append_segment(symbol, int(day_rows["time"][0] // DAY_NS), day_rows)
+
+    def _append_segment(self, symbol, day, rows):
+        path = self.segment_path(symbol, day)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if path not in self._recovered:
+            self._recover(path, self.index(symbol, day))
+            self._recovered.add(path)
+        entries = np.empty((len(rows) + self.block_rows - 1) // self.block_rows, dtype=INDEX_DTYPE)
+        with open(path, "ab") as f:
+            offset = f.tell()
+            for i, start in enumerate(range(0, len(rows), self.block_rows)):
+                block = rows[start:start + self.block_rows]
+                data = _encode(block, self.codec, self.level)
+                f.write(data)
+                entries[i] = (offset, len(data), len(block), self.codec,
+                              block["time"][0], block["time"][-1])
+                offset += len(data)
+            f.flush()
+            os.fsync(f.fileno())
+        with open(path + ".idx", "ab") as f:
+            f.write(entries.tobytes())
+
+    def _recover(self, path, index):
+        """Cuts a segment back to the end of its last indexed block, dropping
+        what an interrupted append left behind"""
+        end = int(index["offset"][-1] + index["length"][-1]) if len(index) else 0
+        if os.path.exists(path) and os.path.getsize(path) > end:
+            os.truncate(path, end)
+        idx_path = path + ".idx"
+        if os.path.exists(idx_path) and os.path.getsize(idx_path) > index.nbytes:
+            os.truncate(idx_path, index.nbytes)
+
+    def read_day(self, symbol, day, start=None, end=None) -> np.ndarray:
+        """Trades of one segment with start <= time < end, sorted by time"""
+        index = self.index(symbol, day)
+        mask = np.ones(len(index), dtype=bool)
+        if start is not None:
+            mask &= index["last"] >= start
+        if end is not None:
+            mask &= index["first"] < end
+        blocks = index[mask]
+        if len(blocks) == 0:
+            return np.empty(0, dtype=TRADE_DTYPE)
+        with open(self.segment_path(symbol, day), "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            view = memoryview(mapped)
+            parts = []
+            for offset, length, rows, codec in zip(blocks["offset"].tolist(), blocks["length"].tolist(),
+                                                   blocks["rows"].tolist(), blocks["codec"].tolist()):
+                part = _decode(view[offset:offset + length], rows, codec)
+                lo = np.searchsorted(part["time"], start) if start is not None else 0
+                hi = np.searchsorted(part["time"], end) if end is not None else rows
+                parts.append(part[lo:hi])
+            result = np.concatenate(parts)  # copies out of the mapping
+            del parts, part
+            view.release()
+        finally:
+            mapped.close()
+        if np.any(blocks["first"][1:] < blocks["last"][:-1]):  # blocks overlap, e.g. late trades
+            result = result[np.argsort(result["time"], kind="stable")]
+        return result
+
+    def read_days(self, symbol, start=None, end=None) -> Iterator[np.ndarray]:
+        """Yields the trades in [start, end) one day at a time, oldest first"""
+        first = start // DAY_NS if start is not None else None
+        last = (end - 1) // DAY_NS if end is not None else None
+        for day in self.days(symbol):
+            if (first is None or day >= first) and (last is None or day <= last):
+                rows = self.read_day(symbol, day, start, end)
+                if len(rows):
+                    yield rows
+
+    def read(self, symbol, start=None, end=None) -> np.ndarray:
+        """Trades of a symbol with start <= time < end (epoch ns), sorted by time
+
+        Parameters
+        ----------
+        symbol : str
+            Product id
+        start : int, optional
+            Inclusive lower bound, by default the first trade
+        end : int, optional
+            Exclusive upper bound, by default after the last trade
+
+        Returns
+        -------
+        np.ndarray
+            TRADE_DTYPE rows
+        """
+        parts = list(self.read_days(symbol, start, end))
+        return np.concatenate(parts) if parts else np.empty(0, dtype=TRADE_DTYPE)
+
+    def last(self, symbol, seconds, now_ns=None) -> np.ndarray:
+        """Trades of the last `seconds` seconds, e.g. last(symbol, 3 * 3600)"""
+        if now_ns is None:
+            now_ns = int(datetime.datetime.now(datetime.timezone.utc).timestamp() * 1e9)
+        return self.read(symbol, now_ns - int(seconds * 1e9), now_ns)
+
+
+def import_trade_files(store, basepath, symbol):
+    """Copies the minute files tradesocket wrote for a symbol into a TickStore
+
+    Returns
+    -------
+    int
+        Number of trades imported
+    """
+    count = 0
+    for path in trade_files(basepath, symbol):
+        rows = np.asarray(load_trade_file(path))
+        store.append(symbol, rows)
+        count += len(rows)
+    return count
@@ -0,0 +1,117 @@
+from typing import Iterator
+
+import numpy as np
+
+# One row per Coinbase match. Times are epoch nanoseconds, side is +1 for a
+# buy-side maker and -1 for a sell-side maker.
+TRADE_DTYPE = np.dtype([
+    ("trade_id", np.int64),
+    ("time", np.int64),
+    ("price", np.float64),
+    ("size", np.float64),
+    ("side", np.int8),
+])
+
+SIDES = {"buy": 1, "sell": -1}
+
+
+def parse_time_ns(timestamp):
+    """Converts an exchange ISO-8601 timestamp into int64 epoch nanoseconds
+
+    Parameters
+    ----------
+    timestamp : str
+        Timestamp such as "2014-11-07T08:19:27.028459Z"
+
+    Returns
+    -------
+    int
+        Nanoseconds since the epoch (UTC)
+    """
+    return int(np.datetime64(timestamp.rstrip("Z"), "ns").astype(np.int64))
+
+
+class TradeBuffer:
+    def __init__(self, chunk_size=4096):
+        """Preallocated columnar buffer of trades for a single symbol.
+
+        Rows are written into fixed size chunks of TRADE_DTYPE. When a chunk
+        fills up a new one is allocated next to it, so appends never copy
+        existing rows and cost O(1).
+
+        Parameters
+        ----------
+        chunk_size : int, optional
+            Number of rows per chunk, by default 4096
+        """
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+        self.chunk_size = chunk_size
+        self._chunks = [np.empty(chunk_size, dtype=TRADE_DTYPE)]
+        self._pos = 0  # next free row in the last chunk
+
+    def __len__(self):
+        return (len(self._chunks) - 1) * self.chunk_size + self._pos
+
+    def append(self, trade_id, time_ns, price, size, side):
+        """Appends a single trade
+
+        Parameters
+        ----------
+        trade_id : int
+            Exchange trade id
+        time_ns : int
+            Trade time in epoch nanoseconds
+        price : float
+            Trade price
+        size : float
+            Trade size
+        side : int
+            +1 for buy, -1 for sell
+        """
+        if self._pos == self.chunk_size:
+            self._chunks.append(np.empty(self.chunk_size, dtype=TRADE_DTYPE))
+            self._pos = 0
+        self._chunks[-1][self._pos] = (trade_id, time_ns, price, size, side)
+        self._pos += 1
+
+    def append_message(self, message):
+        """Appends a decoded Coinbase match message
+
+        Parameters
+        ----------
+        message : dict
+            Decoded "match"/"last_match" message
+        """
+        self.append(
+            message["trade_id"],
+            parse_time_ns(message["time"]),
+            float(message["price"]),
+            float(message["size"]),
+            SIDES.get(message.get("side"), 0),
+        )
+
+    def chunks(self) -> Iterator[np.ndarray]:
+        """Yields views over the filled part of each chunk, oldest first.
+
+        The views share memory with the buffer, nothing is copied.
+        """
+        for chunk in self._chunks[:-1]:
+            yield chunk
+        if self._pos:
+            yield self._chunks[-1][:self._pos]
+
+    def to_array(self):
+        """Returns every row as one contiguous array
+
+        A view is returned when the buffer fits in one chunk, otherwise
+        the chunks are concatenated into a new array.
+        """
+        if len(self._chunks) == 1:
+            return self._chunks[0][:self._pos]
+        return np.concatenate(list(self.chunks()))
+
+    def clear(self):
+        """Drops every row while keeping the first chunk allocated"""
+        del self._chunks[1:]
+        self._pos = 0
@@ -1,19 +1,40 @@
-import websocket, logging, threading, time, json, os, datetime
+import websocket, logging, threading, time, json, os, datetime, asyncio, signal, itertools
 import numpy as np
+import websockets
+
+from tickstore import TickStore
+from tradebuffer import SIDES, TRADE_DTYPE, TradeBuffer, parse_time_ns
 
 SYMBOLS = []
 BASEPATH = ""
+URL = "wss://ws-feed.exchange.coinbase.com"
+DISCHARGE_INTERVAL = 60  # seconds between two output files
+INGEST_MODE = "thread"  # "thread" (websocket-client + symbollock) or "async" (see run_async)
+CONNECTIONS = 4  # sockets the symbols are sharded over in async mode
+OUTPUT_FORMAT = "csv"  # "csv", "npy" (raw columnar .npy plus a .schema.json sidecar) or "store" (tickstore.TickStore)
+CSV_FORMAT = ["%d", "%d", "%.8f", "%.8f", "%d"]
+SCHEMA = {
+    "fields": {name: TRADE_DTYPE[name].str for name in TRADE_DTYPE.names},
+    "time": "epoch nanoseconds, UTC",
+    "side": {"buy": 1, "sell": -1},
+}
 global symbol_data
-symbol_data = {symbol: np.array([]) for symbol in SYMBOLS} 
+symbol_data = {symbol: TradeBuffer() for symbol in SYMBOLS}
+spare_data = {symbol: TradeBuffer() for symbol in SYMBOLS}  # swapped in at each discharge
+BAR_BUILDER = None  # optional bars.BarBuilder fed with every match
+TICK_STORE = None  # TickStore under BASEPATH, created on the first "store" discharge
 stop_event = threading.Event()
 symbollock = threading.Lock()
+async_stop = None  # asyncio.Event of the running run_async() loop
+async_loop = None
+file_seq = itertools.count()  # makes file names unique within a process
 
 
 def start_socket():
     logging.basicConfig(level=logging.WARNING)
     while True:
         try:
-            ws = websocket.WebSocketApp("wss://ws-feed.exchange.coinbase.com",
+            ws = websocket.WebSocketApp(URL,
                                         on_open=on_open,
                                         on_message=on_message,
                                         on_error=on_error,
@@ -29,44 +50,181 @@ def on_close(ws, close_status_code, close_msg):
 def on_error(ws, error):
     print(f"WebSocket error: {error}")
 
+def subscribe_message(symbols):
+    return json.dumps({"type": "subscribe", "channels": [{"name": "matches", "product_ids": symbols}]})
+
 def on_open(ws):
     print("WebSocket opened")
-    subscribe = {"type": "subscribe", "channels": [{"name": "matches", "product_ids": SYMBOLS}]}
-    ws.send(json.dumps(subscribe))
+    ws.send(subscribe_message(SYMBOLS))
 
-def on_message(ws, message):
-    global symbol_data
+def record_match(message, lock=None):
+    """Decodes a raw feed message and appends it to its symbol's buffer if it's a match.
+    Only the append runs under `lock`."""
     message_data = dict(json.loads(message))
     if message_data == {}:
         raise Exception
+    if message_data.get("type") not in ("match", "last_match"):
+        return
     product_id = message_data.get("product_id")
-    with symbollock:
-        if product_id in symbol_data:
-            symbol_data[product_id] = np.append(symbol_data[product_id], message_data)
-        else:
+    time_ns = parse_time_ns(message_data["time"])
+    price = float(message_data["price"])
+    size = float(message_data["size"])
+    side = SIDES.get(message_data.get("side"), 0)
+    if lock is not None:
+        lock.acquire()
+    try:
+        buffer = symbol_data.get(product_id)
+        if buffer is None:
             print(f"Unknown product_id {product_id} in message: {message_data}")
+            return
+        buffer.append(message_data["trade_id"], time_ns, price, size, side)
+    finally:
+        if lock is not None:
+            lock.release()
+    if BAR_BUILDER is not None:
+        BAR_BUILDER.on_trade(product_id, time_ns, price, size)
+
+def on_message(ws, message):
+    record_match(message, symbollock)
+
+def write_csv(path, buffer):
+    with open(path, "x") as f:
+        f.write(",".join(TRADE_DTYPE.names) + "\n")
+        for chunk in buffer.chunks():
+            np.savetxt(f, chunk, delimiter=",", fmt=CSV_FORMAT)
+
+def write_npy(path, buffer):
+    header = {"descr": np.lib.format.dtype_to_descr(TRADE_DTYPE),
+              "fortran_order": False,
+              "shape": (len(buffer),)}
+    with open(path, "xb") as f:
+        np.lib.format.write_array_header_1_0(f, header)
+        for chunk in buffer.chunks():
+            chunk.tofile(f)
+    with open(path + ".schema.json", "x") as f:
+        json.dump(SCHEMA, f)
+
+WRITERS = {"csv": write_csv, "npy": write_npy}
+
+def swap_buffers():
+    """Swaps the live buffers for the spare ones, returns the filled ones"""
+    global symbol_data, spare_data
+    full_data, symbol_data = symbol_data, spare_data
+    spare_data = None
+    return full_data
+
+def write_buffers(full_data):
+    """Writes and empties the buffers returned by swap_buffers, then makes them the spare set.
+    The buffers are emptied and handed back even if a write fails, so a failed
+    discharge loses its own trades but never leaves swap_buffers without spares."""
+    global spare_data, TICK_STORE
+    try:
+        if OUTPUT_FORMAT == "store":
+            if TICK_STORE is None:
+                TICK_STORE = TickStore(BASEPATH)
+            for symbol in SYMBOLS:
+                TICK_STORE.append(symbol, full_data[symbol].to_array())
+        else:
+            write = WRITERS[OUTPUT_FORMAT]
+            # microseconds plus a sequence number, so discharges never share a name; files
+            # are opened with "x" so a collision anyway raises instead of overwriting trades
+            stamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f") + f"_{next(file_seq):06d}"
+            for symbol in SYMBOLS:
+                path = BASEPATH + symbol + "/" + symbol + "_UATrades_" + stamp + "." + OUTPUT_FORMAT
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                write(path, full_data[symbol])
+        print("Data Saved")
+    finally:
+        for buffer in full_data.values():
+            buffer.clear()
+        spare_data = full_data
+
+def discharge():
+    """Swaps the buffers under symbollock and writes the full ones off-lock.
+    A failed write is logged and the next discharge goes ahead as usual."""
+    with symbollock:
+        full_data = swap_buffers()
+    try:
+        write_buffers(full_data)
+    except Exception:
+        logging.exception("Discharge failed, its trades were dropped")
 
 def start_discharge():
     while True:
         if stop_event.is_set():
             return
-        time.sleep(60)
-        global symbol_data
-        with symbollock:
-            for symbol in SYMBOLS:
-                path = BASEPATH + symbol + "/" + symbol+ "_UATrades_" + str(datetime.datetime.now().strftime("%Y-%m-%d %H:%M")) + ".csv"
-                os.makedirs(os.path.dirname(path), exist_ok=True)
-                np.savetxt(path, symbol_data[symbol], delimiter=",", fmt="%s")
-            symbol_data = {symbol: np.array([]) for symbol in SYMBOLS}
-            print("Data Saved")
+        time.sleep(DISCHARGE_INTERVAL)
+        discharge()
+
+async def _async_connection(symbols):
+    """One socket subscribed to one shard of the symbols, reconnecting until stopped"""
+    while not async_stop.is_set():
+        try:
+            async with websockets.connect(URL, ping_interval=5, max_size=None) as ws:
+                await ws.send(subscribe_message(symbols))
+                async for message in ws:
+                    record_match(message)  # the event loop is the only writer, no lock needed
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"WebSocket error on {symbols}: {e!r}")
+        try:
+            await asyncio.wait_for(async_stop.wait(), 5)
+        except asyncio.TimeoutError:
+            pass
+
+async def _async_discharge():
+    """Swaps buffers on the event loop every DISCHARGE_INTERVAL and writes them in a worker thread"""
+    loop = asyncio.get_running_loop()
+    stopping = False
+    while not stopping:
+        try:
+            await asyncio.wait_for(async_stop.wait(), DISCHARGE_INTERVAL)
+            stopping = True
+        except asyncio.TimeoutError:
+            pass
+        try:
+            await loop.run_in_executor(None, write_buffers, swap_buffers())
+        except Exception:
+            logging.exception("Discharge failed, its trades were dropped")
+
+async def run_async(connections=None):
+    """Ingests every symbol with asyncio, SYMBOLS being sharded round-robin over
+    `connections` concurrent sockets (default CONNECTIONS). Decoding and buffering
+    happen on the event loop, file writes in a worker thread. Returns once end()
+    is called (or SIGINT/SIGTERM), after writing what was still buffered."""
+    global async_stop, async_loop
+    async_stop = asyncio.Event()
+    async_loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            async_loop.add_signal_handler(sig, async_stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # not available on this platform/thread
+    connections = max(1, min(connections or CONNECTIONS, len(SYMBOLS) or 1))
+    shards = [SYMBOLS[i::connections] for i in range(connections)]
+    sockets = [asyncio.create_task(_async_connection(shard)) for shard in shards if shard]
+    discharge = asyncio.create_task(_async_discharge())
+    if stop_event.is_set():
+        async_stop.set()
+    await async_stop.wait()
+    for task in sockets:
+        task.cancel()
+    await asyncio.gather(*sockets, return_exceptions=True)
+    await discharge
 
 def end():
     stop_event.set()
+    if async_loop is not None and async_stop is not None:
+        async_loop.call_soon_threadsafe(async_stop.set)
 
 if __name__ == "__main__":
-    t = threading.Thread(target=start_socket)
-    s = threading.Thread(target=start_discharge)
-    t.start()
-    s.start()
-    while True:
-        time.sleep(1)
+    if INGEST_MODE == "async":
+        asyncio.run(run_async())
+    else:
+        t = threading.Thread(target=start_socket)
+        s = threading.Thread(target=start_discharge)
+        t.start()
+        s.start()
+        while True:
+            time.sleep(1)
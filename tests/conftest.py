@@ -0,0 +1,12 @@
+'''
+The packages import each other by module name from their own directory (like
+their scripts do when run from there), so their directories go on sys.path.
+'''
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+for directory in ('Ingest', 'Backtesting', 'Execution Platform',
+                  os.path.join('Data Acquisition', '1---Websockets')):
+    sys.path.insert(0, os.path.join(ROOT, directory))
@@ -0,0 +1,90 @@
+from queue import Queue
+
+import pytest
+
+from backpressure import Outbox, channel_policy
+from metrics import SocketMetrics
+
+
+def level_2(ticker, side, price, quantity):
+    # LEVEL_2_FIELDS: time, exchange, ticker, side, price, quantity
+    return ('2024-01-01T00:00:00', 'coinbase', ticker, side, price, quantity)
+
+
+def outbox(policy, maxsize=1, max_pending=100):
+    queue = Queue(maxsize=maxsize)
+    metrics = SocketMetrics('coinbase')
+    return Outbox(queue, 'level2', metrics, policy, max_pending), queue, metrics
+
+
+def drain_queue(queue):
+    batches = []
+    while not queue.empty():
+        batches.append(queue.get_nowait())
+    return batches
+
+
+def test_block_puts_every_batch():
+    box, queue, metrics = outbox('block', maxsize=0)
+    box.send([1, 2], [])
+    box.send([3], [])
+    assert drain_queue(queue) == [[1, 2], [3]]
+    assert len(box) == 0
+
+
+def test_drop_oldest_keeps_order_and_drops_whole_batches():
+    box, queue, metrics = outbox('drop_oldest', max_pending=4)
+    box.send([1], [])  # fills the queue
+    box.send([2, 3], [])
+    box.send([4, 5], [])
+    box.send([6], [])
+    assert len(box) == 3  # [2, 3] was dropped to stay within max_pending
+    assert metrics.counters['drops'] == 2
+    assert drain_queue(queue) == [[1]]
+    box.drain()
+    assert drain_queue(queue) == [[4, 5]]
+    box.drain()
+    assert drain_queue(queue) == [[6]]
+    assert len(box) == 0
+
+
+def test_drop_oldest_keeps_the_newest_batch_even_if_too_big():
+    box, queue, metrics = outbox('drop_oldest', max_pending=2)
+    box.send([1], [])
+    box.send([2, 3, 4], [])
+    assert len(box) == 3 and metrics.counters['drops'] == 0
+
+
+def test_conflate_keeps_the_latest_record_per_level():
+    box, queue, metrics = outbox('conflate', max_pending=100)
+    box.send([level_2('BTC-USD', 'buy', 100.0, 1.0)], [])  # fills the queue
+    box.send([level_2('BTC-USD', 'buy', 100.0, 2.0), level_2('BTC-USD', 'sell', 101.0, 1.0)], [])
+    box.send([level_2('BTC-USD', 'buy', 100.0, 3.0), level_2('ETH-USD', 'buy', 100.0, 1.0)], [])
+    assert len(box) == 3
+    assert metrics.counters['conflated'] == 1
+    drain_queue(queue)
+    box.drain()
+    assert drain_queue(queue) == [[level_2('BTC-USD', 'sell', 101.0, 1.0),
+                                   level_2('BTC-USD', 'buy', 100.0, 3.0),
+                                   level_2('ETH-USD', 'buy', 100.0, 1.0)]]
+
+
+def test_conflate_drops_the_oldest_keys_beyond_max_pending():
+    box, queue, metrics = outbox('conflate', max_pending=2)
+    box.send([level_2('BTC-USD', 'buy', 1.0, 1.0)], [])
+    box.send([level_2('BTC-USD', 'buy', price, 1.0) for price in (2.0, 3.0, 4.0)], [])
+    assert metrics.counters['drops'] == 1
+    drain_queue(queue)
+    box.drain()
+    assert [record[4] for record in drain_queue(queue)[0]] == [3.0, 4.0]
+
+
+def test_channel_policy():
+    assert channel_policy('conflate', 'level2') == 'conflate'
+    assert channel_policy('conflate', 'level1') == 'drop_oldest'
+    assert channel_policy('block', 'level1') == 'block'
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        outbox('drop_newest')
@@ -0,0 +1,79 @@
+from bars import BAR_FIELDS, BarBuilder, BarWriter
+
+SECOND = 10**9
+
+
+def builder(**kwargs):
+    closed = []
+    kwargs.setdefault('resolutions', (60,))
+    return BarBuilder(sinks=[closed.extend], **kwargs), closed
+
+
+def bar(row):
+    return dict(zip(BAR_FIELDS, row))
+
+
+def test_ohlcv_vwap_follow_trade_time():
+    bars, closed = builder(lateness=5.0)
+    bars.on_trade('BTC-USD', 10 * SECOND, 100.0, 1.0)
+    bars.on_trade('BTC-USD', 30 * SECOND, 103.0, 1.0)
+    bars.on_trade('BTC-USD', 5 * SECOND, 99.0, 2.0)  # late but within the bar: the new open
+    bars.on_trade('BTC-USD', 50 * SECOND, 101.0, 1.0)
+    bars.on_trade('BTC-USD', 64 * SECOND, 110.0, 1.0)
+    assert closed == []  # the bar waits `lateness` past its end
+    bars.on_trade('BTC-USD', 65 * SECOND, 110.0, 1.0)
+    (row,) = closed
+    assert bar(row) == {'symbol': 'BTC-USD', 'resolution': 60.0, 'start': 0, 'open': 99.0,
+                        'high': 103.0, 'low': 99.0, 'close': 101.0, 'volume': 5.0,
+                        'vwap': (100 + 103 + 198 + 101) / 5, 'trades': 4}
+
+
+def test_trades_of_a_closed_bar_are_late():
+    bars, closed = builder(lateness=1.0)
+    bars.on_trade('BTC-USD', 10 * SECOND, 100.0, 1.0)
+    bars.on_trade('BTC-USD', 61 * SECOND, 100.0, 1.0)
+    bars.on_trade('BTC-USD', 59 * SECOND, 100.0, 1.0)
+    assert len(closed) == 1 and bars.late_trades == 1
+    assert bar(closed[0])['trades'] == 1
+
+
+def test_every_resolution_closes_on_the_watermark():
+    bars, closed = builder(resolutions=(1, 60), lateness=0.5)
+    for t in range(60):
+        bars.on_trade('ETH-USD', t * SECOND, float(t), 1.0)
+    one_second = [row for row in closed if row[1] == 1.0]
+    assert [row[2] for row in one_second] == [t * SECOND for t in range(58)]
+    assert not [row for row in closed if row[1] == 60.0]
+    bars.on_trade('ETH-USD', 61 * SECOND, 1.0, 1.0)  # past 60 + lateness
+    bars.on_trade('ETH-USD', 60 * SECOND + SECOND // 2, 1.0, 1.0)  # out of order, same minute
+    bars.close_all()
+    minutes = [bar(row) for row in closed if row[1] == 60.0]
+    assert [(row['start'], row['trades']) for row in minutes] == [(0, 60), (60 * SECOND, 2)]
+    assert minutes[1]['open'] == 1.0 and bars.late_trades == 0
+
+def test_shared_clock_closes_every_symbol_together():
+    bars, closed = builder(lateness=2.0)
+    bars.on_trade('ETH-USD', 1 * SECOND, 10.0, 1.0)
+    bars.on_trade('BTC-USD', 1 * SECOND, 100.0, 1.0)
+    bars.on_trade('BTC-USD', 62 * SECOND, 100.0, 1.0)
+    assert sorted(row[0] for row in closed) == ['BTC-USD', 'ETH-USD']
+
+    bars, closed = builder(lateness=2.0, shared_clock=False)
+    bars.on_trade('ETH-USD', 1 * SECOND, 10.0, 1.0)
+    bars.on_trade('BTC-USD', 1 * SECOND, 100.0, 1.0)
+    bars.on_trade('BTC-USD', 62 * SECOND, 100.0, 1.0)
+    assert [row[0] for row in closed] == ['BTC-USD']
+    bars.advance(62 * SECOND)
+    assert [row[0] for row in closed] == ['BTC-USD', 'ETH-USD']
+
+
+def test_bar_writer(tmp_path):
+    writer = BarWriter(f'{tmp_path}/')
+    day = 1_700_000_000 * SECOND
+    writer([('BTC-USD', 60.0, day, 1.0, 2.0, 0.5, 1.5, 3.0, 1.25, 7)])
+    writer([('BTC-USD', 60.0, day + 60 * SECOND, 1.5, 1.5, 1.5, 1.5, 1.0, 1.5, 1)])
+    (path,) = (tmp_path / 'BTC-USD').iterdir()
+    assert path.name == 'BTC-USD_Bars_60s_2023-11-14.csv'
+    lines = path.read_text().splitlines()
+    assert lines[0] == ','.join(BAR_FIELDS[2:])
+    assert len(lines) == 3 and lines[1].endswith(',7')
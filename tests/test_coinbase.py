@@ -0,0 +1,68 @@
+import asyncio
+import json
+from queue import Queue
+
+from coinbase import CoinbaseWebSocket
+from web_socket import LEVEL_1_FIELDS, LEVEL_2_FIELDS
+
+
+def ticker(product_id, price, sequence=1):
+    return json.dumps({'type': 'ticker', 'product_id': product_id, 'price': str(price),
+                       'sequence': sequence, 'time': '2024-01-01T00:00:00.123456Z'})
+
+
+def l2update(product_id, changes):
+    return json.dumps({'type': 'l2update', 'product_id': product_id, 'changes': changes,
+                       'time': '2024-01-01T00:00:01.000000Z'})
+
+
+def drain_queue(queue):
+    batches = []
+    while not queue.empty():
+        batches.append(queue.get_nowait())
+    return batches
+
+
+def socket(**kwargs):
+    queue_1, queue_2 = Queue(), Queue()
+    return CoinbaseWebSocket(queue_1, queue_2, ['BTC-USD', 'ETH-USD'], **kwargs), queue_1, queue_2
+
+
+def test_records_are_published_as_tuples_in_batches():
+    ws, queue_1, queue_2 = socket(batch_size=2)
+    ws._on_message(ticker('BTC-USD', 100.5))
+    assert queue_1.empty()  # waits for a second record
+    ws._on_message(ticker('ETH-USD', 10))
+    ws._on_message(ticker('BTC-USD', 101))
+    batches = drain_queue(queue_1)
+    assert batches == [[('2024-01-01 00:00:00.123456', 'coinbase', 'BTC-USD', 100.5),
+                        ('2024-01-01 00:00:00.123456', 'coinbase', 'ETH-USD', 10.0)]]
+    assert all(len(record) == len(LEVEL_1_FIELDS) for record in batches[0])
+    ws.flush()
+    assert [len(batch) for batch in drain_queue(queue_1)] == [1]
+
+
+def test_every_change_of_an_l2update_is_a_record():
+    ws, queue_1, queue_2 = socket(batch_size=10)
+    ws._on_message(l2update('BTC-USD', [['buy', '100.0', '1.5'], ['sell', '101.0', '0']]))
+    ws.flush()
+    (batch,) = drain_queue(queue_2)
+    assert batch == [('2024-01-01 00:00:01.000000', 'coinbase', 'BTC-USD', 'buy', 100.0, 1.5),
+                     ('2024-01-01 00:00:01.000000', 'coinbase', 'BTC-USD', 'sell', 101.0, 0.0)]
+    assert len(batch[0]) == len(LEVEL_2_FIELDS)
+    assert queue_1.empty()
+
+
+def test_batch_interval_flushes_a_partial_batch():
+    ws, queue_1, queue_2 = socket(batch_size=1000, batch_interval=0.01)
+
+    async def run():
+        timer = asyncio.create_task(ws._flush_periodically())
+        ws._on_message(ticker('BTC-USD', 100))
+        for _ in range(200):
+            if not queue_1.empty():
+                break
+            await asyncio.sleep(0.005)
+        timer.cancel()
+    asyncio.run(run())
+    assert [len(batch) for batch in drain_queue(queue_1)] == [1]
@@ -0,0 +1,101 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from data_store import PriceStore
+
+HEADER = 'date,open,high,low,close,volume,Name\n'
+
+
+def write_csv(path, rows, mtime=None):
+    with open(path, 'w') as f:
+        f.write(HEADER)
+        for date, name, close in rows:
+            f.write(f'{date},{close},{close + 1},{close - 1},{close},100,{name}\n')
+    if mtime is not None:
+        os.utime(path, ns=(mtime, mtime))
+
+
+ROWS = [('2016-12-30', 'AAA', 10.0), ('2017-01-03', 'AAA', 11.0), ('2017-01-04', 'AAA', 12.0),
+        ('2017-01-03', 'BBB', 20.0)]
+
+
+@pytest.fixture
+def csv(tmp_path):
+    path = tmp_path / 'prices.csv'
+    write_csv(path, ROWS, mtime=1_000_000_000_000_000_000)
+    return str(path)
+
+
+def test_load_pivots_partitions(csv):
+    data = PriceStore(csv).load()
+    assert data.symbols.tolist() == ['AAA', 'BBB']
+    assert data.dates.tolist() == np.array(['2016-12-30', '2017-01-03', '2017-01-04'],
+                                           dtype='datetime64[D]').tolist()
+    close = data.prices['close']
+    np.testing.assert_array_equal(close, [[10, np.nan], [11, 20], [12, np.nan]])
+    assert PriceStore(csv).manifest['symbols'] == {'AAA': [2016, 2017], 'BBB': [2017]}
+
+
+def test_load_bounds_and_symbols(csv):
+    data = PriceStore(csv).load(['AAA'], start='2017-01-01', end='2017-01-03')
+    assert data.symbols.tolist() == ['AAA']
+    np.testing.assert_array_equal(data.prices['close'], [[11.0]])
+    with pytest.raises(KeyError):
+        PriceStore(csv).load(['CCC'])
+
+
+def test_cache_is_reused(csv, monkeypatch):
+    PriceStore(csv).load()
+    store = PriceStore(csv)
+
+    def build():
+        raise AssertionError('the cache was rebuilt')
+    monkeypatch.setattr(store, 'build', build)
+    assert store.load().prices['close'].shape == (3, 2)
+
+
+def test_cache_is_rebuilt_when_the_csv_changes(csv):
+    store = PriceStore(csv)
+    assert store.symbols() == ['AAA', 'BBB']
+    write_csv(csv, ROWS + [('2018-01-02', 'CCC', 30.0)], mtime=1_000_000_001_000_000_000)
+    store = PriceStore(csv)
+    assert store.symbols() == ['AAA', 'BBB', 'CCC']
+    np.testing.assert_array_equal(store.load(['CCC']).prices['close'], [[30.0]])
+    # only the new version is left, no staging directory nor manifest temp file
+    assert sorted(os.listdir(store.cache_dir)) == sorted([store.manifest['directory'], 'manifest.json'])
+
+
+def test_reader_survives_a_rebuild_by_another_process(csv):
+    reader = PriceStore(csv)
+    assert reader.load().symbols.tolist() == ['AAA', 'BBB']
+    old = os.path.join(reader.cache_dir, reader.manifest['directory'])
+    write_csv(csv, ROWS + [('2018-01-02', 'AAA', 13.0)], mtime=1_000_000_001_000_000_000)
+    PriceStore(csv).load()
+    assert not os.path.exists(old)
+    # reader still holds the old manifest, whose partitions are gone: it rereads the new one
+    np.testing.assert_array_equal(reader.load(['AAA']).prices['close'], [[10.0], [11.0], [12.0], [13.0]])
+
+
+def test_concurrent_builds_of_the_same_version(csv):
+    first, second = PriceStore(csv), PriceStore(csv)
+    manifest = first.build()
+    assert second.build() == manifest  # its rename loses to the existing version
+    assert first.load().prices['close'].shape == (3, 2)
+    assert sorted(os.listdir(first.cache_dir)) == sorted([manifest['directory'], 'manifest.json'])
+
+
+def test_missing_version_directory_is_rebuilt(csv):
+    store = PriceStore(csv)
+    shutil.rmtree(os.path.join(store.cache_dir, store.manifest['directory']))
+    assert PriceStore(csv).load().prices['close'].shape == (3, 2)
+
+
+def test_cache_is_rebuilt_when_the_manifest_is_corrupt(csv):
+    store = PriceStore(csv)
+    store.load()
+    with open(os.path.join(store.cache_dir, 'manifest.json'), 'w') as f:
+        f.write('{not json')
+    assert PriceStore(csv).symbols() == ['AAA', 'BBB']
@@ -0,0 +1,70 @@
+from feed_merger import FeedMerger
+
+STREAM = ('match', 'BTC-USD')
+
+
+def test_first_copy_wins():
+    merger = FeedMerger()
+    # two connections delivering the same sequence, interleaved
+    arrivals = [1, 2, 1, 3, 2, 3, 5, 4, 5]
+    accepted = [seq for seq in arrivals if merger.accept(('ticker', 'BTC-USD'), seq)]
+    assert accepted == [1, 2, 3, 5]
+    assert merger.duplicates == 5
+    assert merger.expired_gaps() == []  # tickers aren't contiguous, 4 is no gap
+
+
+def test_streams_are_independent():
+    merger = FeedMerger()
+    assert merger.accept(('ticker', 'BTC-USD'), 10)
+    assert merger.accept(('ticker', 'ETH-USD'), 10)
+    assert not merger.accept(('ticker', 'BTC-USD'), 10)
+
+
+def test_gap_filled_by_the_slower_connection():
+    merger = FeedMerger(gap_timeout=60)
+    assert merger.accept(STREAM, 1, contiguous=True)
+    assert merger.accept(STREAM, 4, contiguous=True)  # the leading connection skipped 2 and 3
+    assert merger.accept(STREAM, 2, contiguous=True)
+    assert merger.accept(STREAM, 3, contiguous=True)
+    assert not merger.accept(STREAM, 3, contiguous=True)
+    assert merger.expired_gaps() == []
+    assert merger.gaps == 0
+
+
+def test_unfilled_gap_is_reported_once():
+    merger = FeedMerger(gap_timeout=0)
+    merger.accept(STREAM, 1, contiguous=True)
+    merger.accept(STREAM, 4, contiguous=True)
+    merger.accept(STREAM, 7, contiguous=True)
+    merger.accept(STREAM, 5, contiguous=True)
+    assert merger.expired_gaps() == [(STREAM, 2, 3), (STREAM, 6, 6)]
+    assert merger.expired_gaps() == []
+    assert merger.gaps == 2
+    assert not merger.accept(STREAM, 2, contiguous=True)  # too late
+
+
+def test_gap_wider_than_the_window_is_reported_right_away():
+    merger = FeedMerger(window=10, gap_timeout=60)
+    merger.accept(STREAM, 1, contiguous=True)
+    merger.accept(STREAM, 100, contiguous=True)
+    assert merger.expired_gaps() == [(STREAM, 2, 99)]
+
+
+def test_accept_key_window():
+    merger = FeedMerger(window=2)
+    stream = ('trade', 'XBT/USD')
+    assert merger.accept_key(stream, 'a')
+    assert not merger.accept_key(stream, 'a')
+    assert merger.accept_key(stream, 'b')
+    assert merger.accept_key(stream, 'c')  # 'a' leaves the window
+    assert merger.accept_key(stream, 'a')
+    assert merger.duplicates == 1
+
+
+def test_reset():
+    merger = FeedMerger(gap_timeout=0)
+    merger.accept(STREAM, 5, contiguous=True)
+    merger.accept(STREAM, 8, contiguous=True)
+    merger.reset(STREAM)
+    assert merger.accept(STREAM, 3, contiguous=True)
+    assert merger.expired_gaps() == []
@@ -0,0 +1,143 @@
+import numpy as np
+import pytest
+
+from fill_simulator import FILL_DTYPE, FillSimulator, SimulatedBroker
+from portfolio import Portfolio
+
+UPDATE_DTYPE = np.dtype([('time', np.int64), ('side', np.int8), ('price', np.float64),
+                         ('quantity', np.float64)])
+TRADE_DTYPE = np.dtype([('time', np.int64), ('price', np.float64), ('size', np.float64),
+                        ('side', np.int8)])
+
+# bids 99 x 3, 100 x 5 | asks 101 x 1, 102 x 2, 103 x 4
+BOOK = [(0, 1, 99.0, 3.0), (0, 1, 100.0, 5.0), (0, -1, 101.0, 1.0), (0, -1, 102.0, 2.0),
+        (0, -1, 103.0, 4.0)]
+
+
+def simulator(updates=(), trades=(), **kwargs):
+    return FillSimulator(np.array(BOOK + list(updates), dtype=UPDATE_DTYPE),
+                         np.array(list(trades), dtype=TRADE_DTYPE), **kwargs)
+
+
+def test_snapshot():
+    sim = simulator()
+    sim.advance(0)
+    assert sim.best_bid() == 100.0 and sim.best_ask() == 101.0
+
+
+def test_market_order_walks_the_book():
+    sim = simulator(taker_fee=0.01)
+    fills = sim.market_order(2.5, 1)
+    assert fills.dtype == FILL_DTYPE
+    assert fills['price'].tolist() == [101.0, 102.0]
+    assert fills['shares'].tolist() == [1.0, 1.5]
+    np.testing.assert_allclose(fills['fee'], [1.01, 1.53])
+    assert not fills['maker'].any()
+    # the depth taken is gone until the recorded data updates it
+    assert sim.best_ask() == 102.0 and sim.asks.get(102.0) == 0.5
+
+
+def test_market_order_partial_when_the_book_runs_out():
+    sim = simulator()
+    fills = sim.market_order(-10, 1)
+    assert fills['price'].tolist() == [100.0, 99.0]
+    assert fills['shares'].tolist() == [-5.0, -3.0]
+    assert sim.best_bid() is None
+
+
+def test_market_order_max_cost():
+    sim = simulator()
+    fills = sim.market_order(5, 1, max_cost=152.0)
+    assert fills['shares'].tolist() == [1.0, 0.5]
+    assert float(fills['price'] @ fills['shares']) == pytest.approx(152.0)
+
+
+def test_crossing_limit_order_takes_up_to_its_price_and_rests_the_rest():
+    sim = simulator()
+    order = sim.limit_order(4, 102.0, 1)
+    assert sim.fills['shares'].tolist() == [1.0, 2.0]
+    assert sim.remaining(order) == 1.0
+    assert sim.best_ask() == 103.0
+
+
+def test_queue_position():
+    # a buy resting at 100 behind the 5 displayed there fills once 5 traded at 100
+    trades = [(10, 100.0, 3.0, 1), (20, 100.0, 2.5, 1), (30, 100.0, 1.0, 1)]
+    sim = simulator(trades=trades)
+    order = sim.limit_order(1, 100.0, 1)
+    sim.advance(10)
+    assert len(sim.fills) == 0
+    sim.advance(20)
+    fills = sim.fills
+    assert fills['shares'].tolist() == [0.5] and fills['maker'].all()
+    assert fills['time'].tolist() == [20]
+    sim.advance(30)
+    assert sim.fills['shares'].tolist() == [0.5, 0.5]
+    assert sim.remaining(order) == 0.0
+
+
+def test_trades_on_the_other_side_dont_fill():
+    sim = simulator(trades=[(10, 100.0, 50.0, -1)])
+    order = sim.limit_order(1, 100.0, 1)
+    sim.advance(10)
+    assert len(sim.fills) == 0 and sim.remaining(order) == 1.0
+
+
+def test_trade_through_the_price_fills_outright():
+    sim = simulator(trades=[(10, 99.0, 0.6, 1)])
+    order = sim.limit_order(1, 100.0, 1)
+    sim.advance(10)
+    assert sim.fills['shares'].tolist() == [0.6]
+    assert sim.fills['price'].tolist() == [100.0]
+    assert sim.remaining(order) == pytest.approx(0.4)
+
+
+def test_level_shrinking_moves_the_order_up():
+    updates = [(5, 1, 100.0, 1.0)]  # the 5 ahead are cancelled down to 1
+    sim = simulator(updates, trades=[(10, 100.0, 1.5, 1)])
+    sim.limit_order(1, 100.0, 1)
+    sim.advance(5)
+    sim.advance(10)
+    assert sim.fills['shares'].tolist() == [0.5]
+
+
+def test_prints_are_shared_between_resting_orders():
+    sim = simulator(trades=[(10, 98.0, 1.5, 1)])
+    first = sim.limit_order(1, 100.0, 1)
+    second = sim.limit_order(1, 99.0, 2)
+    sim.advance(10)
+    # the most aggressive order fills first, the next one gets what's left
+    assert sim.remaining(first) == 0.0
+    assert sim.remaining(second) == pytest.approx(0.5)
+    assert sim.fills['shares'].sum() == pytest.approx(1.5)
+
+
+def test_cancel():
+    sim = simulator(trades=[(10, 99.0, 5.0, 1)])
+    order = sim.limit_order(2, 100.0, 1)
+    assert sim.cancel(order, 5) == 2.0
+    sim.advance(10)
+    assert len(sim.fills) == 0 and sim.remaining(order) == 0.0
+
+
+def test_latency():
+    sim = simulator([(1_000, -1, 101.0, 0.0)], latency=1e-6)
+    fills = sim.market_order(1, 0)  # arrives at 1000 ns, after the 101 ask is gone
+    assert fills['price'].tolist() == [102.0]
+    assert fills['time'].tolist() == [1_000]
+
+
+def test_broker_rejects_the_rest_of_a_cancelled_order():
+    trades = [(10, 99.0, 1.0, 1), (20, 99.0, 0.5, 1)]
+    portfolio = Portfolio(starting_balance=1000.0, symbols=['AAA'])
+    broker = SimulatedBroker(portfolio, {'AAA': simulator(trades=trades)})
+    broker.place_order('AAA', 2, 1, limit_price=100.0)
+    portfolio.balance = 90.0  # spent elsewhere while the order rests
+    sim = broker.simulators['AAA']
+    sim.advance(10)
+    sim.advance(20)
+    # both fills are booked in one batch, the second (0.5 x 100) would fit the cash
+    assert len(broker.advance(20)['AAA']) == 0
+    assert broker.rejected[0]['shares'].tolist() == [1.0, 0.5]
+    assert portfolio.balance == 90.0 and portfolio.get_position('AAA') == 0
+    assert sim.remaining(0) == 0.0
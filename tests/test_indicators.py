@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from indicators import ATR, EMA, SMA, IndicatorSet, RollingMax, RollingMin, RollingStd, ZScore
+
+N_BARS, N_SYMBOLS = 300, 4
+
+
+@pytest.fixture
+def close():
+    rng = np.random.default_rng(0)
+    values = 100 + np.cumsum(rng.normal(size=(N_BARS, N_SYMBOLS)), axis=0)
+    values[rng.random(values.shape) < 0.1] = np.nan  # symbols without a bar
+    values[:20, 3] = np.nan  # a late listing
+    return pd.DataFrame(values)
+
+
+def run(indicator, frame, field='close'):
+    return np.array([indicator.update({field: row}).copy() for row in frame.to_numpy()])
+
+
+@pytest.mark.parametrize('window', [1, 5, 20])
+def test_rolling_against_pandas(close, window):
+    rolling = close.rolling(window)
+    np.testing.assert_allclose(run(SMA(window), close), rolling.mean(), rtol=1e-9)
+    np.testing.assert_allclose(run(RollingMax(window), close), rolling.max())
+    np.testing.assert_allclose(run(RollingMin(window), close), rolling.min())
+    if window > 1:
+        np.testing.assert_allclose(run(RollingStd(window), close), rolling.std(), rtol=1e-6)
+        zscore = (close - rolling.mean()) / rolling.std()
+        np.testing.assert_allclose(run(ZScore(window), close), zscore, rtol=1e-6, atol=1e-9)
+
+
+def test_min_periods_against_pandas(close):
+    rolling = close.rolling(10, min_periods=3)
+    np.testing.assert_allclose(run(SMA(10, min_periods=3), close), rolling.mean(), rtol=1e-9)
+    np.testing.assert_allclose(run(RollingMax(10, min_periods=3), close), rolling.max())
+    np.testing.assert_allclose(run(RollingStd(10, min_periods=3), close), rolling.std(), rtol=1e-6)
+
+
+def test_ema_against_pandas(close):
+    expected = close.ewm(span=10, adjust=False, ignore_na=True).mean()
+    np.testing.assert_allclose(run(EMA(span=10), close), expected, rtol=1e-9)
+    expected = close.ewm(alpha=0.3, adjust=False, ignore_na=True).mean()
+    np.testing.assert_allclose(run(EMA(alpha=0.3), close), expected, rtol=1e-9)
+    with pytest.raises(ValueError):
+        EMA()
+
+
+def test_atr_against_pandas():
+    rng = np.random.default_rng(1)
+    close = pd.Series(100 + np.cumsum(rng.normal(size=100)))
+    high = close + rng.random(100)
+    low = close - rng.random(100)
+    window = 14
+    prev = close.shift()
+    true_range = pd.concat([high - low, (high - prev).abs(), (low - prev).abs()], axis=1).max(axis=1)
+    # Wilder: the mean of the first `window` true ranges, then an ewm of alpha 1/window
+    seeded = true_range.copy()
+    seeded[:window - 1] = np.nan
+    seeded[window - 1] = true_range[:window].mean()
+    expected = seeded.ewm(alpha=1 / window, adjust=False, ignore_na=True).mean()
+
+    atr = ATR(window)
+    values = [atr.update({'high': np.array([h]), 'low': np.array([l]), 'close': np.array([c])})[0]
+              for h, l, c in zip(high, low, close)]
+    np.testing.assert_allclose(values, expected, rtol=1e-9)
+
+
+def test_indicator_set_on_bars():
+    indicators = IndicatorSet(['AAA', 'BBB'])
+    indicators.add('sma', SMA(2))
+    # symbol, resolution, start, open, high, low, close, volume, vwap
+    indicators.on_bars([('AAA', 60, 0, 1, 1, 1, 1.0, 1, 1), ('BBB', 60, 0, 1, 1, 1, 10.0, 1, 1),
+                        ('AAA', 5, 0, 1, 1, 1, 99.0, 1, 1)])
+    indicators.on_bars([('AAA', 60, 60, 1, 1, 1, 3.0, 1, 1)])  # closes the row of start 0
+    indicators.on_bars([('BBB', 60, 0, 1, 1, 1, 50.0, 1, 1)])  # too late
+    indicators.flush()
+    assert indicators.value('sma', 'AAA') == 2.0
+    assert np.isnan(indicators.value('sma', 'BBB'))
+    assert indicators.late_bars == 1
+
+
+def test_live_bars_of_an_illiquid_symbol():
+    from bars import BarBuilder
+
+    indicators = IndicatorSet(['BTC-USD', 'ETH-USD'])
+    indicators.add('sma', SMA(4, min_periods=1))
+    builder = BarBuilder(resolutions=(60,), lateness=2.0, sinks=[indicators.on_bars])
+    second = 10**9
+    eth = {0: 10.0, 70: 20.0, 200: 30.0}  # nothing in minute 2
+    for t in range(0, 260, 10):
+        builder.on_trade('BTC-USD', t * second, 1.0 + t // 60, 1.0)
+        if t in eth:
+            builder.on_trade('ETH-USD', t * second + 1, eth[t], 1.0)
+    builder.advance(400 * second)
+    indicators.flush()
+    # ETH-USD's minute 1 bar is used although its next trade came two minutes later
+    assert indicators.late_bars == 0
+    np.testing.assert_allclose(indicators['sma'], [(2 + 3 + 4 + 5) / 4, (20 + 30) / 2])
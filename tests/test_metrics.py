@@ -0,0 +1,66 @@
+from queue import Queue
+
+import numpy as np
+import pytest
+
+from coinbase import CoinbaseWebSocket
+from metrics import COUNTERS, STAGES, LatencyHistogram, SocketMetrics, parse_exchange_time
+
+
+def test_parse_exchange_time():
+    assert parse_exchange_time('1970-01-01T00:00:01.000002Z') == 1_000_002_000
+    assert parse_exchange_time('2024-01-01T00:00:00') == 1_704_067_200 * 10**9
+
+
+def test_histogram_percentiles_within_relative_error():
+    rng = np.random.default_rng(0)
+    values = rng.lognormal(10, 2, 100_000).astype(np.int64)
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.record(value)
+    result = histogram.percentiles((0.5, 0.99, 0.999))
+    for q, value in result.items():
+        exact = np.quantile(values, q)
+        assert value <= exact * 1.001 and value >= exact * (1 - 2 ** -4) - 1
+    assert histogram.max == values.max() and histogram.count == len(values)
+
+
+def test_histogram_small_values_and_reset():
+    histogram = LatencyHistogram()
+    for value in (-5, 0, 3, 31):
+        histogram.record(value)
+    assert histogram.percentiles([0.25, 0.5, 1.0]) == {0.25: 0.0, 0.5: 0.0, 1.0: 31.0}
+    histogram.reset()
+    assert histogram.count == 0 and np.isnan(histogram.percentiles([0.5])[0.5])
+
+
+def test_snapshot_counters_and_stages():
+    metrics = SocketMetrics('coinbase')
+    recv_ns = metrics.received(100)
+    metrics.received(50)
+    metrics.dropped(3)
+    metrics.reconnected()
+    metrics.enqueued('level1', [(recv_ns - 2_000_000, recv_ns, recv_ns + 1_000), (None, recv_ns, recv_ns)])
+    snapshot = metrics.snapshot(reset=True)
+    assert snapshot['counters'] == {'messages': 2, 'bytes': 150, 'drops': 3, 'conflated': 0,
+                                    'reconnects': 1}
+    stages = snapshot['channels']['level1']
+    assert set(stages) == set(STAGES)
+    assert stages['decode']['count'] == 2 and stages['network']['count'] == 1
+    assert stages['network']['p50'] == pytest.approx(2000, rel=0.07)
+    assert '[coinbase] messages=2' in SocketMetrics.format(snapshot)
+    assert metrics.snapshot()['counters'] == dict.fromkeys(COUNTERS, 0)
+    assert metrics.snapshot()['channels']['level1']['decode']['count'] == 0
+
+
+def test_web_socket_times_every_published_record():
+    ws = CoinbaseWebSocket(Queue(), Queue(), ['BTC-USD'], batch_size=2)
+    message = ('{"type": "ticker", "product_id": "BTC-USD", "price": "1", "sequence": 1, '
+               '"time": "2024-01-01T00:00:00Z"}')
+    for _ in range(3):
+        ws._on_message(message)
+    snapshot = ws.metrics.snapshot()
+    assert snapshot['counters']['messages'] == 3
+    assert snapshot['counters']['bytes'] == 3 * len(message)
+    # two records went out in one batch, the third is still pending
+    assert snapshot['channels']['level1']['end_to_end']['count'] == 2
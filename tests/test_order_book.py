@@ -0,0 +1,69 @@
+import random
+
+from order_book import OrderBook, OrderBookSide
+
+
+def test_snapshot_and_best():
+    book = OrderBook('BTC-USD')
+    book.apply_snapshot(bids=[['100.0', '1.5'], ['99.5', '2']], asks=[['101', '3', 1], ['102', '4', 2]])
+    assert book.best_bid() == (100.0, 1.5)
+    assert book.best_ask() == (101.0, 3.0)
+    assert book.depth(5) == ([(100.0, 1.5), (99.5, 2.0)], [(101.0, 3.0), (102.0, 4.0)])
+
+
+def test_snapshot_replaces_the_book():
+    book = OrderBook('BTC-USD')
+    book.apply_snapshot([['100', '1']], [['101', '1']])
+    book.apply_snapshot([['90', '1']], [['91', '1']])
+    assert book.depth(5) == ([(90.0, 1.0)], [(91.0, 1.0)])
+
+
+def test_changes():
+    book = OrderBook('BTC-USD')
+    book.apply_snapshot([['100', '1'], ['99', '1']], [['101', '1']])
+    book.apply_changes([['buy', '100.5', '2'], ['sell', '101', '0'], ['sell', '103', '5'],
+                        ['buy', '99', '3']])
+    assert book.best_bid() == (100.5, 2.0)
+    assert book.best_ask() == (103.0, 5.0)
+    assert book.depth(3)[0] == [(100.5, 2.0), (100.0, 1.0), (99.0, 3.0)]
+    book.apply_change('buy', 100.5, 0)
+    book.apply_change('buy', 100.0, 0)
+    assert book.best_bid() == (99.0, 3.0)
+
+
+def test_removing_an_unknown_level_is_a_no_op():
+    side = OrderBookSide(is_bid=False)
+    side.update(10.0, 1.0)
+    side.update(9.0, 0)
+    assert len(side) == 1 and side.best() == (10.0, 1.0)
+
+
+def test_empty_side():
+    side = OrderBookSide(is_bid=True)
+    assert side.best() is None
+    assert side.top(3) == []
+    side.update(1.0, 1.0)
+    side.update(1.0, 0)
+    assert side.best() is None and side.top(3) == []
+
+
+def test_matches_a_sorted_dict_under_random_updates():
+    rng = random.Random(0)
+    for is_bid in (True, False):
+        side = OrderBookSide(is_bid)
+        levels = {}
+        # few prices, so levels are removed and re-added and the heap gets rebuilt
+        for _ in range(20_000):
+            price = rng.randrange(500) / 4
+            size = rng.choice([0, 0, rng.random() * 10])
+            side.update(price, size)
+            if size:
+                levels[price] = size
+            else:
+                levels.pop(price, None)
+            if rng.random() < 0.05:
+                expected = sorted(levels.items(), reverse=is_bid)
+                assert side.best() == (expected[0] if expected else None)
+                assert side.top(10) == expected[:10]
+        assert len(side) == len(levels)
+        assert side.top(len(levels) + 1) == sorted(levels.items(), reverse=is_bid)
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from event_log import EventLog
+from plotting import downsample, drawdown, lttb, minmax, plot_backtest
+from portfolio import TRANSACTION_DTYPE
+
+
+@pytest.fixture
+def curve():
+    rng = np.random.default_rng(0)
+    y = 1000 + np.cumsum(rng.normal(size=100_000))
+    return np.arange(len(y), dtype=np.float64), y
+
+
+def test_lttb_keeps_the_endpoints(curve):
+    x, y = curve
+    picked = lttb(x, y, 500)
+    assert len(picked) == 500
+    assert picked[0] == 0 and picked[-1] == len(x) - 1
+    assert (np.diff(picked) > 0).all()
+    assert lttb(x[:10], y[:10], 500).tolist() == list(range(10))
+
+
+def test_minmax_keeps_endpoints_and_extremes(curve):
+    x, y = curve
+    picked = minmax(y, 100)
+    assert picked[0] == 0 and picked[-1] == len(y) - 1
+    assert len(picked) <= 2 * 100 + 2 and (np.diff(picked) > 0).all()
+    assert y.argmin() in picked and y.argmax() in picked
+    # the max drawdown survives downsampling exactly
+    drawdowns = drawdown(y)
+    kept = downsample(x, drawdowns, 200, 'minmax')
+    assert drawdowns[kept].min() == drawdowns.min()
+
+
+def test_downsample_skips_nans_and_checks_the_method():
+    y = np.array([np.nan, 1.0, np.nan, 3.0])
+    assert downsample(np.arange(4), y, 10).tolist() == [1, 3]
+    with pytest.raises(ValueError):
+        downsample(np.arange(4), y, 10, 'mean')
+
+
+def test_event_log_grows_and_interns_messages():
+    log = EventLog(capacity=2)
+    for i in range(5):
+        log.append('buy' if i % 2 else 'sell', np.datetime64('2017-01-03') + i, symbol=i % 2, value=i)
+    log.append('note', None)
+    assert len(log) == 6 and log.messages == ['sell', 'buy', 'note']
+    frame = log.to_frame(np.array(['AAA', 'BBB']))
+    assert frame['message'].tolist() == ['sell', 'buy', 'sell', 'buy', 'sell', 'note']
+    assert frame['symbol'].iloc[-2] == 'AAA' and pd.isna(frame['symbol'].iloc[-1])
+    log.clear()
+    assert len(log) == 0 and len(log.to_frame()) == 0
+
+
+def test_plot_backtest_writes_only_when_asked(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    dates = np.arange('2000-01-01', '2020-01-01', dtype='datetime64[D]')
+    equity = 1000 + np.cumsum(np.random.default_rng(1).normal(size=len(dates)))
+    transactions = np.zeros(3, dtype=TRANSACTION_DTYPE)
+    transactions['time'] = dates[[10, 20, 30]]
+    transactions['shares'] = [1, -1, 1]
+    log = EventLog()
+    log.append('buy', dates[10], 0, 1.0)
+    fig = plot_backtest(dates, equity, benchmark=1000.0, transactions=transactions, log=log,
+                        symbols=['AAA'], max_points=500, title='test')
+    assert len(fig.axes) == 3
+    assert len(fig.axes[0].lines[0].get_xdata()) == 500
+    assert list(tmp_path.iterdir()) == []
+    plot_backtest(dates, equity, path=str(tmp_path / 'out.png'))
+    assert (tmp_path / 'out.png').stat().st_size > 0
+
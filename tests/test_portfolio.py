@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from portfolio import Portfolio
+
+
+def test_place_order_and_ledger():
+    portfolio = Portfolio(starting_balance=1000.0, transaction_cost=0.01, symbols=['AAA', 'BBB'])
+    assert portfolio.place_order('AAA', 10.0, 50, '2017-01-03')
+    assert portfolio.balance == pytest.approx(1000 - 500 - 5)
+    assert not portfolio.place_order('BBB', 10.0, 50)  # not enough cash
+    assert not portfolio.place_order('AAA', 10.0, -60)  # not enough shares
+    assert portfolio.place_order('AAA', 12.0, -20, fee=0.5)
+    assert portfolio.get_holdings() == {'AAA': 30}
+    ledger = portfolio.transactions
+    assert ledger['shares'].tolist() == [50, -20]
+    assert ledger['fee'].tolist() == [5.0, 0.5]
+    assert ledger['time'][0] == np.datetime64('2017-01-03', 'ns') and np.isnat(ledger['time'][1])
+    with pytest.raises(ValueError):
+        ledger['shares'][0] = 1
+
+
+def test_ledger_grows():
+    portfolio = Portfolio(starting_balance=1e6)
+    for i in range(200):
+        assert portfolio.place_order(f'S{i % 3}', 1.0, 1)
+    assert len(portfolio.transactions) == 200
+    assert portfolio.symbols == ['S0', 'S1', 'S2']
+    assert portfolio.transactions['symbol'].tolist() == [i % 3 for i in range(200)]
+    assert portfolio.positions.tolist() == [67, 67, 66]
+
+
+def test_place_orders_sells_before_buys():
+    portfolio = Portfolio(starting_balance=100.0, symbols=['AAA', 'BBB', 'CCC'])
+    portfolio.place_order('AAA', 10.0, 5)
+    # 50 cash + 50 from the sale covers the first buy only
+    filled = portfolio.place_orders(['BBB', 'AAA', 'CCC'], [20.0, 10.0, 10.0], [5, -5, 1])
+    assert filled.tolist() == [True, True, False]
+    assert portfolio.balance == 0.0
+    assert portfolio.get_holdings() == {'BBB': 5}
+    with pytest.raises(ValueError):
+        portfolio.place_orders(['AAA', 'AAA'], [1.0, 1.0], [1, 1])
+
+
+def test_mark_to_market():
+    portfolio = Portfolio(starting_balance=100.0, symbols=['AAA', 'BBB'])
+    portfolio.place_orders(['AAA', 'BBB'], [10.0, 5.0], [2, 4])
+    assert portfolio.mark_to_market(np.array([11.0, np.nan, 99.0])) == pytest.approx(60 + 22)
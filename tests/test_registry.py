@@ -0,0 +1,72 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import registry
+
+WEBSOCKETS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                              'Data Acquisition', '1---Websockets')
+
+PLUGIN = '''
+class DummyWebSocket:
+    pass
+'''
+
+
+@pytest.fixture
+def plugin(tmp_path, monkeypatch):
+    (tmp_path / 'dummy_exchange.py').write_text(PLUGIN)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(registry, '_PLUGINS', dict(registry._PLUGINS))
+    monkeypatch.setattr(registry, '_loaded', {})
+    monkeypatch.delitem(sys.modules, 'dummy_exchange', raising=False)
+    yield 'dummy'
+    sys.modules.pop('dummy_exchange', None)
+
+
+def test_modules_are_imported_on_first_load(plugin):
+    registry.register(plugin, 'dummy_exchange:DummyWebSocket')
+    assert plugin in registry.names()
+    assert registry.installed(plugin) and registry.implemented(plugin)
+    assert 'dummy_exchange' not in sys.modules
+    cls = registry.load(plugin)
+    assert cls.__name__ == 'DummyWebSocket'
+    assert registry.load(plugin) is cls
+
+
+def test_stubs(plugin):
+    registry.register(plugin, 'dummy_exchange:DummyWebSocket', implemented=False)
+    assert not registry.implemented(plugin)
+    registry.register(plugin, 'dummy_exchange:MissingWebSocket')
+    assert registry.load(plugin) is None
+    registry.register(plugin, 'not_installed_anywhere:WebSocket')
+    assert not registry.installed(plugin) and not registry.implemented(plugin)
+
+
+def test_errors(plugin):
+    with pytest.raises(ValueError):
+        registry.register(plugin, 'dummy_exchange')
+    with pytest.raises(KeyError):
+        registry.load('nasdaq')
+    with pytest.raises(KeyError):
+        registry.implemented('nasdaq')
+
+
+def test_supervisor_imports_no_exchange_code():
+    # a fresh interpreter, sys.modules of this one has seen everything
+    code = '''
+import sys
+sys.path.insert(0, sys.argv[1])
+import main_script
+supervisor = main_script.Supervisor({'coinbase': ['BTC-USD'], 'kraken': ['XBT/USD']}, pin_cores=False)
+assert [worker.exchange for worker in supervisor.workers] == ['coinbase']
+main_script.main(['--list'])
+print(sorted(m for m in ('coinbase', 'kraken', 'web_socket', 'websockets', 'numpy') if m in sys.modules))
+'''
+    result = subprocess.run([sys.executable, '-c', code, WEBSOCKETS_DIR], capture_output=True, text=True,
+                            check=True)
+    lines = result.stdout.splitlines()
+    assert 'coinbase   implemented' in lines and 'kraken     not implemented' in lines
+    assert lines[-1] == '[]'
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from replay import read_trade_chunks, replay
+from tradebuffer import TRADE_DTYPE
+
+
+def minute(first_id, times):
+    rows = np.zeros(len(times), dtype=TRADE_DTYPE)
+    rows['trade_id'] = np.arange(first_id, first_id + len(times))
+    rows['time'] = times
+    rows['price'] = 100.0 + rows['trade_id']
+    rows['size'] = 1.0
+    rows['side'] = 1
+    return rows
+
+
+def write_minute(path, rows):
+    if path.suffix == '.npy':
+        np.save(path, rows)
+        return
+    with open(path, 'w') as f:
+        f.write(','.join(TRADE_DTYPE.names) + '\n')
+        for row in rows.tolist():
+            f.write(','.join(map(repr, row)) + '\n')
+
+
+@pytest.fixture
+def basepath(tmp_path):
+    (tmp_path / 'BTC-USD').mkdir()
+    (tmp_path / 'ETH-USD').mkdir()
+    # BTC-USD has a trade recorded slightly out of order
+    write_minute(tmp_path / 'BTC-USD' / 'BTC-USD_UATrades_2024-01-01 00:00:00.csv',
+                 minute(0, [10, 20, 40, 30, 50]))
+    write_minute(tmp_path / 'BTC-USD' / 'BTC-USD_UATrades_2024-01-01 00:01:00.npy',
+                 minute(5, [60, 70, 80]))
+    write_minute(tmp_path / 'ETH-USD' / 'ETH-USD_UATrades_2024-01-01 00:00:00.npy',
+                 minute(100, [15, 45, 75]))
+    write_minute(tmp_path / 'ETH-USD' / 'ETH-USD_UATrades_2024-01-01 00:01:00.csv',
+                 minute(103, []))
+    return f'{tmp_path}/'
+
+
+@pytest.mark.parametrize('chunk_rows', [2, 3, 65536])
+def test_replay_merges_in_time_order(basepath, chunk_rows):
+    trades = list(replay(basepath, ['BTC-USD', 'ETH-USD'], chunk_rows=chunk_rows))
+    assert [trade[0] for trade in trades] == [10, 15, 20, 30, 40, 45, 50, 60, 70, 75, 80]
+    assert trades[0] == (10, 'BTC-USD', 0, 100.0, 1.0, 1)
+    assert trades[1][1:3] == ('ETH-USD', 100)
+
+
+def test_replay_bounds(basepath):
+    trades = list(replay(basepath, ['BTC-USD', 'ETH-USD'], start=30, end=70, chunk_rows=2))
+    assert [trade[0] for trade in trades] == [30, 40, 45, 50, 60]
+
+
+def test_chunks_are_bounded(tmp_path):
+    path = tmp_path / 'trades.csv'
+    write_minute(path, minute(0, list(range(10))))
+    assert [len(chunk) for chunk in read_trade_chunks(str(path), 4)] == [4, 4, 2]
+    path = tmp_path / 'trades.npy'
+    write_minute(path, minute(0, list(range(10))))
+    chunks = list(read_trade_chunks(str(path), 4))
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+    assert np.concatenate(chunks)['trade_id'].tolist() == list(range(10))
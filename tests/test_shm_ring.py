@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from shm_ring import LEVEL_1_DTYPE, SharedRingBuffer, ring_dtypes
+from web_socket import LEVEL_1_RECORD, LEVEL_2_RECORD
+
+DTYPE = np.dtype([('seq', np.int64), ('price', np.float64)])
+
+
+@pytest.fixture
+def ring():
+    ring = SharedRingBuffer(DTYPE, capacity=8)
+    yield ring
+    ring.close()
+    ring.unlink()
+
+
+def batch(first, n):
+    return [(seq, float(seq)) for seq in range(first, first + n)]
+
+
+def test_reads_in_order(ring):
+    reader = ring.reader()
+    ring.put(batch(0, 3))
+    ring.put(batch(3, 2))
+    records, lost = reader.read()
+    assert records['seq'].tolist() == [0, 1, 2, 3, 4] and lost == 0
+    records, lost = reader.read()
+    assert len(records) == 0 and lost == 0
+
+
+def test_reader_starts_at_the_newest_record(ring):
+    ring.put(batch(0, 3))
+    assert len(ring.reader().read()[0]) == 0
+    assert ring.reader(from_oldest=True).read()[0]['seq'].tolist() == [0, 1, 2]
+
+
+def test_overrun_counts_lost_records(ring):
+    reader = ring.reader()
+    ring.put(batch(0, 5))
+    ring.put(batch(5, 15))
+    records, lost = reader.read()
+    # only the last `capacity` records are still there
+    assert records['seq'].tolist() == list(range(12, 20))
+    assert lost == 12
+    ring.put(batch(20, 10))
+    records, lost = reader.read()
+    assert records['seq'].tolist() == list(range(22, 30))
+    assert lost == 2
+    assert reader.lost == 14
+
+
+def test_batch_larger_than_the_ring(ring):
+    reader = ring.reader()
+    ring.put(batch(0, 20))
+    assert ring.write_seq == 20
+    records, lost = reader.read()
+    assert records['seq'].tolist() == list(range(12, 20)) and lost == 12
+
+
+def test_readers_are_independent(ring):
+    slow, fast = ring.reader(), ring.reader()
+    ring.put(batch(0, 6))
+    assert len(fast.read()[0]) == 6
+    ring.put(batch(6, 6))
+    assert fast.read()[0]['seq'].tolist() == list(range(6, 12))
+    records, lost = slow.read()
+    assert records['seq'].tolist() == list(range(4, 12)) and lost == 4
+    assert fast.lost == 0
+
+
+def test_max_records(ring):
+    reader = ring.reader()
+    ring.put(batch(0, 6))
+    assert reader.read(max_records=4)[0]['seq'].tolist() == [0, 1, 2, 3]
+    assert reader.read(max_records=4)[0]['seq'].tolist() == [4, 5]
+
+
+def test_attach_by_name(ring):
+    other = SharedRingBuffer(DTYPE, capacity=8, name=ring.name, create=False)
+    try:
+        reader = other.reader()
+        ring.put(batch(0, 2))
+        assert reader.read()[0]['seq'].tolist() == [0, 1]
+    finally:
+        other.close()
+
+
+def test_record_arrays_must_match_the_ring():
+    level_1, level_2 = ring_dtypes(compact=True)
+    assert (level_1, level_2) == (LEVEL_1_RECORD, LEVEL_2_RECORD)
+    ring = SharedRingBuffer(ring_dtypes()[0], capacity=4)
+    try:
+        assert ring.dtype == LEVEL_1_DTYPE
+        with pytest.raises(ValueError):
+            ring.put(np.zeros(2, dtype=LEVEL_1_RECORD))
+        ring.put([('2024-01-01T00:00:00.000000', 'coinbase', 'BTC-USD', 1.5)])
+        assert ring.reader(from_oldest=True).read()[0]['price'].tolist() == [1.5]
+    finally:
+        ring.close()
+        ring.unlink()
@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+
+from data_store import MarketData
+from indicators import SMA
+from strategy import Strategy
+
+# weekdays of January 2017, the 2nd and the 16th are NYSE holidays without data
+DATES = np.array([day for day in np.arange('2017-01-03', '2017-02-01', dtype='datetime64[D]')
+                  if np.is_busday(day) and day != np.datetime64('2017-01-16')])
+
+
+def market_data():
+    n = len(DATES)
+    close = np.column_stack([np.arange(n) + 10.0, np.full(n, 20.0)])
+    close[5, 1] = np.nan  # BBB didn't trade that day
+    prices = {'open': close - 1, 'high': close + 1, 'low': close - 2, 'close': close,
+              'volume': np.full_like(close, 100.0)}
+    return MarketData(DATES, np.array(['AAA', 'BBB']), prices)
+
+
+class Recorder(Strategy):
+    def __init__(self, **kwargs):
+        super().__init__(start_balance=1000.0, **kwargs)
+        self.calls = []
+        self.fills = []
+        self.add_indicator('sma', SMA(2))
+
+    def on_market_open(self):
+        if self.current_date == DATES[0]:
+            self.fills.append(self.place_order('AAA', 10))  # at the open, 9
+        self.calls.append(('open', self.current_date))
+
+    def on_market_close(self):
+        if self.current_date == DATES[5]:
+            self.fills.append(self.place_order('BBB', 1))  # no close that day
+            self.fills.append(self.place_order('AAA', -5))  # at the close, 15
+        self.calls.append(('close', self.current_date))
+
+    def run_daily(self):
+        self.calls.append(('sma', self.indicator('sma', 'AAA')))
+
+    def run_weekly(self):
+        self.calls.append(('weekly', self.current_date))
+
+    def run_monthly(self):
+        self.calls.append(('monthly', self.current_date))
+
+
+@pytest.fixture
+def strategy():
+    strategy = Recorder(market_data=market_data())
+    strategy.back_testing('2017-01-01', '2017-01-31', visualize=False)
+    return strategy
+
+
+def test_every_session_with_data_is_simulated_in_order(strategy):
+    opens = [date for event, date in strategy.calls if event == 'open']
+    closes = [date for event, date in strategy.calls if event == 'close']
+    assert opens == closes == DATES.tolist()
+    assert strategy.equity_dates.tolist() == DATES.tolist()
+
+
+def test_weekly_and_monthly_callbacks(strategy):
+    weekly = [date for event, date in strategy.calls if event == 'weekly']
+    monthly = [date for event, date in strategy.calls if event == 'monthly']
+    # Mondays the 2nd and the 16th are holidays, their weeks run on the next session
+    assert [date.day for date in weekly] == [3, 9, 17, 23, 30]
+    assert [date.day for date in monthly] == [3]
+
+
+def test_orders_fill_at_the_open_or_close_of_the_day(strategy):
+    assert strategy.fills == [True, False, True]
+    assert strategy.portfolio.transactions['price'].tolist() == [9.0, 15.0]
+    assert strategy.portfolio.get_holdings() == {'AAA': 5}
+    assert strategy.equity[0] == 1000 - 90 + 10 * 10
+    assert strategy.equity[-1] == 1000 - 90 + 75 + 5 * (len(DATES) + 9)
+
+
+def test_indicators_see_the_previous_close(strategy):
+    sma = [value for event, value in strategy.calls if event == 'sma']
+    assert np.isnan(sma[:2]).all()
+    assert sma[2:4] == [10.5, 11.5]
+
+
+def test_data_frame_skips_missing_prices(strategy):
+    data = strategy.data
+    assert len(data) == 2 * len(DATES) - 1
+    assert set(data.columns) == {'date', 'open', 'high', 'low', 'close', 'volume', 'Name'}
+
+
+def test_date_helpers_outside_a_backtest():
+    strategy = Recorder(market_data=market_data())
+    assert not strategy.is_trading_date(np.datetime64('2017-01-16').item())
+    assert strategy.next_nearest_trading_date(np.datetime64('2017-01-14').item()).day == 17
+
+
+def test_visualize_needs_a_backtest(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    strategy = Recorder(market_data=market_data())
+    with pytest.raises(RuntimeError):
+        strategy.visualize()
+    strategy.back_testing('2017-01-01', '2017-01-31', visualize=True)
+    assert strategy.figure is not None
+    assert list(tmp_path.iterdir()) == []  # nothing written without a path
@@ -0,0 +1,94 @@
+from queue import Queue
+
+import pytest
+
+import main_script
+
+
+class FakeProcess:
+    def __init__(self, name):
+        self.name = name
+        self.alive = True
+        self.terminated = False
+
+    def is_alive(self):
+        return self.alive
+
+    def terminate(self):
+        self.terminated = True
+        self.alive = False
+
+    def join(self, timeout=None):
+        pass
+
+
+@pytest.fixture
+def supervisor(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(main_script.time, 'time', lambda: clock[0])
+    supervisor = main_script.Supervisor({'coinbase': [f'C{i}' for i in range(5)]}, Queue(), Queue(),
+                                        coins_per_connection=2, heartbeat_timeout=30.0,
+                                        pin_cores=False, max_backoff=60.0)
+    started = []
+
+    def start(worker):
+        worker.started = clock[0]
+        supervisor.heartbeats[worker.slot] = clock[0]
+        worker.process = FakeProcess(f'{worker.exchange}-{worker.slot}')
+        started.append(worker.slot)
+    monkeypatch.setattr(supervisor, '_start', start)
+    supervisor.clock, supervisor.started = clock, started
+    supervisor.start()
+    return supervisor
+
+
+def test_coins_are_sharded_over_workers(supervisor):
+    assert [worker.coins for worker in supervisor.workers] == [['C0', 'C1'], ['C2', 'C3'], ['C4']]
+    assert supervisor.started == [0, 1, 2]
+
+
+def test_only_the_dead_worker_is_restarted_with_backoff(supervisor):
+    workers = supervisor.workers
+    supervisor.clock[0] += 10
+    for worker in workers:
+        supervisor.heartbeats[worker.slot] = supervisor.clock[0]
+    workers[1].process.alive = False
+    supervisor.check()
+    assert supervisor.started[3:] == [1] and workers[1].restarts == 1
+
+    # it dies again right away: restart #1 waits 2 seconds, restart #2 then 4
+    workers[1].process.alive = False
+    supervisor.check()
+    assert supervisor.started[3:] == [1]
+    supervisor.clock[0] += 2
+    supervisor.check()
+    assert supervisor.started[3:] == [1, 1] and workers[1].restarts == 2
+    workers[1].process.alive = False
+    supervisor.clock[0] += 3
+    supervisor.check()
+    assert supervisor.started[3:] == [1, 1]
+    supervisor.clock[0] += 1
+    supervisor.check()
+    assert supervisor.started[3:] == [1, 1, 1] and workers[1].restarts == 3
+
+def test_stale_heartbeat_is_terminated_and_restarted(supervisor):
+    workers = supervisor.workers
+    supervisor.clock[0] += 31
+    for worker in workers[1:]:
+        supervisor.heartbeats[worker.slot] = supervisor.clock[0]
+    hung = workers[0].process
+    supervisor.check()
+    assert hung.terminated
+    assert supervisor.started[3:] == [0] and workers[0].process is not hung
+
+
+def test_restart_count_resets_once_healthy(supervisor):
+    worker = supervisor.workers[2]
+    worker.process.alive = False
+    supervisor.check()
+    assert worker.restarts == 1
+    supervisor.clock[0] += 61
+    for other in supervisor.workers:
+        supervisor.heartbeats[other.slot] = supervisor.clock[0]
+    supervisor.check()
+    assert worker.restarts == 0
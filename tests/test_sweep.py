@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from data_store import MarketData
+from strategy import Strategy
+from sweep import SharedMarketData, parameter_grid, performance_metrics, run_sweep
+
+DATES = np.arange('2017-01-02', '2017-03-01', dtype='datetime64[D]')
+DATES = DATES[np.is_busday(DATES)]
+
+
+def market_data():
+    close = np.column_stack([np.linspace(10, 20, len(DATES)), np.linspace(20, 10, len(DATES))])
+    prices = {field: close for field in ('open', 'high', 'low', 'close', 'volume')}
+    return MarketData(DATES, np.array(['AAA', 'BBB']), prices)
+
+
+class BuyOnce(Strategy):
+    # module level, so the pool can pickle it
+    def __init__(self, stock='AAA', shares=10, **kwargs):
+        super().__init__(start_balance=1000.0, **kwargs)
+        self.stock = stock
+        self.shares = shares
+
+    def on_market_open(self):
+        if not len(self.portfolio.transactions):
+            self.place_order(self.stock, self.shares)
+
+    def on_market_close(self):
+        pass
+
+    def run_daily(self):
+        pass
+
+    def run_weekly(self):
+        pass
+
+    def run_monthly(self):
+        pass
+
+
+def serial(params, window, data):
+    strategy = BuyOnce(market_data=data, **params)
+    strategy.back_testing(*window, visualize=False)
+    return performance_metrics(strategy.equity)
+
+
+def test_parameter_grid():
+    grid = parameter_grid(stock=['AAA', 'BBB'], shares=[1, 2, 3])
+    assert len(grid) == 6
+    assert grid[0] == {'stock': 'AAA', 'shares': 1} and grid[-1] == {'stock': 'BBB', 'shares': 3}
+
+
+def test_performance_metrics():
+    metrics = performance_metrics(np.array([100.0, 110.0, np.nan, 99.0, 121.0]))
+    assert metrics['final_value'] == 121.0
+    assert metrics['total_return'] == pytest.approx(0.21)
+    assert metrics['max_drawdown'] == pytest.approx(99 / 110 - 1)
+    assert np.isnan(performance_metrics(np.array([1.0]))['sharpe'])
+
+
+def test_shared_market_data_is_read_only_and_equal():
+    data = market_data()
+    shared = SharedMarketData(data)
+    try:
+        attached = shared.attach()
+        for field in ('open', 'close'):
+            np.testing.assert_array_equal(attached.prices[field], data.prices[field])
+        with pytest.raises(ValueError):
+            attached.prices['close'][0, 0] = 1.0
+    finally:
+        shared.close()
+        shared.unlink()
+
+
+def test_run_sweep_matches_serial_runs():
+    data = market_data()
+    params = parameter_grid(stock=['AAA', 'BBB'], shares=[10, 20])
+    windows = [('2017-01-01', '2017-01-31'), ('2017-02-01', '2017-02-28')]
+    result = run_sweep(BuyOnce, params, windows, market_data=data, max_workers=2, chunksize=1)
+    assert len(result) == 8
+    for row in result.itertuples():
+        expected = serial({'stock': row.stock, 'shares': row.shares}, (row.start, row.end), data)
+        assert row.final_value == pytest.approx(expected['final_value'])
+        assert row.total_return == pytest.approx(expected['total_return'])
+        assert row.transactions == 1
+    gains = result.set_index(['stock', 'start', 'shares'])['total_return']
+    assert (gains.loc['AAA'] > 0).all() and (gains.loc['BBB'] < 0).all()
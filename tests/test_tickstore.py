@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from tickstore import DAY_NS, TickStore, import_trade_files
+from tradebuffer import TRADE_DTYPE
+
+START = 19_700 * DAY_NS  # midnight UTC
+
+
+def trades(n, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = np.zeros(n, dtype=TRADE_DTYPE)
+    rows['time'] = START + rng.integers(0, 2 * DAY_NS, n)  # over two days
+    rows['trade_id'] = np.arange(n) + 1_000_000
+    rows['price'] = rng.random(n) * 100
+    rows['size'] = rng.random(n)
+    rows['side'] = rng.choice([-1, 1], n)
+    return rows
+
+
+def by_time(rows):
+    return rows[np.argsort(rows['time'], kind='stable')]
+
+
+@pytest.fixture(params=['zlib', None])
+def store(request, tmp_path):
+    return TickStore(f'{tmp_path}/', block_rows=100, compression=request.param)
+
+
+def test_round_trip(store):
+    rows = trades(1_000)
+    store.append('BTC-USD', rows[:600])
+    store.append('BTC-USD', rows[600:])
+    assert store.symbols() == ['BTC-USD']
+    assert store.days('BTC-USD') == [19_700, 19_701]
+    # appended blocks overlap in time, reads still come back sorted
+    np.testing.assert_array_equal(store.read('BTC-USD'), by_time(rows))
+
+
+def test_read_range(store):
+    rows = trades(1_000)
+    store.append('BTC-USD', rows)
+    start, end = START + DAY_NS // 2, START + 3 * DAY_NS // 2
+    expected = by_time(rows[(rows['time'] >= start) & (rows['time'] < end)])
+    np.testing.assert_array_equal(store.read('BTC-USD', start, end), expected)
+    days = list(store.read_days('BTC-USD', start, end))
+    assert len(days) == 2
+    np.testing.assert_array_equal(np.concatenate(days), expected)
+    assert len(store.read('BTC-USD', START - 10, START)) == 0
+    assert len(store.read('ETH-USD')) == 0
+
+
+def test_last(store):
+    rows = trades(500)
+    store.append('BTC-USD', rows)
+    now = START + DAY_NS
+    expected = by_time(rows[(rows['time'] >= now - 3_600 * 10**9) & (rows['time'] < now)])
+    np.testing.assert_array_equal(store.last('BTC-USD', 3_600, now_ns=now), expected)
+
+
+def test_torn_append_is_recovered(tmp_path):
+    root = f'{tmp_path}/'
+    rows = trades(300)
+    day_rows = rows[rows['time'] < START + DAY_NS]
+    TickStore(root, block_rows=100).append('BTC-USD', day_rows)
+    path = TickStore(root).segment_path('BTC-USD', 19_700)
+    # a crash mid-append: block bytes without their index entry, and half an entry
+    with open(path, 'ab') as f:
+        f.write(b'\x00' * 123)
+    with open(path + '.idx', 'ab') as f:
+        f.write(b'\x01' * 7)
+    store = TickStore(root, block_rows=100)
+    np.testing.assert_array_equal(store.read('BTC-USD'), by_time(day_rows))
+    store.append('BTC-USD', day_rows[:10])
+    expected = by_time(np.concatenate([day_rows, day_rows[:10]]))
+    np.testing.assert_array_equal(np.sort(store.read('BTC-USD'), order=['time', 'trade_id']),
+                                  np.sort(expected, order=['time', 'trade_id']))
+
+
+def test_import_trade_files(tmp_path):
+    basepath = f'{tmp_path}/files/'
+    rows = by_time(trades(200))
+    (tmp_path / 'files' / 'BTC-USD').mkdir(parents=True)
+    np.save(tmp_path / 'files' / 'BTC-USD' / 'BTC-USD_UATrades_2023-12-08 00:00:00.npy', rows[:100])
+    np.save(tmp_path / 'files' / 'BTC-USD' / 'BTC-USD_UATrades_2023-12-08 00:01:00.npy', rows[100:])
+    store = TickStore(f'{tmp_path}/store/')
+    assert import_trade_files(store, basepath, 'BTC-USD') == 200
+    np.testing.assert_array_equal(store.read('BTC-USD'), rows)
+
+
+def test_unknown_compression(tmp_path):
+    with pytest.raises(ValueError):
+        TickStore(f'{tmp_path}/', compression='lz4')
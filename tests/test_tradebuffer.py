@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from tradebuffer import TRADE_DTYPE, TradeBuffer, parse_time_ns
+
+
+def fill(buffer, n):
+    for i in range(n):
+        buffer.append(i, 1_000 + i, 100.0 + i, 0.5, 1 if i % 2 else -1)
+
+
+def test_append_across_chunks():
+    buffer = TradeBuffer(chunk_size=4)
+    fill(buffer, 10)
+    assert len(buffer) == 10
+    assert [len(chunk) for chunk in buffer.chunks()] == [4, 4, 2]
+    rows = buffer.to_array()
+    assert rows.dtype == TRADE_DTYPE
+    assert rows['trade_id'].tolist() == list(range(10))
+    assert rows['time'].tolist() == [1_000 + i for i in range(10)]
+    assert rows['side'].tolist() == [-1, 1] * 5
+
+
+def test_chunks_share_memory():
+    buffer = TradeBuffer(chunk_size=4)
+    fill(buffer, 6)
+    chunks = list(buffer.chunks())
+    assert all(np.shares_memory(chunk, stored) for chunk, stored in zip(chunks, buffer._chunks))
+    # rows appended later don't move the ones already read
+    fill(buffer, 10)
+    assert chunks[0]['trade_id'].tolist() == [0, 1, 2, 3]
+
+
+def test_to_array_is_a_view_within_one_chunk():
+    buffer = TradeBuffer(chunk_size=8)
+    fill(buffer, 5)
+    assert np.shares_memory(buffer.to_array(), buffer._chunks[0])
+    assert len(buffer.to_array()) == 5
+
+
+def test_clear_keeps_first_chunk():
+    buffer = TradeBuffer(chunk_size=4)
+    fill(buffer, 9)
+    first = buffer._chunks[0]
+    buffer.clear()
+    assert len(buffer) == 0
+    assert list(buffer.chunks()) == []
+    assert buffer._chunks == [first]
+    fill(buffer, 1)
+    assert buffer.to_array()['trade_id'].tolist() == [0]
+
+
+def test_append_message():
+    buffer = TradeBuffer()
+    buffer.append_message({'trade_id': 7, 'time': '2014-11-07T08:19:27.028459Z',
+                           'price': '10.5', 'size': '0.25', 'side': 'sell'})
+    buffer.append_message({'trade_id': 8, 'time': '2014-11-07T08:19:27.028459Z',
+                           'price': '10.5', 'size': '0.25'})
+    rows = buffer.to_array()
+    assert rows['trade_id'].tolist() == [7, 8]
+    assert rows['time'][0] == parse_time_ns('2014-11-07T08:19:27.028459Z')
+    assert rows['price'][0] == 10.5 and rows['size'][0] == 0.25
+    assert rows['side'].tolist() == [-1, 0]
+
+
+def test_parse_time_ns():
+    assert parse_time_ns('1970-01-01T00:00:01.000001Z') == 1_000_001_000
+
+
+def test_chunk_size_must_be_positive():
+    with pytest.raises(ValueError):
+        TradeBuffer(chunk_size=0)
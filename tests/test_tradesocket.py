@@ -0,0 +1,151 @@
+import asyncio
+import glob
+import json
+import threading
+
+import numpy as np
+import pytest
+
+import tradesocket
+from replay import load_trade_file, trade_files
+from tradebuffer import TradeBuffer
+
+SYMBOLS = ['BTC-USD', 'ETH-USD']
+
+
+def match(product_id, trade_id, price=100.0):
+    return json.dumps({'type': 'match', 'product_id': product_id, 'trade_id': trade_id,
+                       'time': '2024-01-01T00:00:00.000001Z', 'price': str(price), 'size': '0.5',
+                       'side': 'buy'})
+
+
+@pytest.fixture
+def socket(tmp_path, monkeypatch):
+    monkeypatch.setattr(tradesocket, 'SYMBOLS', list(SYMBOLS))
+    monkeypatch.setattr(tradesocket, 'BASEPATH', f'{tmp_path}/')
+    monkeypatch.setattr(tradesocket, 'symbol_data', {symbol: TradeBuffer() for symbol in SYMBOLS})
+    monkeypatch.setattr(tradesocket, 'spare_data', {symbol: TradeBuffer() for symbol in SYMBOLS})
+    monkeypatch.setattr(tradesocket, 'OUTPUT_FORMAT', 'csv')
+    return tradesocket
+
+
+def discharge(socket):
+    socket.write_buffers(socket.swap_buffers())
+
+
+@pytest.mark.parametrize('output_format', ['csv', 'npy'])
+def test_discharges_in_the_same_second_dont_overwrite(socket, output_format):
+    socket.OUTPUT_FORMAT = output_format
+    for trade_id in range(4):
+        socket.record_match(match('BTC-USD', trade_id))
+        discharge(socket)
+    paths = trade_files(socket.BASEPATH, 'BTC-USD')
+    assert len(paths) == 4
+    trades = np.concatenate([load_trade_file(path) for path in paths])
+    assert trades['trade_id'].tolist() == [0, 1, 2, 3]
+    assert len(trade_files(socket.BASEPATH, 'ETH-USD')) == 4
+
+
+def test_writers_refuse_to_overwrite(socket, tmp_path):
+    buffer = TradeBuffer()
+    buffer.append(1, 2, 3.0, 4.0, 1)
+    for write, path in ((socket.write_csv, tmp_path / 'a.csv'), (socket.write_npy, tmp_path / 'a.npy')):
+        write(str(path), buffer)
+        with pytest.raises(FileExistsError):
+            write(str(path), buffer)
+    assert len(glob.glob(str(tmp_path / 'a.*'))) == 3  # with the .npy schema sidecar
+
+
+def test_swap_hands_out_the_spare_buffers(socket):
+    spare = socket.spare_data
+    socket.record_match(match('BTC-USD', 1))
+    socket.record_match(match('ETH-USD', 2))
+    socket.record_match(json.dumps({'type': 'heartbeat', 'product_id': 'BTC-USD'}))
+    full = socket.swap_buffers()
+    assert socket.symbol_data is spare and socket.spare_data is None
+    assert [len(full[symbol]) for symbol in SYMBOLS] == [1, 1]
+    socket.record_match(match('BTC-USD', 3))  # lands in the new live set
+    socket.write_buffers(full)
+    assert socket.spare_data is full and all(len(buffer) == 0 for buffer in full.values())
+    assert len(socket.symbol_data['BTC-USD']) == 1
+
+
+def test_failed_write_keeps_discharging(socket, monkeypatch):
+    def broken(path, buffer):
+        raise OSError('No space left on device')
+    monkeypatch.setitem(socket.WRITERS, 'csv', broken)
+    socket.record_match(match('BTC-USD', 1))
+    socket.discharge()  # logged, not raised
+    assert socket.spare_data is not None
+    assert all(len(buffer) == 0 for buffer in socket.spare_data.values())
+
+    monkeypatch.setitem(socket.WRITERS, 'csv', socket.write_csv)
+    socket.record_match(match('BTC-USD', 2))
+    socket.discharge()
+    socket.record_match(match('BTC-USD', 3))
+    socket.discharge()
+    trades = [load_trade_file(path) for path in trade_files(socket.BASEPATH, 'BTC-USD')]
+    assert [rows['trade_id'].tolist() for rows in trades] == [[2], [3]]
+
+
+def test_async_discharge_survives_a_failed_write(socket, monkeypatch):
+    calls = []
+
+    def flaky(path, buffer):
+        calls.append(len(buffer))
+        if len(calls) == 1:
+            raise OSError('Permission denied')
+        socket.write_csv(path, buffer)
+    monkeypatch.setitem(socket.WRITERS, 'csv', flaky)
+    monkeypatch.setattr(socket, 'DISCHARGE_INTERVAL', 0.01)
+
+    async def run():
+        monkeypatch.setattr(socket, 'async_stop', asyncio.Event())
+        task = asyncio.create_task(socket._async_discharge())
+        for _ in range(1000):
+            if len(calls) >= 3 or task.done():
+                break
+            await asyncio.sleep(0.005)
+        socket.async_stop.set()
+        await asyncio.wait_for(task, 5)  # the final flush ran and nothing was raised
+        assert len(calls) >= 3
+    asyncio.run(run())
+    assert socket.spare_data is not None
+
+
+def test_run_async_shards_symbols_and_flushes_on_stop(socket, monkeypatch):
+    import websockets
+
+    symbols = ['BTC-USD', 'ETH-USD', 'SOL-USD']
+    monkeypatch.setattr(socket, 'SYMBOLS', symbols)
+    monkeypatch.setattr(socket, 'symbol_data', {symbol: TradeBuffer() for symbol in symbols})
+    monkeypatch.setattr(socket, 'spare_data', {symbol: TradeBuffer() for symbol in symbols})
+    monkeypatch.setattr(socket, 'DISCHARGE_INTERVAL', 3600)  # only the final flush writes
+    monkeypatch.setattr(socket, 'stop_event', threading.Event())
+    monkeypatch.setattr(socket, 'async_stop', None)
+    monkeypatch.setattr(socket, 'async_loop', None)
+    subscriptions = []
+
+    async def feed(ws):
+        products = json.loads(await ws.recv())['channels'][0]['product_ids']
+        subscriptions.append(products)
+        for trade_id, product_id in enumerate(products):
+            await ws.send(match(product_id, trade_id))
+        await ws.wait_closed()
+
+    async def run():
+        async with websockets.serve(feed, 'localhost', 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            monkeypatch.setattr(socket, 'URL', f'ws://localhost:{port}')
+            task = asyncio.create_task(socket.run_async(connections=2))
+            for _ in range(1000):
+                if sum(len(buffer) for buffer in socket.symbol_data.values()) == 3:
+                    break
+                await asyncio.sleep(0.005)
+            socket.end()
+            await asyncio.wait_for(task, 5)
+    asyncio.run(run())
+    assert sorted(subscriptions) == [['BTC-USD', 'SOL-USD'], ['ETH-USD']]
+    for symbol in symbols:
+        (path,) = trade_files(socket.BASEPATH, symbol)
+        assert len(load_trade_file(path)) == 1
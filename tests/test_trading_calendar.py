@@ -0,0 +1,55 @@
+import numpy as np
+
+from trading_calendar import TradingCalendar
+
+
+def days(*dates):
+    return np.array(dates, dtype='datetime64[D]')
+
+
+def test_sessions_skip_weekends_and_holidays():
+    calendar = TradingCalendar('2024-01-01', '2024-01-19')
+    # Jan 1 is New Year's Day, Jan 15 Martin Luther King Jr. Day
+    assert (calendar.sessions == days('2024-01-02', '2024-01-03', '2024-01-04', '2024-01-05',
+                                      '2024-01-08', '2024-01-09', '2024-01-10', '2024-01-11',
+                                      '2024-01-12', '2024-01-16', '2024-01-17', '2024-01-18',
+                                      '2024-01-19')).all()
+
+
+def test_weekly_rule_rolls_to_the_next_session():
+    calendar = TradingCalendar('2024-01-01', '2024-01-31', week_day=0)
+    assert (calendar.sessions[calendar.weekly] ==
+            days('2024-01-02', '2024-01-08', '2024-01-16', '2024-01-22', '2024-01-29')).all()
+    calendar = TradingCalendar('2024-01-01', '2024-01-31', week_day=4)
+    assert (calendar.sessions[calendar.weekly] ==
+            days('2024-01-05', '2024-01-12', '2024-01-19', '2024-01-26')).all()
+
+
+def test_monthly_rule():
+    calendar = TradingCalendar('2024-01-01', '2024-06-30', month_day=1)
+    # Jun 1 2024 is a Saturday
+    assert (calendar.sessions[calendar.monthly] ==
+            days('2024-01-02', '2024-02-01', '2024-03-01', '2024-04-01', '2024-05-01',
+                 '2024-06-03')).all()
+
+
+def test_monthly_rule_is_clipped_to_the_month():
+    calendar = TradingCalendar('2024-01-01', '2024-04-30', month_day=31)
+    # Mar 31 2024 is a Sunday, it rolls into April
+    assert (calendar.sessions[calendar.monthly] ==
+            days('2024-01-31', '2024-02-29', '2024-04-01', '2024-04-30')).all()
+
+
+def test_rules_roll_into_next_year():
+    calendar = TradingCalendar('2023-12-01', '2024-01-10', week_day=0, month_day=31)
+    # Dec 31 2023 is a Sunday and Jan 1 a holiday
+    assert np.datetime64('2024-01-02') in calendar.sessions[calendar.monthly]
+
+
+def test_is_trading_date_and_next_trading_date():
+    calendar = TradingCalendar('2024-01-01', '2024-12-31')
+    assert calendar.is_trading_date('2024-03-28')
+    assert not calendar.is_trading_date('2024-03-29')  # Good Friday
+    assert not calendar.is_trading_date(np.datetime64('2024-03-30'))
+    assert calendar.next_trading_date('2024-03-29') == np.datetime64('2024-04-01')
+    assert calendar.next_trading_date('2024-04-01') == np.datetime64('2024-04-01')
@@ -0,0 +1,61 @@
+from queue import Queue
+
+import numpy as np
+import pytest
+
+import web_socket
+from coinbase import CoinbaseWebSocket
+from shm_ring import ring_dtypes
+from web_socket import LEVEL_1_RECORD, LEVEL_2_RECORD, RecordCodec, intern, name_of
+
+TICKER = {'type': 'ticker', 'product_id': 'BTC-USD', 'price': '100.5', 'sequence': 1,
+          'time': '2024-01-01T00:00:00.123456Z'}
+L2UPDATE = {'type': 'l2update', 'product_id': 'BTC-USD', 'time': '2024-01-01T00:00:01Z',
+            'changes': [['buy', '100.0', '1.5']]}
+
+
+@pytest.fixture
+def names(monkeypatch):
+    monkeypatch.setattr(web_socket, '_names', {})
+
+
+def test_intern_is_stable_and_refuses_collisions(names):
+    key = intern('BTC-USD')
+    assert intern('BTC-USD') == key and name_of(key) == 'BTC-USD'
+    intern('plumless')
+    with pytest.raises(ValueError):
+        intern('buckeroo')  # same CRC-32 as plumless
+    assert name_of(intern('plumless')) == 'plumless'
+
+
+def test_encode_and_legacy_round_trip(names):
+    codec = RecordCodec(LEVEL_1_RECORD, CoinbaseWebSocket.level_1_map, 'coinbase')
+    record = codec.encode(TICKER)
+    assert record == (1_704_067_200_123_456_000, intern('coinbase'), intern('BTC-USD'), 100.5)
+    assert codec.to_array([record]).dtype == LEVEL_1_RECORD
+    expected = ('2024-01-01 00:00:00.123456', 'coinbase', 'BTC-USD', 100.5)
+    assert codec.legacy(record) == codec.encode_legacy(TICKER) == expected
+
+
+def test_encode_overrides_and_sides(names):
+    codec = RecordCodec(LEVEL_2_RECORD, CoinbaseWebSocket.level_2_map, 'coinbase')
+    record = codec.encode(L2UPDATE, side='sell', price='101', quantity=2)
+    assert record[3:] == (-1, 101.0, 2.0)
+    assert codec.encode_legacy(L2UPDATE, side='sell', price='101', quantity=2)[3:] == ('sell', 101.0, 2.0)
+    assert codec.legacy(record)[3] == 'sell'
+    with pytest.raises(ValueError):
+        RecordCodec(LEVEL_2_RECORD, {'time': 'time'}, 'coinbase')
+
+
+def test_compact_batches_are_record_arrays():
+    queue_1, queue_2 = Queue(), Queue()
+    ws = CoinbaseWebSocket(queue_1, queue_2, ['BTC-USD'], batch_size=10, compact=True)
+    ws.emit_1(TICKER)
+    ws._on_l2update(L2UPDATE)
+    ws.flush()
+    level_1, level_2 = queue_1.get_nowait(), queue_2.get_nowait()
+    assert (level_1.dtype, level_2.dtype) == ring_dtypes(compact=True)
+    assert name_of(level_1['ticker'][0]) == 'BTC-USD'
+    assert level_2[['side', 'price', 'quantity']].tolist() == [(1, 100.0, 1.5)]
+    # fixed dtype, so batches (of any exchange) concatenate as they are
+    assert len(np.concatenate([level_1, level_1])) == 2